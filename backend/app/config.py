@@ -10,9 +10,9 @@ class Settings(BaseSettings):
     # BACKEND_CORS_ORIGINS is a JSON-formatted list of origins
     BACKEND_CORS_ORIGINS: List[str] = []
 
-    @field_validator("BACKEND_CORS_ORIGINS", mode="before")
+    @field_validator("BACKEND_CORS_ORIGINS", "SEMANTIC_CACHE_FEATURES", mode="before")
     @classmethod
-    def assemble_cors_origins(cls, v: Union[str, List[str]]) -> List[str]:
+    def split_csv(cls, v: Union[str, List[str]]) -> List[str]:
         if isinstance(v, str) and not v.startswith("["):
             return [i.strip() for i in v.split(",")]
         elif isinstance(v, (list, str)):
@@ -27,6 +27,101 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str = "" # Set via environment variable
     DATABASE_URL: str = "sqlite:///./homehub.db"
 
+    # Connection pool tuning (ignored for SQLite)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Maximum number of Gemini generate calls in flight per worker
+    GEMINI_MAX_CONCURRENCY: int = 16
+    # Maximum number of chat replies streaming at once per worker
+    GEMINI_MAX_CHAT_STREAMS: int = 256
+
+    # Websocket fan-out: per-connection outbound queue bound, and how long one send may
+    # take before the client is treated as dead/too slow and disconnected
+    WS_MAX_QUEUED_MESSAGES: int = 256
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+    # "local" only reaches sockets on this worker; "redis" routes notifications and
+    # broadcasts to every worker via REDIS_URL pub/sub, with per-user presence
+    WS_BACKPLANE: str = "local"
+    WS_PRESENCE_TTL_SECONDS: float = 60.0
+
+    # Chat context sent to Gemini: approximate token budget; older turns beyond it are
+    # rolled into a summary, but the most recent CHAT_CONTEXT_KEEP_TURNS stay verbatim
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 4000
+    CHAT_CONTEXT_KEEP_TURNS: int = 6
+
+    # Gemini rate limiting: token bucket refilled at GEMINI_RPM, up to GEMINI_BURST at once
+    GEMINI_RPM: int = Field(60, gt=0)
+    GEMINI_RPD: int = Field(1500, gt=0)
+    GEMINI_BURST: int = Field(10, gt=0)
+    # How long a request may queue for a token before failing with 429
+    GEMINI_MAX_QUEUE_WAIT_SECONDS: float = 30.0
+    # "local" limits each worker on its own; "redis" enforces RPM/RPD across all workers
+    GEMINI_QUOTA_BACKEND: str = "local"
+    # Tokens a worker reserves from Redis per round-trip
+    GEMINI_QUOTA_LEASE_SIZE: int = 5
+
+    # Candidates sent to Gemini per roommate-matching prompt; a shortlist is scored
+    # in several batches at once, so the first ranking streams back early
+    ROOMMATE_MATCH_BATCH_SIZE: int = 5
+    # Candidates kept by the local pre-ranker before any Gemini call
+    ROOMMATE_PRERANK_SHORTLIST: int = 20
+
+    # Write one api_call_logs row per traced AI call (endpoint "ai:<feature>", with tokens),
+    # batched in the background; set false to keep AI metrics in memory only
+    ANALYTICS_FLUSH_TO_DB: bool = True
+    # Write one api_call_logs row per HTTP request (same background writer)
+    REQUEST_LOGGING_ENABLED: bool = True
+    API_LOG_BATCH_SIZE: int = 500
+    API_LOG_FLUSH_INTERVAL_SECONDS: float = 5.0
+    API_LOG_MAX_PENDING: int = 20000
+
+    # Write-behind persistence of AI results (cultural guides, health insurance logs)
+    AI_RESULT_BATCH_SIZE: int = 100
+    AI_RESULT_FLUSH_INTERVAL_SECONDS: float = 1.0
+    AI_RESULT_MAX_PENDING: int = 10000
+    # Write-behind persistence of websocket chat messages
+    CHAT_HISTORY_BATCH_SIZE: int = 200
+    CHAT_HISTORY_FLUSH_INTERVAL_SECONDS: float = 0.5
+    CHAT_HISTORY_MAX_PENDING: int = 50000
+    # Retries for a failed background batch insert, with exponential backoff
+    DB_WRITE_MAX_RETRIES: int = 3
+    DB_WRITE_RETRY_BACKOFF_SECONDS: float = 0.5
+
+    # In-memory spatial index over listing coordinates
+    GEO_CELL_DEGREES: float = 0.005
+    # Full reload from the database; creates and edits through the API apply immediately
+    GEO_INDEX_REFRESH_SECONDS: float = 300.0
+
+    # Hostel discovery: listings retrieved (and annotated) per request, and how long a
+    # listing's pros/cons annotation is reused; editing the listing invalidates it
+    HOSTEL_DISCOVERY_MAX_RESULTS: int = 10
+    HOSTEL_DISCOVERY_RADIUS_KM: float = 5.0
+    HOSTEL_ANNOTATION_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # AI response cache bounds
+    CACHE_MAX_ENTRIES: int = 2048
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_SWEEP_INTERVAL_SECONDS: float = 60.0
+    # "memory" keeps the cache per worker; "redis" shares it across workers via REDIS_URL
+    CACHE_BACKEND: str = "memory"
+    CACHE_L1_TTL_SECONDS: float = 300.0
+    # Semantic cache: near-duplicate requests to these features (comma-separated) share
+    # an answer when their hashed n-gram vectors are at least THRESHOLD cosine-similar
+    SEMANTIC_CACHE_FEATURES: List[str] = ["ask_community", "analyze_health_insurance", "cultural_guidance"]
+    SEMANTIC_CACHE_THRESHOLD: float = 0.90
+    SEMANTIC_CACHE_DIMENSIONS: int = 512
+    # Per feature; the least recently used entry is evicted beyond this
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 2000
+    SEMANTIC_CACHE_TTL_SECONDS: float = 3600.0
+    # Use memory:// for the in-process Redis stand-in
+    REDIS_URL: str = "redis://localhost:6379/0"
+    # Connect and per-command timeout; an unreachable Redis fails fast and the cache falls back to L1
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = Field(1.0, gt=0)
+
     @field_validator("DATABASE_URL", mode="before")
     @classmethod
     def assemble_db_connection(cls, v: str | None, values: Any) -> Any:
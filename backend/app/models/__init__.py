@@ -1,5 +1,6 @@
 from .user import User
 from .housing import Housing
+from .university import University
 from .community import CommunityEvent
 from .matching import RoommateMatch
 
@@ -14,6 +14,14 @@ class APICallLog(Base):
     tokens_used = Column(Integer, default=0)
     error_message = Column(String, nullable=True)
 
+def ensure_api_call_log(connection):
+    """
+    Creates api_call_logs on a SQLite database that predates it, so the request log
+    and the per-AI-call rows have somewhere to go.
+    """
+    if connection.dialect.name == "sqlite":
+        APICallLog.__table__.create(connection, checkfirst=True)
+
 class QuotaUsage(Base):
     __tablename__ = "quota_usage"
 
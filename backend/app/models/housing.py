@@ -1,10 +1,16 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, Text, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, Text, DateTime, JSON, Index, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
+from app.models.university import University
 
 class Housing(Base):
     __tablename__ = "housing"
+    __table_args__ = (
+        # Listing search: price range scans in price order, bedrooms checked from the index
+        Index("ix_housing_price_bedrooms", "price", "bedrooms"),
+        Index("ix_housing_is_verified", "is_verified"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
@@ -16,8 +22,75 @@ class Housing(Base):
     bathrooms = Column(Float)
     is_verified = Column(Boolean, default=False)
     landlord_id = Column(Integer, ForeignKey("users.id"))
+    # WGS84 degrees; distance queries go through the in-memory grid in app/services/geo_search.py
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
 
     landlord = relationship("User", backref="listings")
 
 
+# Full-text search over title (weight A), description (B) and address (C).
+# Postgres: a generated tsvector column with a GIN index, recomputed by the database
+# on every insert/update. SQLite: an external-content FTS5 table kept in sync by triggers.
+HOUSING_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(address, '')), 'C')"
+)
 
+_POSTGRES_TEXT_SEARCH = [
+    f"ALTER TABLE housing ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({HOUSING_SEARCH_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_housing_search_vector ON housing USING GIN (search_vector)",
+]
+
+_SQLITE_TEXT_SEARCH = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS housing_fts USING fts5("
+    "title, description, address, content='housing', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS housing_fts_insert AFTER INSERT ON housing BEGIN "
+    "INSERT INTO housing_fts(rowid, title, description, address) VALUES (new.id, new.title, new.description, new.address); END",
+    "CREATE TRIGGER IF NOT EXISTS housing_fts_delete AFTER DELETE ON housing BEGIN "
+    "INSERT INTO housing_fts(housing_fts, rowid, title, description, address) VALUES ('delete', old.id, old.title, old.description, old.address); END",
+    "CREATE TRIGGER IF NOT EXISTS housing_fts_update AFTER UPDATE OF title, description, address ON housing BEGIN "
+    "INSERT INTO housing_fts(housing_fts, rowid, title, description, address) VALUES ('delete', old.id, old.title, old.description, old.address); "
+    "INSERT INTO housing_fts(rowid, title, description, address) VALUES (new.id, new.title, new.description, new.address); END",
+]
+
+for _statement in _POSTGRES_TEXT_SEARCH:
+    event.listen(Housing.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+for _statement in _SQLITE_TEXT_SEARCH:
+    event.listen(Housing.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+_SQLITE_TEXT_SEARCH_OBJECTS = {"housing_fts", "housing_fts_insert", "housing_fts_delete", "housing_fts_update"}
+
+
+def ensure_text_search(connection):
+    """
+    Adds the SQLite FTS5 table and triggers to a housing table created before they
+    existed (after_create only fires for new tables), then indexes the rows already there.
+    Postgres gets its search column from database/migrations.sql.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    names = {name for name, in connection.exec_driver_sql("SELECT name FROM sqlite_master").all()}
+    if "housing" not in names or _SQLITE_TEXT_SEARCH_OBJECTS <= names:
+        return
+    for statement in _SQLITE_TEXT_SEARCH:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("INSERT INTO housing_fts(housing_fts) VALUES ('rebuild')")
+
+
+def ensure_coordinates(connection):
+    """
+    Adds the latitude/longitude columns to a SQLite housing table created before them,
+    and the universities table if it is missing. Postgres gets both from
+    database/migrations.sql.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(housing)").all()}
+    if columns:
+        for name in ("latitude", "longitude"):
+            if name not in columns:
+                connection.exec_driver_sql(f"ALTER TABLE housing ADD COLUMN {name} FLOAT")
+    University.__table__.create(connection, checkfirst=True)
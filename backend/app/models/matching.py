@@ -1,13 +1,46 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, JSON, Index
 from sqlalchemy.sql import func
 from app.database import Base
 
 class RoommateMatch(Base):
     __tablename__ = "roommate_matches"
+    __table_args__ = (
+        # One stored result per (user, candidate) pair; also serves the bulk lookup
+        Index("ix_roommate_matches_user_match", "user_id", "match_user_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     match_user_id = Column(Integer, ForeignKey("users.id"))
     compatibility_score = Column(Float)
     analysis = Column(JSON)
+    profile_hash = Column(String(64)) # Fingerprint of both profiles when scored
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+def ensure_roommate_match_store(connection):
+    """
+    Adds the profile_hash/updated_at columns and the unique (user_id, match_user_id)
+    index to a SQLite roommate_matches table created before them; save_matches'
+    upsert needs that index. Postgres gets them from database/migrations.sql.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(roommate_matches)").all()}
+    if not columns:
+        return
+    # SQLite can't add a column with a non-constant default, so existing rows keep NULL
+    for name, kind in (("profile_hash", "VARCHAR(64)"), ("updated_at", "DATETIME")):
+        if name not in columns:
+            connection.exec_driver_sql(f"ALTER TABLE roommate_matches ADD COLUMN {name} {kind}")
+    indexes = {row[1] for row in connection.exec_driver_sql("PRAGMA index_list(roommate_matches)").all()}
+    if "ix_roommate_matches_user_match" not in indexes:
+        # Older code could store a pair more than once; keep the latest row of each
+        connection.exec_driver_sql(
+            "DELETE FROM roommate_matches WHERE id NOT IN "
+            "(SELECT max(id) FROM roommate_matches GROUP BY user_id, match_user_id)"
+        )
+        connection.exec_driver_sql(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_roommate_matches_user_match ON roommate_matches (user_id, match_user_id)"
+        )
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, Float
+from app.database import Base
+
+class University(Base):
+    __tablename__ = "universities"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, index=True)
+    city = Column(String, nullable=True)
+    country = Column(String, nullable=True)
+    latitude = Column(Float)
+    longitude = Column(Float)
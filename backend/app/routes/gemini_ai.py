@@ -1,22 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from app.services.gemini_service import gemini_service
+from app.services.roommate_match_store import match_roommates_with_store
+from app.services.ai_result_store import save_cultural_guide, save_health_insurance_log
+from app.services.hostel_discovery import UniversityLocationNotFound, discover_hostels, annotation_stats
 from pydantic import BaseModel
-from typing import List, Dict, Any
-
-from datetime import date
-from sqlalchemy.orm import Session
-from app.database import get_db
+from typing import List, Dict, Any, Optional
+import json
 
-from app.models.cultural import CulturalGuide
-from app.models.matching import RoommateMatch
-from app.models.chat import ChatHistory
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 
 router = APIRouter()
 
 class RoommateMatchRequest(BaseModel):
     user_profile: dict
     candidates: List[dict]
+    top_k: Optional[int] = None
 
 class HostelSearchRequest(BaseModel):
     query: str
@@ -26,8 +26,17 @@ class LeaseAnalysisRequest(BaseModel):
     text: str
 
 @router.post("/roommate-match")
-async def match_roommates(request: RoommateMatchRequest, db: Session = Depends(get_db)):
-    return await gemini_service.match_roommates(request.user_profile, request.candidates)
+async def match_roommates(request: RoommateMatchRequest, db: AsyncSession = Depends(get_async_db)):
+    return await match_roommates_with_store(db, request.user_profile, request.candidates, request.top_k)
+
+@router.post("/roommate-match/stream")
+async def match_roommates_stream(request: RoommateMatchRequest):
+    # One NDJSON line per scored batch, each carrying the current top-k ranking
+    async def ranking_lines():
+        async for update in gemini_service.match_roommates_stream(request.user_profile, request.candidates, request.top_k):
+            yield json.dumps(update) + "\n"
+
+    return StreamingResponse(ranking_lines(), media_type="application/x-ndjson")
 
 
 
@@ -41,7 +50,7 @@ class CulturalGuidanceRequest(BaseModel):
     challenges: str
 
 @router.post("/cultural-guidance")
-async def cultural_guidance(request: CulturalGuidanceRequest, db: Session = Depends(get_db)):
+async def cultural_guidance(request: CulturalGuidanceRequest):
     # 1. Get Guidance
     parsed_data = await gemini_service.cultural_guidance(
         request.home_country, 
@@ -51,16 +60,14 @@ async def cultural_guidance(request: CulturalGuidanceRequest, db: Session = Depe
         request.challenges
     )
     
-    # 2. Save to DB
-    db_record = CulturalGuide(
+    # 2. Save to DB (queued; written in the background)
+    save_cultural_guide(
         user_id=1,
         home_country=request.home_country,
         host_country=request.host_country,
         university=request.university,
         ai_advice=parsed_data
     )
-    db.add(db_record)
-    db.commit()
     
     return parsed_data
 
@@ -154,8 +161,14 @@ class HostelSearchRequest(BaseModel):
     filters: dict = {}
 
 @router.post("/hostel-discovery")
-async def search_hostels(request: HostelSearchRequest):
-    return await gemini_service.search_hostels(request.query, request.filters)
+async def search_hostels(request: HostelSearchRequest, db: AsyncSession = Depends(get_async_db)):
+    # Real listings from the housing table; Gemini only annotates ones it hasn't seen
+    try:
+        return await discover_hostels(db, request.query, request.filters)
+    except UniversityLocationNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 class LeaseAnalysisRequest(BaseModel):
     text: str
@@ -169,61 +182,95 @@ async def analyze_lease(request: LeaseAnalysisRequest):
 
 
 from app.utils.analytics import get_analytics_summary
+from app.utils.response_cache import cache_backend
+from app.utils.single_flight import single_flight
+from app.utils.semantic_cache import semantic_cache
+from app.utils.gemini_rate_limiter import rate_limiter
+from app.utils.ai_tracing import render_prometheus
 
 @router.get("/analytics")
 async def get_analytics():
     return get_analytics_summary()
 
+@router.get("/cache-stats")
+async def get_cache_stats():
+    return {
+        "cache": cache_backend.stats(),
+        "single_flight": single_flight.stats(),
+        "semantic": semantic_cache.stats(),
+        "hostel_annotations": annotation_stats
+    }
+
+@router.get("/rate-limit-stats")
+async def get_rate_limit_stats():
+    return rate_limiter.stats()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 from fastapi import WebSocket, WebSocketDisconnect
 from app.websocket.manager import manager
+from app.services.chat_context import ChatContext
+from app.services.chat_store import chat_history_writer, load_recent_history, save_chat_message, load_history_page
+from app.schemas.chat import ChatHistoryPage
+from contextlib import aclosing
 import json
 
 @router.websocket("/chat/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int, db: Session = Depends(get_db)):
-    await manager.connect(websocket, user_id)
+async def websocket_endpoint(websocket: WebSocket, user_id: int):
+    connection = await manager.connect(websocket, user_id)
     
     # 1. Load History
-    # Fetch last 20 messages, ordered by timestamp desc, then reverse to get chronological
-    history_records = db.query(ChatHistory).filter(ChatHistory.user_id == user_id).order_by(desc(ChatHistory.timestamp)).limit(20).all()
-    history_records.reverse()
-    
-    # Convert to Gemini format
-    chat_history = []
-    for record in history_records:
-        chat_history.append({'role': record.role, 'parts': [record.message]})
+    # Last 20 messages, chronological, in Gemini format. The context keeps one chat
+    # session for this socket and trims it to the token budget by summarising older turns
+    context = ChatContext(await load_recent_history(user_id, limit=20))
         
     try:
         while True:
             data = await websocket.receive_text()
             
-            # 2. Save User Message
-            user_msg = ChatHistory(user_id=user_id, role='user', message=data)
-            db.add(user_msg)
-            db.commit()
-            
-            # Add to local history for context
-            chat_history.append({'role': 'user', 'parts': [data]})
+            # 2. Save User Message (queued; chat_history_writer bulk-inserts in the background)
+            save_chat_message(user_id, 'user', data)
             
             # 3. Stream Response
+            # Chunks go through the connection's outbound queue, which also carries
+            # notifications; send() waits when it's full. aclosing() cancels the upstream
+            # Gemini stream if the send fails because the client disconnected mid-reply.
             full_response = ""
-            async for chunk in gemini_service.chat_stream(data, history=chat_history):
-                await manager.send_personal_message(chunk, user_id)
-                full_response += chunk
-            
-            # 4. Save Model Response
-            if full_response:
-                ai_msg = ChatHistory(user_id=user_id, role='model', message=full_response)
-                db.add(ai_msg)
-                db.commit()
-                
-                # Add to local history
-                chat_history.append({'role': 'model', 'parts': [full_response]})
+            try:
+                async with aclosing(context.stream_reply(data)) as stream:
+                    async for chunk in stream:
+                        await connection.send(chunk)
+                        full_response += chunk
+            finally:
+                # 4. Save Model Response, including whatever was sent before a disconnect
+                if full_response:
+                    save_chat_message(user_id, 'model', full_response)
             
     except WebSocketDisconnect:
         manager.disconnect(websocket, user_id)
     except Exception as e:
         print(f"WebSocket Error: {e}")
         manager.disconnect(websocket, user_id)
+    finally:
+        # Don't leave this conversation waiting on the flush timer
+        await chat_history_writer.flush()
+
+@router.get("/chat/{user_id}/history", response_model=ChatHistoryPage)
+async def get_chat_history(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Newest first; pass next_cursor back as `before` for older messages
+    try:
+        records, next_cursor = await load_history_page(db, user_id, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"messages": records, "next_cursor": next_cursor}
 
 @router.websocket("/notifications/{user_id}")
 async def notification_endpoint(websocket: WebSocket, user_id: int):
@@ -243,9 +290,8 @@ class NotificationRequest(BaseModel):
 @router.post("/send-notification")
 async def send_notification(request: NotificationRequest):
     # In a real app, save to DB here
-    msg = json.dumps({"type": request.type, "message": request.message})
-    await manager.send_personal_message(msg, request.user_id)
-    return {"success": True}
+    delivered = await manager.send_personal_message({"type": request.type, "message": request.message}, request.user_id)
+    return {"success": True, "delivered": delivered}
 
 class EmergencySupportRequest(BaseModel):
     input_text: str
@@ -262,18 +308,15 @@ class HealthInsuranceRequest(BaseModel):
     query_text: str
 
 @router.post("/health-insurance")
-async def health_insurance(request: HealthInsuranceRequest, db: Session = Depends(get_db)):
+async def health_insurance(request: HealthInsuranceRequest):
     # 1. Get Analysis
     analysis = await gemini_service.analyze_health_insurance(request.query_text)
     
-    # 2. Save to DB
-    from app.models.health_insurance import HealthInsuranceLog
-    db_record = HealthInsuranceLog(
+    # 2. Save to DB (queued; written in the background)
+    save_health_insurance_log(
         user_id=1,
         query_text=request.query_text,
         ai_analysis=analysis
     )
-    db.add(db_record)
-    db.commit()
     
     return analysis
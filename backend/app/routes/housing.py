@@ -1,12 +1,82 @@
-from fastapi import APIRouter, Depends
-from typing import List
-from app.schemas.housing import HousingResponse, HousingCreate
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.models.university import University
+from app.schemas.housing import (
+    HousingResponse, HousingCreate, HousingSearchPage, HousingTextSearchResults,
+    HousingNearbyResults
+)
+from app.services.geo_search import listing_geo_index
+from app.services.housing_search import HousingFilters, search_listings, search_listings_text
 
 router = APIRouter()
 
+def listing_filters(
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_bedrooms: Optional[int] = Query(None, ge=0),
+    max_bedrooms: Optional[int] = Query(None, ge=0),
+    min_bathrooms: Optional[float] = Query(None, ge=0),
+    is_verified: Optional[bool] = None,
+    currency: Optional[str] = None,
+) -> HousingFilters:
+    return HousingFilters(min_price, max_price, min_bedrooms, max_bedrooms, min_bathrooms, is_verified, currency)
+
 @router.get("/", response_model=List[HousingResponse])
-def read_listings():
-    return []
+async def read_listings(
+    filters: HousingFilters = Depends(listing_filters),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    listings, _ = await search_listings(db, filters, limit)
+    return listings
+
+@router.get("/search", response_model=HousingSearchPage)
+async def search(
+    filters: HousingFilters = Depends(listing_filters),
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Cheapest first; pass next_cursor back as `after` for the next page
+    try:
+        listings, next_cursor = await search_listings(db, filters, limit, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": listings, "next_cursor": next_cursor}
+
+@router.get("/text-search", response_model=HousingTextSearchResults)
+async def text_search(
+    q: str = Query(..., min_length=1, max_length=200),
+    filters: HousingFilters = Depends(listing_filters),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Ranked free-text search over title, description and address, straight from the index
+    hits = await search_listings_text(db, q, filters, limit)
+    return {"results": [{"listing": listing, "score": score} for listing, score in hits]}
+
+@router.get("/nearby", response_model=HousingNearbyResults)
+async def nearby(
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    university_id: Optional[int] = None,
+    radius_km: float = Query(5.0, gt=0, le=50),
+    filters: HousingFilters = Depends(listing_filters),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Nearest first, by actual distance from a point or from a university's campus
+    if university_id is not None:
+        university = await db.get(University, university_id)
+        if university is None or university.latitude is None or university.longitude is None:
+            raise HTTPException(status_code=404, detail="University location not found")
+        latitude, longitude = university.latitude, university.longitude
+    elif latitude is None or longitude is None:
+        raise HTTPException(status_code=400, detail="Pass latitude and longitude, or university_id")
+    hits = await listing_geo_index.nearby(db, latitude, longitude, radius_km, limit, filters)
+    return {"results": [{"listing": listing, "distance_km": round(distance, 3)} for listing, distance in hits]}
 
 @router.post("/", response_model=HousingResponse)
 def create_listing(listing: HousingCreate):
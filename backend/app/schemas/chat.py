@@ -0,0 +1,16 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+class ChatMessage(BaseModel):
+    id: int
+    role: str
+    message: str
+    timestamp: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class ChatHistoryPage(BaseModel):
+    messages: List[ChatMessage] # Newest first
+    next_cursor: Optional[str] = None # Pass as `before` to fetch older messages
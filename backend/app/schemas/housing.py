@@ -1,5 +1,5 @@
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 class HousingBase(BaseModel):
     title: str
@@ -8,6 +8,8 @@ class HousingBase(BaseModel):
     price: float
     bedrooms: int
     bathrooms: float
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class HousingCreate(HousingBase):
     pass
@@ -23,3 +25,21 @@ class HousingResponse(HousingBase):
 
     class Config:
         orm_mode = True
+
+class HousingSearchPage(BaseModel):
+    results: List[HousingResponse] # Cheapest first
+    next_cursor: Optional[str] = None # Pass as `after` for the next page
+
+class HousingSearchHit(BaseModel):
+    listing: HousingResponse
+    score: float # Text relevance; higher is better
+
+class HousingTextSearchResults(BaseModel):
+    results: List[HousingSearchHit]
+
+class HousingNearbyHit(BaseModel):
+    listing: HousingResponse
+    distance_km: float
+
+class HousingNearbyResults(BaseModel):
+    results: List[HousingNearbyHit] # Nearest first
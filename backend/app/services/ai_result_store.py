@@ -0,0 +1,55 @@
+from app.config import settings
+from app.models.cultural import CulturalGuide
+from app.models.health_insurance import HealthInsuranceLog
+from app.utils.batch_writer import BatchWriter
+
+
+def _writer(model) -> BatchWriter:
+    return BatchWriter(
+        model,
+        max_batch=settings.AI_RESULT_BATCH_SIZE,
+        flush_interval=settings.AI_RESULT_FLUSH_INTERVAL_SECONDS,
+        max_pending=settings.AI_RESULT_MAX_PENDING,
+        max_retries=settings.DB_WRITE_MAX_RETRIES,
+        retry_backoff=settings.DB_WRITE_RETRY_BACKOFF_SECONDS,
+    )
+
+
+# Write-behind queues: routes hand results over and return; rows are bulk-inserted in the background
+cultural_guide_writer = _writer(CulturalGuide)
+health_insurance_writer = _writer(HealthInsuranceLog)
+
+AI_RESULT_WRITERS = (cultural_guide_writer, health_insurance_writer)
+
+
+def save_cultural_guide(user_id: int, home_country: str, host_country: str, university: str, ai_advice) -> bool:
+    return cultural_guide_writer.add({
+        "user_id": user_id,
+        "home_country": home_country,
+        "host_country": host_country,
+        "university": university,
+        "ai_advice": ai_advice,
+    })
+
+
+def save_health_insurance_log(user_id: int, query_text: str, ai_analysis) -> bool:
+    return health_insurance_writer.add({
+        "user_id": user_id,
+        "query_text": query_text,
+        "ai_analysis": ai_analysis,
+    })
+
+
+def start_writers():
+    for writer in AI_RESULT_WRITERS:
+        writer.start()
+
+
+async def stop_writers():
+    """Flushes every pending result; called on graceful shutdown."""
+    for writer in AI_RESULT_WRITERS:
+        await writer.stop()
+
+
+def writer_stats() -> list:
+    return [writer.stats() for writer in AI_RESULT_WRITERS]
@@ -0,0 +1,109 @@
+import logging
+from contextlib import aclosing
+from typing import List, Optional
+
+from app.config import settings
+from app.services.gemini_service import CHAT_UNAVAILABLE, gemini_service
+from app.utils.ai_tracing import record_gemini_error
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for Gemini's tokenizer on English text
+    return len(text) // 4 + 1
+
+
+def _turn_tokens(turn: dict) -> int:
+    return sum(estimate_tokens(str(part)) for part in turn["parts"])
+
+
+def pair_turns(history: List[dict]) -> List[dict]:
+    """
+    Stored messages as alternating user/model turns, as a chat session expects:
+    consecutive messages from the same role are merged into one turn, and a model
+    message with no user message before it, or a trailing user message with no
+    reply, is left out.
+    """
+    turns: List[dict] = []
+    for message in history:
+        if turns and turns[-1]["role"] == message["role"]:
+            turns[-1] = {"role": message["role"], "parts": turns[-1]["parts"] + list(message["parts"])}
+        elif turns or message["role"] == "user":
+            turns.append({"role": message["role"], "parts": list(message["parts"])})
+    if turns and turns[-1]["role"] == "user":
+        turns.pop()
+    return turns
+
+
+class ChatContext:
+    """
+    Conversation state for one chat socket. Holds a single Gemini chat session that
+    is reused across messages; once the history would exceed the token budget, the
+    older turns are folded into a running summary and the session is rebuilt from
+    summary + recent turns.
+    """
+    def __init__(self, history: List[dict], token_budget: Optional[int] = None, keep_turns: Optional[int] = None):
+        self.token_budget = token_budget or settings.CHAT_CONTEXT_TOKEN_BUDGET
+        self.keep_turns = keep_turns if keep_turns is not None else settings.CHAT_CONTEXT_KEEP_TURNS
+        self.summary = ""
+        self.turns: List[dict] = pair_turns(history)
+        self._chat = None
+        self.compactions = 0
+
+    def context_tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(_turn_tokens(turn) for turn in self.turns)
+
+    def _session_history(self) -> List[dict]:
+        if not self.summary:
+            return list(self.turns)
+        return [
+            {"role": "user", "parts": [f"Summary of our conversation so far: {self.summary}"]},
+            {"role": "model", "parts": ["Got it, I'll keep that in mind."]},
+        ] + self.turns
+
+    async def _compact(self, incoming: str):
+        if self.context_tokens() + estimate_tokens(incoming) <= self.token_budget:
+            return
+        # Cut at a user turn so the kept history still starts a user/model pair
+        cut = max(0, len(self.turns) - self.keep_turns)
+        while cut < len(self.turns) and self.turns[cut]["role"] != "user":
+            cut += 1
+        older, recent = self.turns[:cut], self.turns[cut:]
+        if not older:
+            return
+
+        summary = await gemini_service.summarize_chat(self.summary, older)
+        if summary is not None:
+            self.summary = summary
+        # Without a summary the older turns are still dropped; the window stays bounded
+        self.turns = recent
+        self._chat = None
+        self.compactions += 1
+
+    async def stream_reply(self, message: str):
+        """Streams the assistant's reply to message, recording the turn once it completes."""
+        await self._compact(message)
+        if self._chat is None:
+            try:
+                self._chat = gemini_service.create_chat(self._session_history())
+            except Exception as e:
+                # No client (GEMINI_API_KEY unset) or the SDK refused the history:
+                # answer like a failed stream instead of dropping the socket
+                logger.warning(f"Chat session could not be created: {e}")
+                record_gemini_error(e)
+                yield CHAT_UNAVAILABLE
+                return
+        chat = self._chat
+
+        recorded = len(chat.get_history(curated=True))
+        full_response = ""
+        async with aclosing(gemini_service.chat_stream(message, chat=chat)) as stream:
+            async for chunk in stream:
+                full_response += chunk
+                yield chunk
+
+        # The session only records turns Gemini actually completed; failed ones aren't kept
+        if len(chat.get_history(curated=True)) > recorded:
+            self.turns.append({"role": "user", "parts": [message]})
+            self.turns.append({"role": "model", "parts": [full_response]})
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import desc, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.chat import ChatHistory
+from app.utils.batch_writer import BatchWriter
+from app.utils.pagination import encode_cursor, decode_cursor
+
+# Chat messages from every socket share one buffer and are bulk-inserted on a timer or
+# once CHAT_HISTORY_BATCH_SIZE are waiting; sockets also flush it when they close
+chat_history_writer = BatchWriter(
+    ChatHistory,
+    max_batch=settings.CHAT_HISTORY_BATCH_SIZE,
+    flush_interval=settings.CHAT_HISTORY_FLUSH_INTERVAL_SECONDS,
+    max_pending=settings.CHAT_HISTORY_MAX_PENDING,
+    max_retries=settings.DB_WRITE_MAX_RETRIES,
+    retry_backoff=settings.DB_WRITE_RETRY_BACKOFF_SECONDS,
+)
+
+
+def save_chat_message(user_id: int, role: str, message: str) -> bool:
+    # Stamped now rather than by the server default, so rows written in one batch keep their order
+    return chat_history_writer.add({
+        "user_id": user_id,
+        "role": role,
+        "message": message,
+        "timestamp": datetime.now(timezone.utc),
+    })
+
+
+async def load_recent_history(user_id: int, limit: int = 20) -> List[dict]:
+    """The user's last `limit` messages in Gemini history format, oldest first."""
+    # Short-lived session: an idle socket shouldn't hold a pooled connection
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ChatHistory).filter(ChatHistory.user_id == user_id)
+            .order_by(desc(ChatHistory.timestamp), desc(ChatHistory.id)).limit(limit)
+        )
+        records = list(result.scalars().all())
+    records.reverse()
+    return [{'role': record.role, 'parts': [record.message]} for record in records]
+
+
+async def load_history_page(db: AsyncSession, user_id: int, limit: int,
+                            before: Optional[str] = None) -> Tuple[List[ChatHistory], Optional[str]]:
+    """
+    One page of a user's messages, newest first, plus the cursor for the next (older) page.
+    Keyset pagination on (timestamp, id): each page is an index range scan on
+    ix_chat_history_user_timestamp, so deep pages cost the same as the first.
+    """
+    query = select(ChatHistory).filter(ChatHistory.user_id == user_id)
+    if before is not None:
+        timestamp, record_id = decode_cursor(before, (datetime.fromisoformat, int))
+        query = query.filter(tuple_(ChatHistory.timestamp, ChatHistory.id) < tuple_(timestamp, record_id))
+    # One extra row tells us whether an older page exists
+    query = query.order_by(desc(ChatHistory.timestamp), desc(ChatHistory.id)).limit(limit + 1)
+
+    records = list((await db.execute(query)).scalars().all())
+    has_more = len(records) > limit
+    records = records[:limit]
+    last = records[-1] if records else None
+    next_cursor = encode_cursor(last.timestamp, last.id) if has_more and last.timestamp is not None else None
+    return records, next_cursor
@@ -1,11 +1,30 @@
 from google import genai
 from google.genai import types
 from app.config import settings
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+import asyncio
 import json
-import time
-from app.utils.gemini_rate_limiter import with_retry, with_cache
-from app.utils.analytics import log_ai_usage
+import logging
+from app.utils.gemini_rate_limiter import with_retry, with_cache, with_priority, PRIORITY_HIGH, PRIORITY_LOW
+from app.utils.ai_tracing import (
+    traced_feature, record_usage, record_gemini_call, record_gemini_error, record_parse_failure
+)
+from app.services.roommate_ranking import prerank_candidates, match_score
+from app.utils.semantic_cache import with_semantic_cache
+
+logger = logging.getLogger(__name__)
+
+
+# Prefix of the text _generate_response returns instead of raising when Gemini fails
+SERVICE_UNAVAILABLE = "AI Service Unavailable: "
+
+
+# Reply streamed to a chat socket when Gemini can't be reached
+CHAT_UNAVAILABLE = "I'm having trouble connecting right now. Please try again."
+
+
+class GeminiUnavailable(Exception):
+    """A Gemini generate call failed (after retries)."""
 
 
 class GeminiService:
@@ -13,20 +32,31 @@ class GeminiService:
         if settings.GEMINI_API_KEY:
             self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
             self.model_name = "gemini-2.0-flash" 
-
-    @with_retry(max_retries=0)
+        # Caps concurrent generate calls so a burst can't open unbounded sockets
+        self._generation_slots = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+        self._chat_stream_slots = asyncio.Semaphore(settings.GEMINI_MAX_CHAT_STREAMS)
+
+    async def _generate_content(self, contents: list):
+        # Async client keeps the event loop free while Gemini is thinking
+        async with self._generation_slots:
+            return await self.client.aio.models.generate_content(
+                model=self.model_name,
+                contents=contents
+            )
+
+    # Cache sits outside the limiter so hits and coalesced calls don't spend tokens.
+    # Failures raise, so they are never cached.
     @with_cache(ttl_seconds=3600)
-    async def _generate_response(self, prompt: str, model_type: str = 'text', image_data: Optional[bytes] = None) -> str:
-        start_time = time.time()
-        success = False
+    @with_retry(max_retries=0)
+    async def _generate_text(self, prompt: str, model_type: str = 'text', image_data: Optional[bytes] = None) -> str:
         print(f"DEBUG: Generating response with google-genai for model_type={model_type}")
         print(f"DEBUG: Prompt length: {len(prompt)}")
+        record_gemini_call()
         try:
             if model_type == 'vision' and image_data:
                 # Vision implementation for google-genai
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=[
+                response = await self._generate_content(
+                    [
                         types.Content(
                             role="user",
                             parts=[
@@ -38,22 +68,36 @@ class GeminiService:
                 )
             else:
                 # Standard text generation
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=[prompt]
-                )
+                response = await self._generate_content([prompt])
             
             print(f"DEBUG: Gemini Response received. text length={len(response.text)}")
-            success = True
+            record_usage(response.usage_metadata)
             return response.text
         except Exception as e:
             print(f"CRITICAL ERROR generating content: {e}")
             import traceback
             traceback.print_exc()
-            return "AI Service Unavailable: " + str(e)
-        finally:
-             latency = time.time() - start_time
-             log_ai_usage("AI_Generation", success, latency)
+            record_gemini_error(e)
+            raise GeminiUnavailable(str(e)) from e
+
+    async def _generate_response(self, prompt: str, model_type: str = 'text', image_data: Optional[bytes] = None) -> str:
+        """Gemini's reply text, or SERVICE_UNAVAILABLE + the error if the call failed."""
+        try:
+            return await self._generate_text(prompt, model_type, image_data)
+        except GeminiUnavailable as e:
+            return SERVICE_UNAVAILABLE + str(e)
+
+    async def _generate_json(self, prompt: str, model_type: str = 'text', image_data: Optional[bytes] = None) -> Any:
+        """Gemini's reply parsed as JSON, or None. A reply that doesn't parse is dropped from the cache."""
+        response = await self._generate_response(prompt, model_type, image_data)
+        parsed = self._clean_json(response)
+        if parsed is None:
+            await self._forget_reply(prompt, model_type, image_data)
+        return parsed
+
+    async def _forget_reply(self, prompt: str, model_type: str = 'text', image_data: Optional[bytes] = None):
+        # Drops an unusable cached reply so the next identical request asks Gemini again
+        await self._generate_text.forget(self, prompt, model_type, image_data)
 
     def _clean_json(self, text: str) -> Any:
         try:
@@ -69,9 +113,10 @@ class GeminiService:
                     return json.loads(text[start_idx:end_idx+1])
             except:
                 pass
+            record_parse_failure()
             return None
 
-    async def match_roommates(self, user_profile: dict, candidates: List[dict]) -> List[dict]:
+    async def _score_roommate_batch(self, user_profile: dict, candidates: List[dict]) -> List[dict]:
         # detailed matching with compatibility scores
         candidates_json = json.dumps(candidates)
         prompt = f"""
@@ -105,36 +150,105 @@ class GeminiService:
           }}
         ]
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
-        return parsed if isinstance(parsed, list) else []
+        parsed = await self._generate_json(prompt)
+        if not isinstance(parsed, list):
+            return []
+        return [match for match in parsed if isinstance(match, dict)]
+
+    @traced_feature("match_roommates")
+    async def match_roommates_stream(self, user_profile: dict, candidates: List[dict], top_k: Optional[int] = None):
+        """
+        Scores candidates in fixed-size batches concurrently (each batch is one Gemini
+        call under the rate limiter) and yields the merged ranking after every batch,
+        so the best matches found so far reach the client before the pool is done.
+        Large pools are first cut to a shortlist by the local NumPy scorer, so
+        Gemini only writes the narrative for plausible matches.
+        """
+        shortlist_size = max(settings.ROOMMATE_PRERANK_SHORTLIST, top_k or 0)
+        candidates = prerank_candidates(user_profile, candidates, shortlist_size)
+
+        batch_size = max(1, settings.ROOMMATE_MATCH_BATCH_SIZE)
+        batches = [candidates[i:i + batch_size] for i in range(0, len(candidates), batch_size)]
+        tasks = [asyncio.ensure_future(self._score_roommate_batch(user_profile, batch)) for batch in batches]
 
-    async def search_hostels(self, query: str, filters: dict) -> dict:
+        ranked: List[dict] = []
+        scored = 0
+        try:
+            for next_batch in asyncio.as_completed(tasks):
+                try:
+                    matches = await next_batch
+                except Exception as e:
+                    logger.warning(f"Roommate batch failed: {e}")
+                    matches = []
+                ranked.extend(matches)
+                ranked.sort(key=match_score, reverse=True)
+                if top_k is not None:
+                    del ranked[top_k:]
+                scored += 1
+                yield {
+                    "matches": list(ranked),
+                    "batches_done": scored,
+                    "batches_total": len(batches),
+                    "complete": scored == len(batches)
+                }
+        finally:
+            # Client went away mid-stream: stop scoring the remaining batches
+            for task in tasks:
+                task.cancel()
+
+    @traced_feature("match_roommates")
+    async def match_roommates(self, user_profile: dict, candidates: List[dict], top_k: Optional[int] = None) -> List[dict]:
+        ranked: List[dict] = []
+        async for update in self.match_roommates_stream(user_profile, candidates, top_k):
+            ranked = update["matches"]
+        return ranked
+
+    @traced_feature("annotate_listings")
+    async def annotate_listings(self, listings: List[dict]) -> Dict[int, dict]:
+        """
+        pros / cons / best_for for every listing in one call, keyed by listing id.
+        Listings Gemini skips or answers malformed are left out.
+        """
         prompt = f"""
         You are a hostel recommendation expert for international students.
-        
-        Search Query: "{query}"
-        Filters: {json.dumps(filters)}
-        
-        Generate 3-5 realistic hostel/housing options near universities.
-        
-        For each listing provide JSON structure in a "results" array with these fields:
-        - name
-        - distance (e.g. "5 mins walk")
-        - verified (boolean)
-        - price (e.g. "$600/mo")
-        - type (e.g. "Shared Room")
-        - facilities (list of strings)
-        - best_for (short tag)
-        - pros (list of strings)
-        - cons (list of strings)
-        
-        Also include a "search_summary" string.
+
+        Listings:
+        {json.dumps(listings)}
+
+        For every listing, assess it for a student deciding where to live, using only
+        the details given. Do not invent amenities or distances.
+
+        Return ONLY valid JSON in this format:
+        [
+          {{
+            "id": 123,
+            "pros": ["Short point", "Short point"],
+            "cons": ["Short point"],
+            "best_for": "Short tag, e.g. Budget-conscious freshers"
+          }}
+        ]
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
-        return parsed if isinstance(parsed, dict) else {"results": [], "search_summary": "Unable to find listings"}
+        parsed = await self._generate_json(prompt)
+        annotations = {}
+        for item in parsed if isinstance(parsed, list) else []:
+            if not isinstance(item, dict):
+                continue
+            try:
+                listing_id = int(item.get("id"))
+            except (TypeError, ValueError):
+                continue
+            pros, cons = item.get("pros"), item.get("cons")
+            annotations[listing_id] = {
+                "pros": [str(point) for point in pros] if isinstance(pros, list) else [],
+                "cons": [str(point) for point in cons] if isinstance(cons, list) else [],
+                "best_for": str(item.get("best_for") or ""),
+            }
+        if len(annotations) < len(listings):
+            # Not cached, so the listings left out are asked about again next time
+            await self._forget_reply(prompt)
+        return annotations
 
+    @traced_feature("analyze_lease")
     async def analyze_lease(self, text: str) -> dict:
         prompt = f"""
         Analyze this rental contract: "{text}"
@@ -149,59 +263,63 @@ class GeminiService:
             "recommendation": "..."
         }}
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
+        parsed = await self._generate_json(prompt)
         return parsed if isinstance(parsed, dict) else {"summary": "Error analyzing", "rating": "Unknown"}
 
 
+    @traced_feature("community_connect")
     async def community_connect(self, user_profile: dict, query: str = "") -> dict:
         prompt = f"""
         You are a community manager for a global student platform.
         ...
         Return JSON structure with a "results" array.
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
+        parsed = await self._generate_json(prompt)
         return parsed if isinstance(parsed, dict) else {"results": [], "analysis_summary": "Error fetching groups"}
 
+    @traced_feature("ask_community")
+    @with_semantic_cache("ask_community", text_fields=("question",), exact_fields=("community_context",))
     async def ask_community(self, community_context: str, question: str) -> dict:
         prompt = f"""
         ...
         Return JSON with "answer", "confidence", "related_topics".
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
+        parsed = await self._generate_json(prompt)
         return parsed if isinstance(parsed, dict) else {"answer": "Error", "confidence": "Low"}
 
+    @traced_feature("find_jobs")
+    @with_priority(PRIORITY_LOW)
     async def find_jobs(self, user_profile: dict, query: str = "") -> dict:
         prompt = f"""
         ...
         Return JSON with results array.
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
+        parsed = await self._generate_json(prompt)
         return parsed if isinstance(parsed, dict) else {"results": [], "summary": "Error searching jobs"}
 
+    @traced_feature("analyze_job_scam")
     async def analyze_job_scam(self, text: str, image_data: Optional[bytes] = None) -> dict:
         prompt = f"""
         ...
         Return JSON with "risk_level", "verdict", "explanation".
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
+        parsed = await self._generate_json(prompt)
         return parsed if isinstance(parsed, dict) else {"risk_level": "Unknown", "verdict": "Error"}
 
 
+    @traced_feature("cultural_guidance")
+    @with_semantic_cache("cultural_guidance", text_fields=("challenges",),
+                         exact_fields=("home_country", "host_country", "university", "week"))
     async def cultural_guidance(self, home_country: str, host_country: str, university: str, week: int, challenges: str) -> dict:
         prompt = f"""
         ...
         Return valid JSON only.
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
+        parsed = await self._generate_json(prompt)
         return parsed if isinstance(parsed, dict) else {"encouragement": "Stay positive!", "key_differences": []}
 
 
+    @traced_feature("cultural_discovery")
     async def cultural_discovery(self, home_country: str, host_country: str, city: str, date_range: str) -> dict:
         prompt = f"""
         You are an AI cultural assistant.
@@ -243,25 +361,20 @@ class GeminiService:
           "active_groups": ["Group 1", "Group 2"]
         }}
         """
-        response = await self._generate_response(prompt)
-              
-        # Parse JSON from response
-        try:
-            clean_text = response.replace('```json', '').replace('```', '').strip()
-            return json.loads(clean_text)
-        except:
-             return {"events": [], "community_summary": "Unable to fetch events", "active_groups": []}
+        parsed = await self._generate_json(prompt)
+        return parsed if isinstance(parsed, dict) else {"events": [], "community_summary": "Unable to fetch events", "active_groups": []}
 
+    @traced_feature("financial_guidance")
     async def financial_guidance(self, data: dict) -> dict:
         prompt = f"""
         ...
         Return JSON with comprehensive financial advice.
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
+        parsed = await self._generate_json(prompt)
         return parsed if isinstance(parsed, dict) else {"budget_plan": "Error", "cost_saving_tips": []}
 
 
+    @traced_feature("analyze_financial_risk")
     async def analyze_financial_risk(self, text: str) -> dict:
         prompt = f"""
         You are a financial fraud detection expert for students.
@@ -284,43 +397,85 @@ class GeminiService:
         }}
         """
         response = await self._generate_response(prompt)
-        try:
-            return json.loads(response.replace('```json', '').replace('```', '').strip())
-        except:
-             return {"risk_level": "Unknown", "analysis": response}
+        parsed = self._clean_json(response)
+        if isinstance(parsed, dict):
+            return parsed
+        await self._forget_reply(prompt)
+        return {"risk_level": "Unknown", "analysis": response}
 
+    @traced_feature("community_recommendations")
     async def community_recommendations(self, data: dict) -> dict:
         prompt = f"""
         ...
         RESPONSE (JSON format only):
         ...
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
+        parsed = await self._generate_json(prompt)
         return parsed if isinstance(parsed, dict) else {"recommended_activities": []}
 
 
+    @traced_feature("emergency_support")
+    @with_priority(PRIORITY_HIGH)
     async def emergency_support(self, input_text: str, language: str = "en") -> dict:
         prompt = f"""
         ...
         Return JSON for emergency support.
         """
-        response = await self._generate_response(prompt)
-        parsed = self._clean_json(response)
+        parsed = await self._generate_json(prompt)
         return parsed if isinstance(parsed, dict) else {"severity": "HIGH", "message_to_user": "Error assessing situation. Contact security."}
 
 
-    async def chat_stream(self, message: str, history: List[dict] = []):
+    def create_chat(self, history: List[dict] = []):
+        """A Gemini chat session; it keeps its own history as messages are sent."""
+        return self.client.aio.chats.create(model=self.model_name, history=history)
+
+    @traced_feature("chat_stream")
+    async def chat_stream(self, message: str, history: List[dict] = [], chat=None):
+        # Chunks are pulled from the async SDK stream one at a time, so the next
+        # chunk is only requested once the caller has consumed the previous one.
+        # Closing this generator (e.g. the socket went away) closes the upstream stream.
+        # Pass an existing session as chat to continue it instead of starting from history.
         try:
-            chat = self.client.chats.create(model=self.model_name, history=history)
-            response = chat.send_message_stream(message)
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+            async with self._chat_stream_slots:
+                if chat is None:
+                    chat = self.create_chat(history)
+                response = await chat.send_message_stream(message)
+                try:
+                    record_gemini_call()
+                    async for chunk in response:
+                        # Stream chunks carry running totals, not per-chunk counts
+                        record_usage(chunk.usage_metadata, cumulative=True)
+                        if chunk.text:
+                            yield chunk.text
+                finally:
+                    await response.aclose()
         except Exception as e:
             print(f"Chat Error: {e}")
-            yield "I'm having trouble connecting right now. Please try again."
+            record_gemini_error(e)
+            yield CHAT_UNAVAILABLE
+
+    @traced_feature("chat_summary")
+    async def summarize_chat(self, previous_summary: str, turns: List[dict]) -> Optional[str]:
+        """Folds older chat turns into the running summary; None if Gemini is unavailable."""
+        transcript = "\n".join(
+            f"{turn['role']}: {' '.join(str(part) for part in turn['parts'])}" for turn in turns
+        )
+        prompt = f"""
+        You are summarizing a conversation between an international student and HomeHub's assistant.
+        Summary so far: "{previous_summary or 'None'}"
+        Newer messages:
+        {transcript}
+
+        Write an updated summary in under 150 words. Keep names, places, dates, numbers,
+        the student's situation and anything still unresolved. Return plain text only.
+        """
+        summary = await self._generate_response(prompt)
+        if not summary or summary.startswith(SERVICE_UNAVAILABLE):
+            return None
+        return summary.strip()
 
+    @traced_feature("analyze_health_insurance")
+    @with_semantic_cache("analyze_health_insurance", text_fields=("query",))
     async def analyze_health_insurance(self, query: str) -> dict:
         prompt = f"""
         You are an expert health insurance advisor for international students in the US.
@@ -343,15 +498,10 @@ class GeminiService:
             "tips": "string"
         }}
         """
-        
-        try:
-            response_text = await self._generate_response(prompt)
-            # Clean json
-            clean_text = response_text.replace('```json', '').replace('```', '').strip()
-            return json.loads(clean_text)
-        except Exception as e:
-            print(f"Error parsing Health Insurance response: {e}")
-            return {
+        parsed = await self._generate_json(prompt)
+        if isinstance(parsed, dict):
+            return parsed
+        return {
                 "summary": "Unable to analyze at this time",
                 "coverage_details": [],
                 "recommendation": "Please try again",
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.housing import Housing
+from app.services.housing_search import HousingFilters
+from app.utils.geo_index import GeoGridIndex
+
+logger = logging.getLogger(__name__)
+
+
+class ListingGeoIndex:
+    """
+    Listing coordinates held in a GeoGridIndex so radius and nearest-listing queries
+    never scan the housing table. Loaded from the database at startup and every
+    refresh_interval seconds, so new or moved listings show up within one interval.
+    """
+    def __init__(self, cell_degrees: float = 0.005, refresh_interval: float = 300.0):
+        self.cell_degrees = cell_degrees
+        self.refresh_interval = refresh_interval
+        self.index = GeoGridIndex(cell_degrees)
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+
+    def _build(self, rows) -> GeoGridIndex:
+        index = GeoGridIndex(self.cell_degrees)
+        for listing_id, latitude, longitude in rows:
+            index.upsert(listing_id, latitude, longitude)
+        return index
+
+    async def refresh(self):
+        """Rebuilds the index from the housing table and swaps it in."""
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Housing.id, Housing.latitude, Housing.longitude)
+                .filter(Housing.latitude.isnot(None), Housing.longitude.isnot(None))
+            )).all()
+        # Built off the event loop; requests keep using the current index meanwhile
+        self.index = await asyncio.to_thread(self._build, rows)
+        self.refreshes += 1
+
+    async def _refresh_forever(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Listing geo index refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def nearby(self, db: AsyncSession, latitude: float, longitude: float, radius_km: float,
+                     limit: int = 20, filters: Optional[HousingFilters] = None) -> List[Tuple[Housing, float]]:
+        """
+        Listings within radius_km that pass filters, nearest first, with their distance in km.
+        Candidates come from the index in distance order and are checked against the
+        filters in the database a batch at a time (ids only, batches doubling), so a
+        selective filter costs a few primary-key lookups rather than a table scan;
+        full rows are loaded once, for the listings returned.
+        """
+        filters = filters or HousingFilters()
+        batch_size = max(limit * 2, 50)
+        matched: List[Tuple[int, float]] = []
+        candidates = self.index.iter_nearest(latitude, longitude, max_km=radius_km)
+        while len(matched) < limit:
+            batch = [hit for _, hit in zip(range(batch_size), candidates)]
+            if not batch:
+                break
+            query = filters.apply(select(Housing.id).filter(Housing.id.in_([listing_id for listing_id, _ in batch])))
+            passed = set((await db.execute(query)).scalars().all())
+            matched.extend(hit for hit in batch if hit[0] in passed)
+            batch_size *= 2
+        matched = matched[:limit]
+        if not matched:
+            return []
+
+        listings = (await db.execute(select(Housing).filter(Housing.id.in_([listing_id for listing_id, _ in matched])))).scalars().all()
+        by_id = {listing.id: listing for listing in listings}
+        return [(by_id[listing_id], distance) for listing_id, distance in matched if listing_id in by_id]
+
+    def stats(self) -> dict:
+        return {"listings": len(self.index), "refreshes": self.refreshes}
+
+
+listing_geo_index = ListingGeoIndex(
+    cell_degrees=settings.GEO_CELL_DEGREES,
+    refresh_interval=settings.GEO_INDEX_REFRESH_SECONDS,
+)
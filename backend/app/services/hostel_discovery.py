@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.housing import Housing
+from app.models.university import University
+from app.services.gemini_service import gemini_service
+from app.services.geo_search import listing_geo_index
+from app.services.housing_search import HousingFilters, search_listings, search_listings_text
+from app.utils.geo_index import haversine_km
+from app.utils.response_cache import cache_backend
+
+logger = logging.getLogger(__name__)
+
+ANNOTATION_KEY_PREFIX = "hostel_annotation:"
+# Same bound as GET /housing/nearby
+MAX_RADIUS_KM = 50.0
+
+# "under $500", "max 650 a month", "up to $1,200" (but not "under 5 mins walk")
+_PRICE_CAP = re.compile(
+    r"(?:under|below|less than|max(?:imum)?|up to|budget(?: of)?)\s*"
+    r"(?:\$\s*(\d[\d,]*)|(\d[\d,]*)\s*(?:usd|dollars|/\s*mo|a month|per month))",
+    re.IGNORECASE,
+)
+
+class UniversityLocationNotFound(LookupError):
+    """university_id names no university, or one without coordinates."""
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        if value.lower() in ("true", "1", "yes"):
+            return True
+        if value.lower() in ("false", "0", "no"):
+            return False
+        raise ValueError(value)
+    return bool(value)
+
+
+_FILTER_TYPES = {
+    "min_price": float,
+    "max_price": float,
+    "min_bedrooms": int,
+    "max_bedrooms": int,
+    "min_bathrooms": float,
+    "is_verified": _to_bool,
+    "currency": str,
+}
+
+annotation_stats = {"cached": 0, "generated": 0, "failed": 0}
+
+
+@dataclass
+class Candidate:
+    listing: Housing
+    distance_km: Optional[float] = None
+    relevance: Optional[float] = None
+
+
+def _bounded(filters: dict, name: str, low: float, high: float) -> Optional[float]:
+    """filters[name] as a float within [low, high], or None if it isn't set."""
+    value = filters.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for {name}: {value!r}")
+    if not low <= number <= high:
+        raise ValueError(f"{name} must be between {low:g} and {high:g}, got {value!r}")
+    return number
+
+
+def parse_radius(filters: dict) -> float:
+    radius_km = _bounded(filters, "radius_km", 0, MAX_RADIUS_KM)
+    if radius_km is None:
+        return settings.HOSTEL_DISCOVERY_RADIUS_KM
+    if radius_km == 0:
+        raise ValueError("radius_km must be greater than 0")
+    return radius_km
+
+
+def parse_filters(query: str, filters: dict) -> HousingFilters:
+    """HousingFilters from the request's filters dict, plus a price cap stated in the query."""
+    values = {}
+    for name, kind in _FILTER_TYPES.items():
+        value = filters.get(name)
+        if value is None or value == "":
+            continue
+        try:
+            values[name] = kind(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for {name}: {value!r}")
+    if "max_price" not in values:
+        match = _PRICE_CAP.search(query)
+        if match:
+            values["max_price"] = float((match.group(1) or match.group(2)).replace(",", ""))
+    return HousingFilters(**values)
+
+
+async def _resolve_location(db: AsyncSession, filters: dict) -> Tuple[Optional[Tuple[float, float]], Optional[str]]:
+    """(lat, lon) to search around and a label for the summary, or (None, None)."""
+    if filters.get("university_id") is not None:
+        try:
+            university_id = int(filters["university_id"])
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for university_id: {filters['university_id']!r}")
+        university = await db.get(University, university_id)
+        if university is None or university.latitude is None or university.longitude is None:
+            # Searching without the location would answer a different question
+            raise UniversityLocationNotFound("University location not found")
+        return (university.latitude, university.longitude), university.name
+    latitude = _bounded(filters, "latitude", -90, 90)
+    longitude = _bounded(filters, "longitude", -180, 180)
+    if latitude is not None and longitude is not None:
+        return (latitude, longitude), "your location"
+    return None, None
+
+
+async def retrieve(db: AsyncSession, query: str, filters: HousingFilters, location: Optional[Tuple[float, float]],
+                   radius_km: float, limit: int) -> List[Candidate]:
+    """
+    Real listings for the request. Near a location: text matches within the radius,
+    nearest first, or simply the nearest listings if none match the words.
+    Without one: best text matches, or the cheapest listings if nothing matches.
+    """
+    if location is not None:
+        lat, lon = location
+        # Wider text pool, since the radius will discard some of it
+        hits = await search_listings_text(db, query, filters, limit * 5)
+        near = [
+            Candidate(listing, haversine_km(lat, lon, listing.latitude, listing.longitude), score)
+            for listing, score in hits if listing.latitude is not None and listing.longitude is not None
+        ]
+        near = sorted((c for c in near if c.distance_km <= radius_km), key=lambda c: c.distance_km)
+        if near:
+            return near[:limit]
+        return [Candidate(listing, distance) for listing, distance in
+                await listing_geo_index.nearby(db, lat, lon, radius_km, limit, filters)]
+
+    hits = await search_listings_text(db, query, filters, limit)
+    if hits:
+        return [Candidate(listing, relevance=score) for listing, score in hits]
+    listings, _ = await search_listings(db, filters, limit)
+    return [Candidate(listing) for listing in listings]
+
+
+def _listing_facts(listing: Housing) -> dict:
+    # Only the listing's own details: the annotation must not depend on who is searching
+    return {
+        "id": listing.id,
+        "title": listing.title,
+        "description": (listing.description or "")[:500],
+        "address": listing.address,
+        "price": listing.price,
+        "currency": listing.currency,
+        "bedrooms": listing.bedrooms,
+        "bathrooms": listing.bathrooms,
+        "verified": bool(listing.is_verified),
+    }
+
+
+def _annotation_key(listing: Housing) -> str:
+    # Keyed on the listing's content too, so an edited listing gets a fresh annotation
+    facts = json.dumps(_listing_facts(listing), sort_keys=True, default=str)
+    return f"{ANNOTATION_KEY_PREFIX}{listing.id}:{hashlib.sha256(facts.encode('utf-8')).hexdigest()[:16]}"
+
+
+async def annotate(listings: List[Housing]) -> Dict[int, dict]:
+    """
+    pros / cons / best_for per listing. Cached annotations are reused; the rest come
+    from one batched Gemini call and are cached for HOSTEL_ANNOTATION_TTL_SECONDS.
+    """
+    keys = {listing.id: _annotation_key(listing) for listing in listings}
+    cached = await asyncio.gather(*(cache_backend.get(key) for key in keys.values()))
+    annotations = {listing_id: value for listing_id, (found, value) in zip(keys, cached) if found}
+    annotation_stats["cached"] += len(annotations)
+
+    missing = [listing for listing in listings if listing.id not in annotations]
+    if missing:
+        generated = await gemini_service.annotate_listings([_listing_facts(listing) for listing in missing])
+        for listing in missing:
+            if listing.id in generated:
+                annotations[listing.id] = generated[listing.id]
+                await cache_backend.set(keys[listing.id], generated[listing.id], settings.HOSTEL_ANNOTATION_TTL_SECONDS)
+        failed = [listing.id for listing in missing if listing.id not in generated]
+        annotation_stats["generated"] += len(missing) - len(failed)
+        if failed:
+            # Not cached: the next search asks again
+            annotation_stats["failed"] += len(failed)
+            logger.warning(f"No annotation returned for listings {failed}")
+    return annotations
+
+
+def _format_price(listing: Housing) -> Optional[str]:
+    if listing.price is None:
+        return None
+    if (listing.currency or "USD").upper() == "USD":
+        return f"${listing.price:,.0f}/mo"
+    return f"{listing.price:,.0f} {listing.currency.upper()}/mo"
+
+
+def _format_distance(distance_km: Optional[float]) -> Optional[str]:
+    if distance_km is None:
+        return None
+    if distance_km < 1:
+        return f"{int(round(distance_km * 1000, -1))} m"
+    return f"{distance_km:.1f} km"
+
+
+def _listing_type(listing: Housing) -> Optional[str]:
+    if listing.bedrooms is None:
+        return None
+    return "Studio" if listing.bedrooms == 0 else f"{listing.bedrooms}-bedroom"
+
+
+def _summary(count: int, query: str, place: Optional[str], radius_km: float) -> str:
+    if not count:
+        return "No listings match your search yet. Try widening the price range or distance."
+    where = f" within {radius_km:g} km of {place}" if place else ""
+    return f"Found {count} listing{'s' if count != 1 else ''}{where} for \"{query.strip()}\"."
+
+
+async def discover_hostels(db: AsyncSession, query: str, filters: dict) -> dict:
+    """
+    Hostel discovery over real listings: retrieve from the housing table (text index
+    and/or spatial index), then annotate what was found. Gemini never invents listings
+    and is only called for listings it hasn't annotated before.
+    """
+    housing_filters = parse_filters(query, filters)
+    radius_km = parse_radius(filters)
+    location, place = await _resolve_location(db, filters)
+    limit = settings.HOSTEL_DISCOVERY_MAX_RESULTS
+
+    candidates = await retrieve(db, query, housing_filters, location, radius_km, limit)
+    annotations = await annotate([candidate.listing for candidate in candidates]) if candidates else {}
+
+    results = []
+    for candidate in candidates:
+        listing = candidate.listing
+        annotation = annotations.get(listing.id, {})
+        has_coordinates = listing.latitude is not None and listing.longitude is not None
+        results.append({
+            "id": listing.id,
+            "name": listing.title,
+            "address": listing.address,
+            "price": _format_price(listing),
+            "type": _listing_type(listing),
+            "distance": _format_distance(candidate.distance_km),
+            "distance_km": round(candidate.distance_km, 3) if candidate.distance_km is not None else None,
+            "relevance": candidate.relevance,
+            "verified": bool(listing.is_verified),
+            "facilities": [],
+            "best_for": annotation.get("best_for", ""),
+            "pros": annotation.get("pros", []),
+            "cons": annotation.get("cons", []),
+            "coordinates": {"lat": listing.latitude, "lng": listing.longitude} if has_coordinates else None,
+        })
+    return {"results": results, "search_summary": _summary(len(results), query, place, radius_km)}
@@ -0,0 +1,117 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from sqlalchemy import column, desc, func, literal_column, select, table, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.housing import Housing
+from app.utils.pagination import encode_cursor, decode_cursor
+
+
+@dataclass
+class HousingFilters:
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_bedrooms: Optional[int] = None
+    max_bedrooms: Optional[int] = None
+    min_bathrooms: Optional[float] = None
+    is_verified: Optional[bool] = None
+    currency: Optional[str] = None
+
+    def apply(self, query):
+        if self.min_price is not None:
+            query = query.filter(Housing.price >= self.min_price)
+        if self.max_price is not None:
+            query = query.filter(Housing.price <= self.max_price)
+        if self.min_bedrooms is not None:
+            query = query.filter(Housing.bedrooms >= self.min_bedrooms)
+        if self.max_bedrooms is not None:
+            query = query.filter(Housing.bedrooms <= self.max_bedrooms)
+        if self.min_bathrooms is not None:
+            query = query.filter(Housing.bathrooms >= self.min_bathrooms)
+        if self.is_verified is not None:
+            query = query.filter(Housing.is_verified == self.is_verified)
+        if self.currency:
+            query = query.filter(Housing.currency == self.currency.upper())
+        return query
+
+
+async def search_listings(db: AsyncSession, filters: HousingFilters, limit: int = 20,
+                          after: Optional[str] = None) -> Tuple[List[Housing], Optional[str]]:
+    """
+    One page of matching listings, cheapest first, plus the cursor for the next page.
+    Keyset pagination on (price, id) walks ix_housing_price_bedrooms in order, so a
+    page costs the same however deep it is.
+    """
+    query = filters.apply(select(Housing).filter(Housing.price.isnot(None)))
+    if after is not None:
+        price, listing_id = decode_cursor(after, (float, int))
+        query = query.filter(tuple_(Housing.price, Housing.id) > tuple_(price, listing_id))
+    # One extra row tells us whether there is a next page
+    query = query.order_by(Housing.price, Housing.id).limit(limit + 1)
+
+    listings = list((await db.execute(query)).scalars().all())
+    has_more = len(listings) > limit
+    listings = listings[:limit]
+    next_cursor = encode_cursor(listings[-1].price, listings[-1].id) if has_more else None
+    return listings, next_cursor
+
+
+# SQLite FTS5 index over housing (see app/models/housing.py)
+_housing_fts = table("housing_fts", column("rowid"))
+
+# Longer queries add little to ranking and make the match expression expensive
+MAX_QUERY_TERMS = 16
+
+
+def _query_terms(query: str) -> List[str]:
+    # Word characters only, so nothing the user types is parsed as query syntax
+    return re.findall(r"\w+", query.lower())[:MAX_QUERY_TERMS]
+
+
+def _text_search_statement(dialect: str, terms: List[str], match_all: bool):
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery("english", (" & " if match_all else " | ").join(terms))
+        vector = literal_column("housing.search_vector")
+        score = func.ts_rank_cd(vector, tsquery)
+        statement = select(Housing, score.label("score")).filter(vector.op("@@")(tsquery))
+    else:
+        # FTS5's bm25() is lower-is-better; column weights follow title/description/address
+        score = -literal_column("bm25(housing_fts, 10.0, 4.0, 1.0)")
+        match = (" AND " if match_all else " OR ").join(f'"{term}"' for term in terms)
+        statement = (
+            select(Housing, score.label("score"))
+            .join(_housing_fts, _housing_fts.c.rowid == Housing.id)
+            .filter(literal_column("housing_fts").op("MATCH")(match))
+        )
+    return statement, score
+
+
+async def search_listings_text(db: AsyncSession, query: str, filters: HousingFilters,
+                               limit: int = 20) -> List[Tuple[Housing, float]]:
+    """
+    Listings matching a free-text query, best match first, with a relevance score
+    (higher is better). Title matches weigh most, then description, then address.
+    Uses the Postgres tsvector/GIN index or the SQLite FTS5 table.
+    Listings containing every word come first: that's both the better answer and
+    a much smaller set to rank. Only if they can't fill the page are listings matching
+    any of the words ranked, and the rest of the page filled from those.
+    """
+    terms = _query_terms(query)
+    if not terms:
+        return []
+
+    dialect = db.bind.dialect.name
+    hits = []
+    for match_all in ((True, False) if len(terms) > 1 else (False,)):
+        statement, score = _text_search_statement(dialect, terms, match_all)
+        statement = filters.apply(statement)
+        if hits:
+            # Already on the page from the every-word pass
+            statement = statement.filter(Housing.id.notin_([listing.id for listing, _ in hits]))
+        statement = statement.order_by(desc(score), Housing.id).limit(limit - len(hits))
+        hits += [(listing, float(rank)) for listing, rank in (await db.execute(statement)).all()]
+        if len(hits) >= limit:
+            break
+    return hits
@@ -0,0 +1,129 @@
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.matching import RoommateMatch
+from app.models.user import User
+from app.services.gemini_service import gemini_service
+from app.services.roommate_ranking import prerank_candidates, match_score
+from app.utils.response_cache import make_cache_key
+
+
+def _profile_id(profile: dict) -> Optional[int]:
+    for key in ("id", "user_id", "candidate_id"):
+        value = profile.get(key)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+    return None
+
+
+def pair_fingerprint(user_profile: dict, candidate: dict) -> str:
+    """Changes whenever either profile changes, which invalidates the stored score."""
+    return make_cache_key("roommate-pair", (user_profile, candidate))
+
+
+async def load_matches(db: AsyncSession, user_id: int, candidate_ids: Iterable[int]) -> Dict[int, RoommateMatch]:
+    """Fetches stored results for many candidates in one indexed query."""
+    candidate_ids = list(candidate_ids)
+    if not candidate_ids:
+        return {}
+    result = await db.execute(
+        select(RoommateMatch).filter(
+            RoommateMatch.user_id == user_id,
+            RoommateMatch.match_user_id.in_(candidate_ids)
+        )
+    )
+    return {row.match_user_id: row for row in result.scalars().all()}
+
+
+async def save_matches(db: AsyncSession, user_id: int, results: List[dict], fingerprints: Dict[int, str]) -> None:
+    """
+    Upserts fresh Gemini results in one INSERT ... ON CONFLICT (user_id, match_user_id)
+    DO UPDATE, so concurrent requests for the same pair can't collide on the unique
+    index. Pairs whose ids aren't registered users are skipped (the foreign keys
+    would reject them).
+    """
+    scored = {}
+    for match in results:
+        candidate_id = _profile_id(match)
+        if candidate_id is not None and candidate_id in fingerprints:
+            scored[candidate_id] = match
+    if not scored:
+        return
+
+    known = set((await db.execute(select(User.id).filter(User.id.in_([user_id, *scored])))).scalars().all())
+    if user_id not in known:
+        return
+    rows = [
+        {
+            "user_id": user_id,
+            "match_user_id": candidate_id,
+            "compatibility_score": match_score(match),
+            "analysis": match,
+            "profile_hash": fingerprints[candidate_id],
+        }
+        for candidate_id, match in scored.items() if candidate_id in known
+    ]
+    if not rows:
+        return
+
+    insert = postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    statement = insert(RoommateMatch).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[RoommateMatch.user_id, RoommateMatch.match_user_id],
+        set_={
+            "compatibility_score": statement.excluded.compatibility_score,
+            "analysis": statement.excluded.analysis,
+            "profile_hash": statement.excluded.profile_hash,
+            "updated_at": func.now(),
+        },
+    )
+    await db.execute(statement)
+    await db.commit()
+
+
+async def match_roommates_with_store(db: AsyncSession, user_profile: dict, candidates: List[dict],
+                                     top_k: Optional[int] = None) -> List[dict]:
+    """
+    Serves (user, candidate) pairs from roommate_matches when neither profile has
+    changed since they were scored; only new or changed pairs go to Gemini.
+    """
+    user_id = _profile_id(user_profile)
+    if user_id is None:
+        # Nothing to key the store on
+        return await gemini_service.match_roommates(user_profile, candidates, top_k)
+
+    shortlist_size = max(settings.ROOMMATE_PRERANK_SHORTLIST, top_k or 0)
+    shortlist = prerank_candidates(user_profile, candidates, shortlist_size)
+
+    fingerprints: Dict[int, str] = {}
+    for candidate in shortlist:
+        candidate_id = _profile_id(candidate)
+        if candidate_id is not None:
+            fingerprints[candidate_id] = pair_fingerprint(user_profile, candidate)
+
+    existing = await load_matches(db, user_id, fingerprints)
+
+    reused = []
+    stale = []
+    for candidate in shortlist:
+        candidate_id = _profile_id(candidate)
+        row = existing.get(candidate_id) if candidate_id is not None else None
+        if row is not None and row.profile_hash == fingerprints[candidate_id] and row.analysis:
+            reused.append(row.analysis)
+        else:
+            stale.append(candidate)
+
+    fresh = []
+    if stale:
+        fresh = await gemini_service.match_roommates(user_profile, stale)
+        await save_matches(db, user_id, fresh, fingerprints)
+
+    ranked = sorted(reused + fresh, key=match_score, reverse=True)
+    return ranked[:top_k] if top_k is not None else ranked
@@ -0,0 +1,183 @@
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Lifestyle traits on a -1..1 axis, read from structured fields or free text
+# (e.g. habits: "Night owl, Gamer"). 0 means the profile doesn't say.
+_TRAIT_PATTERNS = {
+    "sleep": (r"night owl|late sleeper|stays? up late|nocturnal", r"early riser|early bird|morning person|sleeps? early"),
+    "cleanliness": (r"clean|tidy|neat|organi[sz]ed", r"messy|untidy|relaxed about mess"),
+    "social": (r"social|outgoing|party|extrovert", r"quiet|studious|introvert|homebody|reserved"),
+    "smoking": (r"(?<!non-)(?<!non )(?<!no )smok", r"non-?smok|no smoking|don'?t smoke"),
+    "drinking": (r"(?<!no )drink|beer|wine", r"no drinking|don'?t drink|sober|teetotal"),
+    "guests": (r"guests? (welcome|often|ok)|hosts? friends", r"no guests|few guests|rarely (has )?guests"),
+}
+_TRAITS = list(_TRAIT_PATTERNS)
+_TRAIT_INDEX = {trait: col for col, trait in enumerate(_TRAITS)}
+# One alternation with a named group per trait polarity, so each profile is scanned
+# once; negative phrases come first so "non-smoker" isn't read as "smoker"
+_TRAIT_SCANNER = re.compile(r"\b(?:" + "|".join(
+    f"(?P<{trait}__{polarity}>{pattern})"
+    for trait, patterns in _TRAIT_PATTERNS.items()
+    for polarity, pattern in zip(("neg", "pos"), reversed(patterns))
+) + ")")
+# A negation just before a trait phrase flips it: "doesn't smoke", "not a night owl",
+# "never really tidy". Allows one word in between.
+_NEGATION = re.compile(r"\b(?:not|never|no|don['’]?t|doesn['’]?t|isn['’]?t|aren['’]?t|won['’]?t|rarely|hardly)\s+(?:\w+\s+)?$")
+_NEGATION_LOOKBACK = 24
+
+# "$800-1200", "approx. 900", "1.5k", "between 1,200 and 1,400"
+_AMOUNT = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(k\b)?", re.IGNORECASE)
+_RANGE_SEPARATOR = re.compile(r"^\s*(?:-|–|—|to|and)\s*[$€£]?\s*$", re.IGNORECASE)
+
+# Relative weight of each compatibility component in the final 0-100 score
+WEIGHTS = {
+    "sleep": 1.5,
+    "cleanliness": 1.5,
+    "social": 1.0,
+    "smoking": 2.0,
+    "drinking": 0.75,
+    "guests": 0.75,
+    "budget": 2.0,
+    "age": 0.5,
+    "major": 0.25,
+    "culture": 0.75,
+}
+
+
+def _profile_text(profile: dict) -> str:
+    return " ".join(str(v) for v in profile.values() if isinstance(v, (str, list))).lower()
+
+
+def _trait_row(profile: dict) -> List[float]:
+    row = [0.0] * len(_TRAITS)
+    negated = set()
+    text = _profile_text(profile)
+    for match in _TRAIT_SCANNER.finditer(text):
+        trait, polarity = match.lastgroup.split("__")
+        if _NEGATION.search(text[max(0, match.start() - _NEGATION_LOOKBACK):match.start()]):
+            polarity = "pos" if polarity == "neg" else "neg"
+        if polarity == "neg":
+            negated.add(trait)
+            row[_TRAIT_INDEX[trait]] = -1.0
+        elif trait not in negated:
+            row[_TRAIT_INDEX[trait]] = 1.0
+
+    # Structured fields win over free text
+    for trait, col in _TRAIT_INDEX.items():
+        explicit = profile.get(trait)
+        if isinstance(explicit, bool):
+            row[col] = 1.0 if explicit else -1.0
+        elif isinstance(explicit, (int, float)):
+            row[col] = max(-1.0, min(1.0, float(explicit)))
+    return row
+
+
+def _number(profile: dict, *keys: str) -> float:
+    for key in keys:
+        value = profile.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str):
+            amounts = list(_AMOUNT.finditer(value))
+            if not amounts:
+                continue
+            low = _amount(amounts[0])
+            if len(amounts) > 1 and _RANGE_SEPARATOR.match(value[amounts[0].end():amounts[1].start()]):
+                # A range: its midpoint
+                high = _amount(amounts[1])
+                if amounts[1].group(2) and not amounts[0].group(2):
+                    low *= 1000 # "1-1.5k"
+                return (low + high) / 2
+            return low
+    return np.nan
+
+
+def _amount(match: re.Match) -> float:
+    value = float(match.group(1).replace(",", ""))
+    return value * 1000 if match.group(2) else value
+
+
+def _category(profile: dict, *keys: str) -> str:
+    for key in keys:
+        value = profile.get(key)
+        if isinstance(value, str) and value.strip():
+            return value.strip().lower()
+    return ""
+
+
+def _features(profiles: List[dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    traits = np.array([_trait_row(profile) for profile in profiles], dtype=float).reshape(len(profiles), len(_TRAITS))
+    budget = np.array([_number(profile, "budget", "max_rent", "rent") for profile in profiles], dtype=float)
+    age = np.array([_number(profile, "age") for profile in profiles], dtype=float)
+    major = np.array([_category(profile, "major", "program", "field") for profile in profiles], dtype=object)
+    nationality = np.array([_category(profile, "nationality", "home_country", "country") for profile in profiles], dtype=object)
+    language = np.array([_category(profile, "language", "languages") for profile in profiles], dtype=object)
+    return traits, budget, age, major, nationality, language
+
+
+def score_candidates(user_profile: dict, candidates: List[dict]) -> np.ndarray:
+    """
+    Weighted 0-100 compatibility of each candidate with the user, computed over
+    NumPy feature arrays. Components the profiles don't mention count as neutral (0.5).
+    """
+    if not candidates:
+        return np.zeros(0)
+
+    u_traits, u_budget, u_age, u_major, u_nat, u_lang = _features([user_profile])
+    c_traits, c_budget, c_age, c_major, c_nat, c_lang = _features(candidates)
+
+    components = {}
+
+    # Traits: 1 when both agree, 0 when opposite, 0.5 when either side is unknown
+    trait_similarity = 1 - np.abs(c_traits - u_traits) / 2
+    unknown = (c_traits == 0) | (u_traits == 0)
+    trait_similarity = np.where(unknown, 0.5, trait_similarity)
+    for col, trait in enumerate(_TRAITS):
+        components[trait] = trait_similarity[:, col]
+
+    # Budget: linear falloff with relative difference, zero beyond 50% apart
+    if np.isnan(u_budget[0]):
+        components["budget"] = np.full(len(candidates), 0.5)
+    else:
+        relative = np.abs(c_budget - u_budget[0]) / max(u_budget[0], 1.0)
+        components["budget"] = np.where(np.isnan(c_budget), 0.5, np.clip(1 - relative * 2, 0, 1))
+
+    if np.isnan(u_age[0]):
+        components["age"] = np.full(len(candidates), 0.5)
+    else:
+        components["age"] = np.where(np.isnan(c_age), 0.5, np.clip(1 - np.abs(c_age - u_age[0]) / 10, 0, 1))
+
+    def same(candidate_values: np.ndarray, user_value: str) -> np.ndarray:
+        if not user_value:
+            return np.full(len(candidates), 0.5)
+        known = candidate_values != ""
+        return np.where(known, (candidate_values == user_value).astype(float), 0.5)
+
+    components["major"] = same(c_major, u_major[0])
+    components["culture"] = np.maximum(same(c_nat, u_nat[0]), same(c_lang, u_lang[0]))
+
+    weights = np.array([WEIGHTS[name] for name in components])
+    matrix = np.column_stack(list(components.values()))
+    return matrix @ weights / weights.sum() * 100
+
+
+def prerank_candidates(user_profile: dict, candidates: List[dict], top_k: Optional[int]) -> List[dict]:
+    """Returns the top_k candidates by local compatibility score, best first."""
+    if top_k is None or len(candidates) <= top_k:
+        return list(candidates)
+
+    scores = score_candidates(user_profile, candidates)
+    # argpartition keeps this O(n) before sorting just the shortlist
+    shortlist = np.argpartition(-scores, top_k - 1)[:top_k]
+    shortlist = shortlist[np.argsort(-scores[shortlist], kind="stable")]
+    return [candidates[i] for i in shortlist]
+
+
+def match_score(match: dict) -> float:
+    """Sort key for Gemini match results, tolerant of missing or non-numeric scores."""
+    try:
+        return float(match.get("match_score", 0))
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,272 @@
+import inspect
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Callable, Dict, Optional
+
+from app.utils.analytics import log_ai_usage, metrics_store, LATENCY_BOUNDS
+
+
+@dataclass
+class AICallTrace:
+    """Everything observed while serving one GeminiService feature call."""
+    feature: str
+    started: float = field(default_factory=time.perf_counter)
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    gemini_calls: int = 0
+    gemini_errors: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    coalesced: int = 0
+    semantic_hits: int = 0
+    retries: int = 0
+    rate_limit_wait: float = 0.0
+    parse_failures: int = 0
+
+    @property
+    def cache_status(self) -> str:
+        if self.semantic_hits:
+            return "semantic_hit"
+        if self.cache_misses:
+            return "miss"
+        if self.coalesced:
+            return "coalesced"
+        if self.cache_hits:
+            return "hit"
+        return "none"
+
+
+_current_trace: ContextVar[Optional[AICallTrace]] = ContextVar("ai_call_trace", default=None)
+
+
+class _FeatureCounters:
+    def __init__(self):
+        self.calls = defaultdict(int) # status -> count
+        self.cache = defaultdict(int) # cache status -> count
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.gemini_calls = 0
+        self.retries = 0
+        self.rate_limit_wait = 0.0
+        self.parse_failures = 0
+
+
+_counters: Dict[str, _FeatureCounters] = defaultdict(_FeatureCounters)
+
+
+# --- Hooks called from the Gemini call path; no-ops outside a traced feature ---
+
+def current_trace() -> Optional[AICallTrace]:
+    return _current_trace.get()
+
+
+def record_usage(usage_metadata, cumulative: bool = False):
+    """
+    Adds token counts from an SDK response's usage_metadata. Streaming chunks report
+    running totals, so those pass cumulative=True and overwrite instead of adding.
+    """
+    trace = _current_trace.get()
+    if trace is None or usage_metadata is None:
+        return
+    prompt = getattr(usage_metadata, "prompt_token_count", None) or 0
+    response = getattr(usage_metadata, "candidates_token_count", None) or 0
+    if cumulative:
+        trace.prompt_tokens = max(trace.prompt_tokens, prompt)
+        trace.response_tokens = max(trace.response_tokens, response)
+    else:
+        trace.prompt_tokens += prompt
+        trace.response_tokens += response
+
+
+def record_gemini_call():
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.gemini_calls += 1
+
+
+def record_gemini_error(error: BaseException):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.gemini_errors += 1
+
+
+def record_cache(status: str):
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    if status == "hit":
+        trace.cache_hits += 1
+    elif status == "coalesced":
+        trace.coalesced += 1
+    else:
+        trace.cache_misses += 1
+
+
+def record_semantic_cache_hit():
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.semantic_hits += 1
+
+
+def record_retry():
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.retries += 1
+
+
+def record_rate_limit_wait(seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.rate_limit_wait += seconds
+
+
+def record_parse_failure():
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.parse_failures += 1
+
+
+def _finish(trace: AICallTrace, success: bool, error: Optional[BaseException]):
+    latency = time.perf_counter() - trace.started
+    # The service turns Gemini failures into fallback payloads; still count them as errors
+    success = success and trace.gemini_errors == 0
+    counters = _counters[trace.feature]
+    counters.calls["success" if success else "error"] += 1
+    counters.cache[trace.cache_status] += 1
+    counters.prompt_tokens += trace.prompt_tokens
+    counters.response_tokens += trace.response_tokens
+    counters.gemini_calls += trace.gemini_calls
+    counters.retries += trace.retries
+    counters.rate_limit_wait += trace.rate_limit_wait
+    counters.parse_failures += trace.parse_failures
+
+    log_ai_usage(
+        trace.feature,
+        success,
+        latency,
+        tokens_used=trace.prompt_tokens + trace.response_tokens,
+        error_message=f"{type(error).__name__}: {error}"[:500] if error is not None else None,
+    )
+
+
+def traced_feature(feature: str):
+    """
+    Decorator for GeminiService entry points. Opens a trace for the call so the
+    hooks above attribute tokens, cache status, retries, rate-limit waits and parse
+    failures to the feature, then records it in analytics and the metrics endpoint.
+    Nested traced calls (e.g. match_roommates -> match_roommates_stream) join the outer trace.
+    """
+    def decorator(func: Callable):
+        if inspect.isasyncgenfunction(func):
+            @wraps(func)
+            async def gen_wrapper(*args, **kwargs):
+                if _current_trace.get() is not None:
+                    async for item in func(*args, **kwargs):
+                        yield item
+                    return
+
+                trace = AICallTrace(feature)
+                generator = func(*args, **kwargs)
+                success, error = False, None
+                try:
+                    while True:
+                        # Each step runs with the trace set, without leaking it to our caller
+                        token = _current_trace.set(trace)
+                        try:
+                            item = await generator.__anext__()
+                        except StopAsyncIteration:
+                            success = True
+                            break
+                        finally:
+                            _current_trace.reset(token)
+                        yield item
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    await generator.aclose()
+                    _finish(trace, success, error)
+            return gen_wrapper
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current_trace.get() is not None:
+                return await func(*args, **kwargs)
+
+            trace = AICallTrace(feature)
+            token = _current_trace.set(trace)
+            success, error = False, None
+            try:
+                result = await func(*args, **kwargs)
+                success = True
+                return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                _current_trace.reset(token)
+                _finish(trace, success, error)
+        return wrapper
+    return decorator
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus() -> str:
+    """Per-feature AI metrics in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    features = sorted(_counters.items())
+
+    metric("studzo_ai_calls_total", "counter", "AI feature calls by outcome.")
+    for feature, c in features:
+        for status, count in sorted(c.calls.items()):
+            lines.append(f'studzo_ai_calls_total{{feature="{_escape(feature)}",status="{status}"}} {count}')
+
+    metric("studzo_ai_tokens_total", "counter", "Gemini tokens by feature and direction.")
+    for feature, c in features:
+        lines.append(f'studzo_ai_tokens_total{{feature="{_escape(feature)}",kind="prompt"}} {c.prompt_tokens}')
+        lines.append(f'studzo_ai_tokens_total{{feature="{_escape(feature)}",kind="response"}} {c.response_tokens}')
+
+    metric("studzo_ai_gemini_requests_total", "counter", "Gemini API requests actually sent.")
+    for feature, c in features:
+        lines.append(f'studzo_ai_gemini_requests_total{{feature="{_escape(feature)}"}} {c.gemini_calls}')
+
+    metric("studzo_ai_cache_total", "counter", "Feature calls by response cache status.")
+    for feature, c in features:
+        for status, count in sorted(c.cache.items()):
+            lines.append(f'studzo_ai_cache_total{{feature="{_escape(feature)}",status="{status}"}} {count}')
+
+    metric("studzo_ai_retries_total", "counter", "Gemini call retries.")
+    for feature, c in features:
+        lines.append(f'studzo_ai_retries_total{{feature="{_escape(feature)}"}} {c.retries}')
+
+    metric("studzo_ai_rate_limit_wait_seconds_total", "counter", "Time spent queued for rate-limit tokens.")
+    for feature, c in features:
+        lines.append(f'studzo_ai_rate_limit_wait_seconds_total{{feature="{_escape(feature)}"}} {c.rate_limit_wait:.6f}')
+
+    metric("studzo_ai_parse_failures_total", "counter", "Gemini responses that were not valid JSON.")
+    for feature, c in features:
+        lines.append(f'studzo_ai_parse_failures_total{{feature="{_escape(feature)}"}} {c.parse_failures}')
+
+    metric("studzo_ai_latency_seconds", "histogram", "AI feature call latency.")
+    for feature, histogram, total_latency in metrics_store.lifetime_histograms():
+        label = f'feature="{_escape(feature)}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BOUNDS, histogram.counts):
+            cumulative += count
+            lines.append(f'studzo_ai_latency_seconds_bucket{{{label},le="{bound:.6g}"}} {cumulative}')
+        lines.append(f'studzo_ai_latency_seconds_bucket{{{label},le="+Inf"}} {histogram.total}')
+        lines.append(f"studzo_ai_latency_seconds_sum{{{label}}} {total_latency:.6f}")
+        lines.append(f"studzo_ai_latency_seconds_count{{{label}}} {histogram.total}")
+
+    return "\n".join(lines) + "\n"
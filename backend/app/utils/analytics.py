@@ -1,38 +1,175 @@
-from datetime import datetime, timedelta
-import logging
+import bisect
+import math
+import time
+from collections import deque
+from typing import Dict, List, Optional
 
-# Simple in-memory analytics storage
-_analytics_data = []
+from app.config import settings
+from app.models.api_log import APICallLog
+from app.utils.batch_writer import BatchWriter
 
-def log_ai_usage(feature: str, success: bool, latency: float):
-    _analytics_data.append({
-        "timestamp": datetime.now(),
-        "feature": feature,
-        "success": success,
-        "latency": latency
-    })
+# Latency histogram bucket upper bounds in seconds: 1ms growing 25% per bucket up to ~5min.
+# Percentiles read from it are within one bucket width (<25%) of the true value.
+LATENCY_BOUNDS = [0.001 * 1.25 ** i for i in range(int(math.log(300 / 0.001, 1.25)) + 2)]
+
+
+class LatencyHistogram:
+    """Fixed-size streaming histogram; memory doesn't grow with the number of samples."""
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BOUNDS) + 1)
+        self.total = 0
+
+    def add(self, latency: float):
+        self.counts[bisect.bisect_left(LATENCY_BOUNDS, latency)] += 1
+        self.total += 1
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+
+    def percentile(self, q: float) -> float:
+        if self.total == 0:
+            return 0.0
+        target = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return LATENCY_BOUNDS[min(i, len(LATENCY_BOUNDS) - 1)]
+        return LATENCY_BOUNDS[-1]
+
+
+class _Bucket:
+    __slots__ = ("index", "calls", "successes", "total_latency", "tokens", "histogram")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.calls = 0
+        self.successes = 0
+        self.total_latency = 0.0
+        self.tokens = 0
+        self.histogram = LatencyHistogram()
+
+    def add(self, success: bool, latency: float, tokens: int):
+        self.calls += 1
+        self.successes += 1 if success else 0
+        self.total_latency += latency
+        self.tokens += tokens
+        self.histogram.add(latency)
+
+
+class _FeatureMetrics:
+    def __init__(self):
+        self.lifetime = _Bucket(0)
+        # Rolling windows: the last 60 one-minute buckets and the last 24 one-hour buckets
+        self.minutes: deque = deque(maxlen=60)
+        self.hours: deque = deque(maxlen=24)
+
+    @staticmethod
+    def _current(ring: deque, index: int) -> _Bucket:
+        if not ring or ring[-1].index != index:
+            ring.append(_Bucket(index))
+        return ring[-1]
+
+    def add(self, now: float, success: bool, latency: float, tokens: int):
+        self.lifetime.add(success, latency, tokens)
+        self._current(self.minutes, int(now // 60)).add(success, latency, tokens)
+        self._current(self.hours, int(now // 3600)).add(success, latency, tokens)
+
+
+class MetricsStore:
+    """
+    Fixed-memory AI usage metrics, per feature: lifetime totals plus per-minute and
+    per-hour rolling buckets, each with a latency histogram for p50/p95/p99.
+    Summaries cost O(features x buckets), independent of how many calls were made.
+    """
+    def __init__(self):
+        self._features: Dict[str, _FeatureMetrics] = {}
+
+    def record(self, feature: str, success: bool, latency: float, tokens: int = 0, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        metrics = self._features.get(feature)
+        if metrics is None:
+            metrics = self._features[feature] = _FeatureMetrics()
+        metrics.add(now, success, latency, tokens)
+
+    def lifetime_histograms(self):
+        """(feature, latency histogram, latency sum) for every feature seen so far."""
+        return [(name, m.lifetime.histogram, m.lifetime.total_latency) for name, m in sorted(self._features.items())]
+
+    @staticmethod
+    def _summarise(buckets: List[_Bucket]) -> dict:
+        merged = _Bucket(0)
+        for bucket in buckets:
+            merged.calls += bucket.calls
+            merged.successes += bucket.successes
+            merged.total_latency += bucket.total_latency
+            merged.tokens += bucket.tokens
+            merged.histogram.merge(bucket.histogram)
+        calls = merged.calls
+        return {
+            "calls": calls,
+            "success_rate": round(merged.successes / calls * 100, 2) if calls else 0,
+            "average_latency": round(merged.total_latency / calls, 3) if calls else 0,
+            "tokens_used": merged.tokens,
+            "p50_latency": round(merged.histogram.percentile(0.50), 3),
+            "p95_latency": round(merged.histogram.percentile(0.95), 3),
+            "p99_latency": round(merged.histogram.percentile(0.99), 3),
+        }
+
+    def summary(self, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        current_minute = int(now // 60)
+        current_hour = int(now // 3600)
+
+        lifetime = self._summarise([m.lifetime for m in self._features.values()])
+        last_hour = self._summarise([
+            b for m in self._features.values() for b in m.minutes if b.index > current_minute - 60
+        ])
+        last_day = self._summarise([
+            b for m in self._features.values() for b in m.hours if b.index > current_hour - 24
+        ])
 
-def get_analytics_summary():
-    total_calls = len(_analytics_data)
-    if total_calls == 0:
         return {
-            "total_calls": 0,
-            "success_rate": 0,
-            "average_latency": 0,
-            "feature_breakdown": {}
+            "total_calls": lifetime["calls"],
+            "success_rate": lifetime["success_rate"],
+            "average_latency": lifetime["average_latency"],
+            "latency_percentiles": {
+                "p50": lifetime["p50_latency"],
+                "p95": lifetime["p95_latency"],
+                "p99": lifetime["p99_latency"],
+            },
+            "feature_breakdown": {name: m.lifetime.calls for name, m in self._features.items()},
+            "features": {name: self._summarise([m.lifetime]) for name, m in self._features.items()},
+            "last_hour": last_hour,
+            "last_24_hours": last_day,
         }
-    
-    successful_calls = sum(1 for call in _analytics_data if call["success"])
-    total_latency = sum(call["latency"] for call in _analytics_data)
-    
-    feature_counts = {}
-    for call in _analytics_data:
-        feature = call["feature"]
-        feature_counts[feature] = feature_counts.get(feature, 0) + 1
-        
-    return {
-        "total_calls": total_calls,
-        "success_rate":  round((successful_calls / total_calls) * 100, 2),
-        "average_latency": round(total_latency / total_calls, 3),
-        "feature_breakdown": feature_counts
-    }
+
+
+metrics_store = MetricsStore()
+
+# Optional per-call rows for api_call_logs, written in the background
+api_call_log_writer = BatchWriter(
+    APICallLog,
+    max_batch=settings.API_LOG_BATCH_SIZE,
+    flush_interval=settings.API_LOG_FLUSH_INTERVAL_SECONDS,
+    max_pending=settings.API_LOG_MAX_PENDING,
+    max_retries=settings.DB_WRITE_MAX_RETRIES,
+    retry_backoff=settings.DB_WRITE_RETRY_BACKOFF_SECONDS,
+)
+
+
+def log_ai_usage(feature: str, success: bool, latency: float, tokens_used: int = 0, error_message: Optional[str] = None):
+    metrics_store.record(feature, success, latency, tokens_used)
+    if settings.ANALYTICS_FLUSH_TO_DB:
+        api_call_log_writer.add({
+            "endpoint": f"ai:{feature}",
+            "duration_ms": latency * 1000,
+            "status_code": 200 if success else 500,
+            "tokens_used": tokens_used,
+            "error_message": error_message,
+        })
+
+def get_analytics_summary():
+    return metrics_store.summary()
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """
+    Buffers rows for one table in memory and bulk-inserts them from a background task,
+    every flush_interval seconds or as soon as max_batch rows are waiting.
+    The buffer is bounded: when it is full new rows are dropped (and counted) rather
+    than slowing down the request that produced them. A failed batch is retried with
+    exponential backoff; if it still fails because of its data (a constraint or a
+    malformed row) it is split in halves until the bad rows are isolated, and only
+    those are given up on.
+    """
+    def __init__(self, model, max_batch: int = 500, flush_interval: float = 1.0, max_pending: int = 10000,
+                 max_retries: int = 3, retry_backoff: float = 0.5):
+        self.model = model
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._pending: deque = deque()
+        self.max_pending = max_pending
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Held while rows are out of the buffer, so flush() also waits for an insert in flight
+        self._flushing = asyncio.Lock()
+        # id() of each row of the batch in flight not yet committed or given up on
+        self._unsettled: set = set()
+
+        self.written = 0
+        self.dropped = 0
+        self.retries = 0
+        self.failed_batches = 0
+        self.lost = 0
+
+    def add(self, row: dict) -> bool:
+        """Queues one row (column -> value). Never blocks; returns False if dropped."""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        self._pending.append(row)
+        if len(self._pending) >= self.max_batch and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    async def _insert(self, rows: list):
+        async with AsyncSessionLocal() as db:
+            # executemany-style bulk INSERT in a single round-trip per batch
+            await db.execute(insert(self.model), rows)
+            await db.commit()
+            # Committed: a cancellation while the session closes mustn't re-queue these
+            self._settle(rows)
+
+    def _settle(self, rows: list):
+        for row in rows:
+            self._unsettled.discard(id(row))
+
+    async def _insert_with_retry(self, batch: list):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._insert(batch)
+                self.written += len(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed_batches += 1
+                    if isinstance(e, (OperationalError, InterfaceError, OSError)) or len(batch) == 1:
+                        # Database unavailable, or a single row: nothing to isolate
+                        self.lost += len(batch)
+                        self._settle(batch)
+                        logger.error(f"Batch insert into {self.model.__tablename__} failed, {len(batch)} rows lost: {e}")
+                        return
+                    logger.warning(f"Batch insert into {self.model.__tablename__} failed, isolating bad rows: {e}")
+                    await self._insert_salvaging(batch, e)
+                    return
+                self.retries += 1
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning(f"Batch insert into {self.model.__tablename__} failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _insert_salvaging(self, rows: list, error: Exception):
+        """Bisects rows that failed together: O(k log n) inserts to find k bad rows among n."""
+        if len(rows) == 1:
+            self.lost += 1
+            self._settle(rows)
+            logger.error(f"Dropping row for {self.model.__tablename__}: {error}")
+            return
+        middle = len(rows) // 2
+        for half in (rows[:middle], rows[middle:]):
+            try:
+                await self._insert(half)
+                self.written += len(half)
+            except Exception as e:
+                await self._insert_salvaging(half, e)
+
+    async def flush(self):
+        """
+        Writes everything queued so far, in batches of max_batch. If the background
+        task is mid-insert, waits for that batch too, so on return every row added
+        before the call has been written (or given up on).
+        """
+        async with self._flushing:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+                self._unsettled = {id(row) for row in batch}
+                try:
+                    await self._insert_with_retry(batch)
+                except asyncio.CancelledError:
+                    # Stopped mid-batch: put back only the rows not yet written (salvaging may
+                    # have committed some halves) so stop()'s final flush doesn't duplicate any
+                    self._pending.extendleft(reversed([row for row in batch if id(row) in self._unsettled]))
+                    raise
+                finally:
+                    self._unsettled = set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stops the background task and writes whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "table": self.model.__tablename__,
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "failed_batches": self.failed_batches,
+            "lost": self.lost,
+        }
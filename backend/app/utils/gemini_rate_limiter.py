@@ -1,64 +1,190 @@
 import time
 import asyncio
+import heapq
+import itertools
 import logging
+from contextvars import ContextVar
 from functools import wraps
-from typing import Callable, Any, Optional
+from typing import Callable, Any, List, Optional, Tuple
 import random
+from app.config import settings
+from app.utils.quota import DistributedQuota
+from app.utils.response_cache import cache_backend, make_cache_key
+from app.utils.single_flight import single_flight
+from app.utils.ai_tracing import record_cache, record_retry, record_rate_limit_wait
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Priority lanes: lower value is served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Lane of the AI feature currently executing; set by with_priority
+_request_priority: ContextVar[int] = ContextVar("gemini_request_priority", default=PRIORITY_NORMAL)
+
+
 class GeminiRateLimiter:
     """
     Manages rate limiting for Gemini API calls.
-    Implements a simple token bucket or fixed window counter.
-    For this implementation, we'll use a local in-memory counter 
-    since Redis setup might be complex for the user's local env initially.
+    Requests per minute are enforced by a token bucket (refilled continuously, so
+    there are no window edges to burst through). Callers that find the bucket empty
+    queue by priority lane, FIFO within a lane, and fail with a 429 only once their
+    wait exceeds max_wait_seconds. The daily cap is a plain counter.
+    With a DistributedQuota attached, each local grant also takes a cluster-wide
+    token so all workers together stay under the limits; max_wait_seconds bounds
+    the two waits together.
     """
-    def __init__(self, requests_per_minute: int = 60, requests_per_day: int = 1500):
+    def __init__(self, requests_per_minute: int = 60, requests_per_day: int = 1500,
+                 burst: int = 10, max_wait_seconds: float = 30.0,
+                 quota: Optional[DistributedQuota] = None):
+        if requests_per_minute <= 0:
+            raise ValueError(f"requests_per_minute must be positive, got {requests_per_minute}")
+        self.quota = quota
         self.rpm_limit = requests_per_minute
         self.rpd_limit = requests_per_day
-        
-        self.minute_window_start = time.time()
+        self.max_wait_seconds = max_wait_seconds
+
+        self.capacity = max(1, burst)
+        self.refill_rate = requests_per_minute / 60.0 # tokens per second
+        self.tokens = float(self.capacity)
+        self.last_refill = time.monotonic()
+
         self.day_window_start = time.time()
-        
-        self.requests_this_minute = 0
         self.requests_this_day = 0
 
-    async def wait_for_token(self):
-        """Checks limits and waits if necessary."""
+        # Heap of (priority, seq, future); the dispatcher hands out tokens in order
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.granted = 0
+        self.queued = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+
+    def _check_day(self):
         current_time = time.time()
-        
-        # Reset minute window
-        if current_time - self.minute_window_start >= 60:
-            self.minute_window_start = current_time
-            self.requests_this_minute = 0
-            
-        # Reset day window
         if current_time - self.day_window_start >= 86400:
             self.day_window_start = current_time
             self.requests_this_day = 0
-            
         if self.requests_this_day >= self.rpd_limit:
             raise Exception("Daily quota exceeded")
-            
-        if self.requests_this_minute >= self.rpm_limit:
-            # FAIL FAST for Demo/Mock Mode:
-            logger.warning("Rate limit hit. Raising 429 to trigger mock fallback.")
-            raise Exception("429 Resource exhausted: Rate limit hit")
-            
-            # Old Sleep Logic:
-            # wait_time = 60 - (current_time - self.minute_window_start) + 1
-            # logger.warning(f"Rate limit hit. Waiting {wait_time:.2f}s")
-            # await asyncio.sleep(wait_time)
-            # self.minute_window_start = time.time()
-            # self.requests_this_minute = 0
-            
-        self.requests_this_minute += 1
+
+    def _record_grant(self, waited: float):
+        self.granted += 1
         self.requests_this_day += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        record_rate_limit_wait(waited)
+
+    async def _dispatch(self):
+        while self._waiters:
+            _, _, future = self._waiters[0]
+            if future.done():
+                # Timed out or cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+
+            self._refill()
+            if self.tokens >= 1:
+                heapq.heappop(self._waiters)
+                self.tokens -= 1
+                future.set_result(None)
+            else:
+                await asyncio.sleep((1 - self.tokens) / self.refill_rate)
+
+    async def wait_for_token(self, priority: Optional[int] = None):
+        """Takes one token, queueing by priority until one is available."""
+        self._check_day()
+        if priority is None:
+            priority = _request_priority.get()
+
+        # One deadline covers both the local queue and the cluster lease
+        started = time.monotonic()
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            self._record_grant(0.0)
+            await self._acquire_cluster_token(started)
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.queued += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"Rate limit queue wait exceeded {self.max_wait_seconds}s")
+            raise Exception("429 Resource exhausted: Rate limit queue wait exceeded")
+        self._record_grant(time.monotonic() - started)
+        await self._acquire_cluster_token(started)
+
+    async def _acquire_cluster_token(self, started: float):
+        if self.quota is not None:
+            await self.quota.acquire(max(0.0, self.max_wait_seconds - (time.monotonic() - started)))
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "tokens_available": round(self.tokens, 2),
+            "capacity": self.capacity,
+            "requests_per_minute": self.rpm_limit,
+            "requests_today": self.requests_this_day,
+            "requests_per_day": self.rpd_limit,
+            "queue_depth": sum(1 for _, _, f in self._waiters if not f.done()),
+            "granted": self.granted,
+            "queued": self.queued,
+            "timeouts": self.timeouts,
+            "average_wait": round(self.total_wait / self.granted, 3) if self.granted else 0,
+            "max_wait": round(self.max_wait, 3),
+            "cluster_quota": self.quota.stats() if self.quota is not None else None,
+        }
+
+def _build_cluster_quota() -> Optional[DistributedQuota]:
+    if settings.GEMINI_QUOTA_BACKEND != "redis":
+        return None
+    from app.utils.redis_client import get_redis
+    return DistributedQuota(
+        get_redis(),
+        requests_per_minute=settings.GEMINI_RPM,
+        requests_per_day=settings.GEMINI_RPD,
+        lease_size=settings.GEMINI_QUOTA_LEASE_SIZE,
+    )
 
 # Global Limiter Instance
-rate_limiter = GeminiRateLimiter()
+rate_limiter = GeminiRateLimiter(
+    requests_per_minute=settings.GEMINI_RPM,
+    requests_per_day=settings.GEMINI_RPD,
+    burst=settings.GEMINI_BURST,
+    max_wait_seconds=settings.GEMINI_MAX_QUEUE_WAIT_SECONDS,
+    quota=_build_cluster_quota(),
+)
+
+def with_priority(priority: int):
+    """Decorator that runs an AI feature's Gemini calls in the given rate-limit lane."""
+    def decorator(func: Callable):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = _request_priority.set(priority)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _request_priority.reset(token)
+        return wrapper
+    return decorator
 
 def with_retry(max_retries: int = 3, initial_delay: float = 2.0):
     """
@@ -92,6 +218,7 @@ def with_retry(max_retries: int = 3, initial_delay: float = 2.0):
                     if not is_retryable or attempt == max_retries:
                         raise e
                     
+                    record_retry()
                     # Add jitter
                     sleep_time = delay * (1 + random.random() * 0.1)
                     await asyncio.sleep(sleep_time)
@@ -101,42 +228,52 @@ def with_retry(max_retries: int = 3, initial_delay: float = 2.0):
         return wrapper
     return decorator
 
-# Simple In-Memory Cache (Replace with Redis for production)
-_cache = {}
-
 def with_cache(ttl_seconds: int = 3600):
-    """Decorator to cache results based on function arguments."""
+    """
+    Decorator to cache results based on function arguments.
+    Keys are SHA-256 digests of the canonicalised arguments plus the model name,
+    stored in the configured cache backend (in-process LRU, or LRU + Redis).
+    Concurrent misses on the same key are coalesced into a single call.
+    Only returned results are stored: a call that raises leaves nothing behind.
+    `wrapper.forget(*args, **kwargs)` drops the entry for those arguments, for
+    results that turn out to be unusable after the fact.
+    """
     def decorator(func: Callable):
+        def cache_key_for(args, kwargs) -> str:
+            owner = args[0] if args else None
+            namespace = f"{func.__qualname__}:{getattr(owner, 'model_name', '')}"
+            return make_cache_key(namespace, args[1:], kwargs) # Skip self
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Create a simplified cache key from args (excluding self)
-            # This is a basic implementation
             try:
-                key_parts = [func.__name__]
-                for arg in args[1:]: # Skip self
-                    key_parts.append(str(arg))
-                for k, v in kwargs.items():
-                    key_parts.append(f"{k}={v}")
-                
-                cache_key = "_".join(key_parts)
-                
-                # Check cache
-                if cache_key in _cache:
-                    timestamp, data = _cache[cache_key]
-                    if time.time() - timestamp < ttl_seconds:
-                        logger.info(f"Cache hit for {func.__name__}")
-                        return data
-                    else:
-                        del _cache[cache_key]
-                
-                # Call function
+                cache_key = cache_key_for(args, kwargs)
+            except Exception as e:
+                # If key building fails, just run the function uncached
+                logger.warning(f"Cache key error for {func.__name__}: {e}")
+                return await func(*args, **kwargs)
+
+            found, data = await cache_backend.get(cache_key)
+            if found:
+                logger.info(f"Cache hit for {func.__name__}")
+                record_cache("hit")
+                return data
+
+            # Identical concurrent misses share one call instead of each hitting Gemini
+            async def call_and_store():
                 result = await func(*args, **kwargs)
-                
-                # Store in cache
-                _cache[cache_key] = (time.time(), result)
+                await cache_backend.set(cache_key, result, ttl_seconds)
                 return result
+
+            record_cache("coalesced" if single_flight.is_in_flight(cache_key) else "miss")
+            return await single_flight.do(cache_key, call_and_store)
+
+        async def forget(*args, **kwargs):
+            try:
+                await cache_backend.delete(cache_key_for(args, kwargs))
             except Exception as e:
-                # If caching logic fails, just run the function
-                return await func(*args, **kwargs)
+                logger.warning(f"Cache forget failed for {func.__name__}: {e}")
+
+        wrapper.forget = forget
         return wrapper
     return decorator
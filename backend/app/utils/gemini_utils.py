@@ -3,9 +3,8 @@ import time
 from functools import wraps
 from typing import Callable, Any
 import logging
+from app.utils.response_cache import cache_backend, make_cache_key
 
-# Simple in-memory cache
-_cache = {}
 _cache_ttl = 300  # 5 minutes
 
 # Rate limiting
@@ -36,18 +35,15 @@ def rate_limit(func: Callable) -> Callable:
 def cache_response(func: Callable) -> Callable:
     @wraps(func)
     async def wrapper(*args, **kwargs) -> Any:
-        # Create a simple key from function name and args
-        # Note: simplistic key generation, might need robust serialization for complex dicts
-        key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
-        
-        current_time = time.time()
-        if key in _cache:
-            result, timestamp = _cache[key]
-            if current_time - timestamp < _cache_ttl:
-                logging.info(f"Cache hit for {key}")
-                return result
-            
+        # Shares the with_cache backend so entries are bounded and, with Redis, cross-worker
+        key = make_cache_key(func.__qualname__, args, kwargs)
+
+        found, result = await cache_backend.get(key)
+        if found:
+            logging.info(f"Cache hit for {func.__name__}")
+            return result
+
         result = await func(*args, **kwargs)
-        _cache[key] = (result, current_time)
+        await cache_backend.set(key, result, _cache_ttl)
         return result
     return wrapper
@@ -0,0 +1,159 @@
+import heapq
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.195
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class _Distance:
+    """
+    Distance from one query point. Nearby candidates (the common case) use the
+    equirectangular approximation, within ~0.1% of great-circle distance at that range
+    and far cheaper than haversine; anything further than FLAT_DEGREES uses haversine.
+    """
+    FLAT_DEGREES = 0.25
+
+    __slots__ = ("lat", "lon", "kx")
+
+    def __init__(self, lat: float, lon: float):
+        self.lat = lat
+        self.lon = lon
+        self.kx = KM_PER_DEGREE_LAT * math.cos(math.radians(lat))
+
+    def to(self, lat: float, lon: float) -> float:
+        if abs(lat - self.lat) > self.FLAT_DEGREES or abs(lon - self.lon) > self.FLAT_DEGREES:
+            return haversine_km(self.lat, self.lon, lat, lon)
+        dx = (lon - self.lon) * self.kx
+        dy = (lat - self.lat) * KM_PER_DEGREE_LAT
+        return math.sqrt(dx * dx + dy * dy)
+
+
+class GeoGridIndex:
+    """
+    In-memory spatial index: points bucketed into a fixed lat/lon grid, so radius and
+    nearest-neighbour queries only look at the cells around the query point.
+    Points can be added, moved and removed one at a time. Distances are in km (see _Distance).
+    """
+    def __init__(self, cell_degrees: float = 0.005):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], Dict[int, Tuple[float, float]]] = {}
+        self._points: Dict[int, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def upsert(self, point_id: int, lat: float, lon: float):
+        self.remove(point_id)
+        self._points[point_id] = (lat, lon)
+        self._cells.setdefault(self._cell(lat, lon), {})[point_id] = (lat, lon)
+
+    def remove(self, point_id: int):
+        old = self._points.pop(point_id, None)
+        if old is None:
+            return
+        cell = self._cell(*old)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.pop(point_id, None)
+            if not members:
+                del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._points.clear()
+
+    def _cell_km(self, lat: float, rings: int) -> float:
+        """Smallest cell side in km within `rings` cells of lat; bounds how far a ring reaches."""
+        edge_lat = min(89.9, abs(lat) + (rings + 1) * self.cell_degrees)
+        return self.cell_degrees * KM_PER_DEGREE_LAT * max(math.cos(math.radians(edge_lat)), 0.01)
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+        """(id, distance_km) for every point within radius_km, nearest first."""
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        lon_span = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(min(89.9, abs(lat) + lat_span))), 0.01))
+        min_y, min_x = self._cell(lat - lat_span, lon - lon_span)
+        max_y, max_x = self._cell(lat + lat_span, lon + lon_span)
+
+        origin = _Distance(lat, lon)
+        hits = []
+        if (max_y - min_y + 1) * (max_x - min_x + 1) > len(self._cells):
+            # Radius covers more cells than exist: walking the occupied ones is cheaper
+            cells = (members for (y, x), members in self._cells.items() if min_y <= y <= max_y and min_x <= x <= max_x)
+        else:
+            cells = (self._cells.get((y, x)) for y in range(min_y, max_y + 1) for x in range(min_x, max_x + 1))
+        for members in cells:
+            if not members:
+                continue
+            for point_id, (plat, plon) in members.items():
+                distance = origin.to(plat, plon)
+                if distance <= radius_km:
+                    hits.append((point_id, distance))
+        hits.sort(key=lambda hit: (hit[1], hit[0]))
+        return hits
+
+    def iter_nearest(self, lat: float, lon: float, max_km: Optional[float] = None) -> Iterator[Tuple[int, float]]:
+        """
+        Yields (id, distance_km) in increasing distance, scanning rings of cells outwards.
+        A point is yielded once no unscanned cell could hold anything closer.
+        """
+        origin = _Distance(lat, lon)
+        cy, cx = self._cell(lat, lon)
+        heap: List[Tuple[float, int]] = []
+        seen = 0
+        ring = 0
+        while seen < len(self._points) or heap:
+            if seen < len(self._points) and (2 * ring + 1) ** 2 > len(self._cells):
+                # Sparse around the query: rings are mostly empty, so take every remaining occupied cell at once
+                max_dy = math.inf if max_km is None else max_km / (self.cell_degrees * KM_PER_DEGREE_LAT) + 1
+                for (y, x), members in self._cells.items():
+                    if max(abs(y - cy), abs(x - cx)) >= ring and abs(y - cy) <= max_dy:
+                        heap.extend((origin.to(plat, plon), point_id) for point_id, (plat, plon) in members.items())
+                heapq.heapify(heap)
+                seen = len(self._points)
+                reach = math.inf
+            elif seen < len(self._points):
+                if ring == 0:
+                    ring_cells = [(cy, cx)]
+                else:
+                    ring_cells = [(cy + dy, cx + dx) for dy in (-ring, ring) for dx in range(-ring, ring + 1)]
+                    ring_cells += [(cy + dy, cx + dx) for dx in (-ring, ring) for dy in range(-ring + 1, ring)]
+                for cell in ring_cells:
+                    members = self._cells.get(cell)
+                    if members:
+                        for point_id, (plat, plon) in members.items():
+                            heapq.heappush(heap, (origin.to(plat, plon), point_id))
+                            seen += 1
+                # Anything outside the scanned square is at least this far away
+                reach = ring * self._cell_km(lat, ring)
+            else:
+                reach = math.inf
+
+            while heap and heap[0][0] <= reach:
+                distance, point_id = heapq.heappop(heap)
+                if max_km is not None and distance > max_km:
+                    return
+                yield point_id, distance
+            if max_km is not None and reach > max_km:
+                # Everything within max_km has been yielded
+                return
+            ring += 1
+
+    def nearest(self, lat: float, lon: float, k: int, max_km: Optional[float] = None) -> List[Tuple[int, float]]:
+        hits = []
+        for hit in self.iter_nearest(lat, lon, max_km):
+            hits.append(hit)
+            if len(hits) >= k:
+                break
+        return hits
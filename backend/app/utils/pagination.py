@@ -0,0 +1,20 @@
+import base64
+from datetime import datetime
+from typing import Any, Callable, Sequence, Tuple
+
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque keyset cursor for the sort key of the last row on a page."""
+    raw = "|".join(value.isoformat() if isinstance(value, datetime) else str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, types: Sequence[Callable[[str], Any]]) -> Tuple:
+    """Parses a cursor back into its typed values; raises ValueError for one we didn't issue."""
+    try:
+        parts = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if len(parts) != len(types):
+            raise ValueError("wrong number of fields")
+        return tuple(parse(part) for parse, part in zip(types, parts))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
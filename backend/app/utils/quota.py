@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DistributedQuota:
+    """
+    Cluster-wide Gemini RPM/RPD accounting in Redis.
+    Each worker leases tokens in blocks of lease_size with an atomic INCRBY on a
+    per-minute and per-day key, then spends them locally without a round-trip.
+    If a lease overshoots the limit the excess is handed back with DECRBY, so the
+    sum over all workers never exceeds the configured limits. Unspent tokens
+    expire with their window.
+    The per-minute limit is checked against a sliding window (this minute's count
+    plus the previous minute's, weighted by how much of it is still inside the last
+    60s), so a full minute's quota can't be spent on both sides of a boundary.
+    Window keys are created with SET NX EX before the first INCRBY, so every key
+    has an expiry even if a worker dies mid-lease.
+    """
+    def __init__(self, client, requests_per_minute: int, requests_per_day: int,
+                 lease_size: int = 5, prefix: str = "gemini:quota:"):
+        self.client = client
+        self.rpm_limit = requests_per_minute
+        self.rpd_limit = requests_per_day
+        self.lease_size = max(1, lease_size)
+        self.prefix = prefix
+
+        self._minute_window: Optional[int] = None
+        self._minute_tokens = 0
+        self._previous_minute_count = 0
+        self._day_window: Optional[str] = None
+        self._day_tokens = 0
+        self._lock = asyncio.Lock()
+
+        self.leases = 0
+        self.round_trips = 0
+        self.exhausted = 0
+
+    def _minute_key(self, window: int) -> str:
+        return f"{self.prefix}rpm:{window}"
+
+    async def _lease(self, key: str, limit: float, ttl_seconds: int) -> int:
+        """Reserves up to lease_size tokens under key. Returns how many were granted."""
+        self.round_trips += 1
+        # No-op if the key exists; otherwise it starts life with its expiry
+        await self.client.set(key, 0, ex=ttl_seconds, nx=True)
+        total = await self.client.incrby(key, self.lease_size)
+
+        granted = self.lease_size
+        overshoot = max(0, math.ceil(total - limit))
+        if overshoot:
+            refund = min(overshoot, self.lease_size)
+            await self.client.decrby(key, refund)
+            granted -= refund
+        if granted:
+            self.leases += 1
+        return granted
+
+    async def _try_take(self) -> bool:
+        now = time.time()
+        minute_window = int(now // 60)
+        day_window = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%d")
+
+        if self._minute_window != minute_window:
+            self._minute_window = minute_window
+            self._minute_tokens = 0
+            # The previous window is closed, so its count is read once per minute
+            previous = await self.client.get(self._minute_key(minute_window - 1))
+            self._previous_minute_count = int(previous) if previous else 0
+        if self._day_window != day_window:
+            self._day_window = day_window
+            self._day_tokens = 0
+
+        if self._day_tokens == 0:
+            self._day_tokens = await self._lease(f"{self.prefix}rpd:{day_window}", self.rpd_limit, 2 * 86400)
+            if self._day_tokens == 0:
+                raise Exception("Daily quota exceeded")
+
+        if self._minute_tokens == 0:
+            # Share of the previous minute still inside the sliding 60s window
+            carried = self._previous_minute_count * (1 - (now % 60) / 60)
+            self._minute_tokens = await self._lease(self._minute_key(minute_window), self.rpm_limit - carried, 120)
+            if self._minute_tokens == 0:
+                return False
+
+        self._minute_tokens -= 1
+        self._day_tokens -= 1
+        return True
+
+    async def acquire(self, max_wait_seconds: float = 30.0):
+        """Takes one cluster-wide token, waiting up to max_wait_seconds for the window to free one."""
+        deadline = time.monotonic() + max_wait_seconds
+        while True:
+            async with self._lock:
+                if await self._try_take():
+                    return
+
+            self.exhausted += 1
+            # The previous minute's weight decays continuously, so poll at the
+            # rate tokens free up, but never past the start of the next window
+            wait = min(60 - (time.time() % 60) + 0.05, max(60 / self.rpm_limit, 0.05))
+            if time.monotonic() + wait > deadline:
+                raise Exception("429 Resource exhausted: Cluster-wide rate limit hit")
+            logger.warning(f"Cluster-wide RPM quota used up. Waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        return {
+            "lease_size": self.lease_size,
+            "leased_minute_tokens": self._minute_tokens,
+            "leased_day_tokens": self._day_tokens,
+            "leases": self.leases,
+            "round_trips": self.round_trips,
+            "exhausted": self.exhausted,
+        }
@@ -0,0 +1,176 @@
+import asyncio
+import time
+import logging
+from typing import Any, Dict, Optional, Set, Tuple
+
+import redis.asyncio as aioredis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LocalPubSub:
+    """Stand-in for redis.asyncio's PubSub, fed by LocalRedis.publish."""
+    def __init__(self, broker: "LocalRedis"):
+        self._broker = broker
+        self._channels: Set[str] = set()
+        self._messages: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels: str) -> None:
+        for channel in channels:
+            self._channels.add(channel)
+            self._broker._subscribers.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, *channels: str) -> None:
+        for channel in channels or list(self._channels):
+            self._channels.discard(channel)
+            self._broker._subscribers.get(channel, set()).discard(self)
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: Optional[float] = 0.0) -> Optional[dict]:
+        # Same timeout semantics as redis-py: None waits indefinitely, 0 polls
+        try:
+            if timeout is None:
+                return await self._messages.get()
+            if timeout <= 0:
+                return self._messages.get_nowait()
+            return await asyncio.wait_for(self._messages.get(), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return None
+
+    async def aclose(self) -> None:
+        await self.unsubscribe()
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of the redis.asyncio client we use.
+    Selected with REDIS_URL=memory:// for local runs and tests where no Redis
+    server is available. State is per-process, so it does not share across workers.
+    """
+    def __init__(self):
+        # key -> (value, expires_at or None)
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._subscribers: Dict[str, Set[LocalPubSub]] = {}
+
+    def _encode(self, value: Any) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode("utf-8")
+
+    def _live(self, name: str) -> Optional[Tuple[Any, Optional[float]]]:
+        entry = self._data.get(name)
+        if entry is None:
+            return None
+        _, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[name]
+            return None
+        return entry
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, name: str) -> Optional[bytes]:
+        entry = self._live(name)
+        return entry[0] if entry else None
+
+    async def set(self, name: str, value: Any, ex: Optional[float] = None, px: Optional[float] = None, nx: bool = False) -> Optional[bool]:
+        if nx and self._live(name) is not None:
+            return None
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[name] = (self._encode(value), expires_at)
+        return True
+
+    async def delete(self, *names: str) -> int:
+        removed = 0
+        for name in names:
+            if self._live(name) is not None:
+                del self._data[name]
+                removed += 1
+        return removed
+
+    async def incrby(self, name: str, amount: int = 1) -> int:
+        entry = self._live(name)
+        current = int(entry[0]) if entry else 0
+        expires_at = entry[1] if entry else None
+        current += amount
+        self._data[name] = (self._encode(current), expires_at)
+        return current
+
+    async def decrby(self, name: str, amount: int = 1) -> int:
+        return await self.incrby(name, -amount)
+
+    async def expire(self, name: str, seconds: float) -> bool:
+        entry = self._live(name)
+        if entry is None:
+            return False
+        self._data[name] = (entry[0], time.monotonic() + seconds)
+        return True
+
+    async def hset(self, name: str, key: str, value: Any) -> int:
+        entry = self._live(name)
+        fields = entry[0] if entry else {}
+        added = 0 if key in fields else 1
+        fields[key] = self._encode(value)
+        self._data[name] = (fields, entry[1] if entry else None)
+        return added
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        entry = self._live(name)
+        if entry is None:
+            return 0
+        removed = sum(1 for key in keys if entry[0].pop(key, None) is not None)
+        if not entry[0]:
+            del self._data[name]
+        return removed
+
+    async def hgetall(self, name: str) -> Dict[bytes, bytes]:
+        entry = self._live(name)
+        return {key.encode("utf-8"): value for key, value in entry[0].items()} if entry else {}
+
+    async def publish(self, channel: str, message: Any) -> int:
+        subscribers = self._subscribers.get(channel, set())
+        for subscriber in subscribers:
+            subscriber._messages.put_nowait({
+                "type": "message",
+                "channel": channel.encode("utf-8"),
+                "data": self._encode(message),
+            })
+        return len(subscribers)
+
+    def pubsub(self) -> LocalPubSub:
+        return LocalPubSub(self)
+
+    async def close(self) -> None:
+        self._data.clear()
+        self._subscribers.clear()
+
+
+_client = None
+
+
+def get_redis():
+    """Returns the shared async Redis client (or the in-process stand-in)."""
+    global _client
+    if _client is None:
+        if settings.REDIS_URL.startswith("memory://"):
+            _client = LocalRedis()
+        else:
+            _client = aioredis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+            )
+    return _client
+
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        if isinstance(_client, LocalRedis):
+            await _client.close()
+        else:
+            await _client.aclose()
+        _client = None
@@ -0,0 +1,65 @@
+import time
+from app.utils.batch_writer import BatchWriter
+
+UNMATCHED = "<unmatched>"
+
+
+def route_template(scope) -> str:
+    """
+    Full route template of the matched endpoint ("/api/v1/ai/chat/{user_id}"), which
+    keeps endpoint cardinality low. route.path is relative to the router that matched
+    it, so the mount path (root_path) and the include_router prefix are added back.
+    Requests no route matched are bucketed together rather than logged by raw path.
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return UNMATCHED
+    included = (scope.get("fastapi") or {}).get("included_router")
+    prefix = getattr(getattr(included, "include_context", None), "prefix", "") or ""
+    if prefix and path.startswith(prefix):
+        # Older FastAPI copies routes with the prefix already applied
+        prefix = ""
+    return f"{scope.get('root_path', '')}{prefix}{path}"
+
+
+class RequestLoggingMiddleware:
+    """
+    Pure ASGI middleware that times every HTTP request and queues an api_call_logs
+    row on the shared BatchWriter. Queueing is an in-memory append; the insert
+    happens later in the writer's background task, and rows are dropped rather than
+    delaying responses when the buffer is full.
+    """
+    def __init__(self, app, writer: BatchWriter):
+        self.app = app
+        self.writer = writer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        error_message = None
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            error_message = f"{type(e).__name__}: {e}"[:500]
+            raise
+        finally:
+            self.writer.add({
+                "endpoint": f"{scope['method']} {route_template(scope)}",
+                "duration_ms": (time.perf_counter() - started) * 1000,
+                "status_code": status_code,
+                # Same columns as the AI-call rows, so mixed batches insert together
+                "tokens_used": 0,
+                "error_message": error_message,
+            })
@@ -0,0 +1,316 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _canonical(value: Any) -> Any:
+    """Reduces an argument to a stable, JSON-serialisable form for hashing."""
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes_sha256__": hashlib.sha256(value).hexdigest()}
+    if isinstance(value, str):
+        # Prompts are indented f-strings; layout whitespace shouldn't split the key
+        return _WHITESPACE.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if value is None or isinstance(value, (int, float, bool)):
+        return value
+    return str(value)
+
+
+def make_cache_key(namespace: str, args: tuple = (), kwargs: Optional[dict] = None) -> str:
+    """
+    Builds a compact SHA-256 key from a namespace (function + model) and call arguments.
+    Image bytes are hashed on their own so the key never holds raw payloads.
+    """
+    payload = {
+        "ns": namespace,
+        "args": _canonical(list(args)),
+        "kwargs": _canonical(kwargs or {}),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _estimate_size(key: str, value: Any) -> int:
+    if isinstance(value, str):
+        size = len(value.encode("utf-8"))
+    elif isinstance(value, (bytes, bytearray)):
+        size = len(value)
+    else:
+        try:
+            size = len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            size = len(str(value))
+    return size + len(key)
+
+
+class LRUResponseCache:
+    """
+    Bounded in-memory cache with per-entry TTL and least-recently-used eviction.
+    Capped both by entry count and by the approximate byte size of stored values.
+    """
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024, sweep_interval: float = 60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+
+        # key -> (expires_at, size, value); order tracks recency, oldest first
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._sweeper: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Returns (found, value). A hit refreshes the entry's recency."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        expires_at, size, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        size = _estimate_size(key, value)
+        if size > self.max_bytes:
+            # Larger than the whole cache; storing it would just flush everything else
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl_seconds, size, value)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def sweep(self) -> int:
+        """Drops every expired entry. Returns how many were removed."""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            removed = self.sweep()
+            if removed:
+                logger.debug(f"Cache sweep removed {removed} expired entries")
+
+    def start_sweeper(self) -> None:
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever())
+
+    async def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# Payload framing: one tag byte, then JSON (small values) or zlib-compressed JSON
+_RAW = b"j"
+_COMPRESSED = b"z"
+_COMPRESS_THRESHOLD = 1024
+
+
+def encode_payload(value: Any) -> bytes:
+    data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(data) >= _COMPRESS_THRESHOLD:
+        return _COMPRESSED + zlib.compress(data)
+    return _RAW + data
+
+
+def decode_payload(blob: bytes) -> Any:
+    tag, body = blob[:1], blob[1:]
+    if tag == _COMPRESSED:
+        body = zlib.decompress(body)
+    return json.loads(body.decode("utf-8"))
+
+
+class CacheBackend(ABC):
+    """Interface for the storage behind with_cache."""
+    @abstractmethod
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Per-process backend over a single LRUResponseCache."""
+    def __init__(self, local: LRUResponseCache):
+        self.local = local
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        return self.local.get(key)
+
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        self.local.set(key, value, ttl_seconds)
+
+    async def delete(self, key: str) -> None:
+        self.local.delete(key)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", **self.local.stats()}
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Two-tier backend: a process-local LRU (L1) in front of Redis (L2) shared by all workers.
+    L2 hits are copied into L1 for a short TTL. If Redis is unreachable the backend
+    keeps serving from L1 rather than failing the request; an L2 entry that can't be
+    decoded is treated as a miss and deleted.
+    """
+    def __init__(self, client, local: LRUResponseCache, prefix: str = "ai-cache:", l1_ttl_seconds: float = 300.0):
+        self.client = client
+        self.local = local
+        self.prefix = prefix
+        self.l1_ttl_seconds = l1_ttl_seconds
+
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        found, value = self.local.get(key)
+        if found:
+            return True, value
+
+        try:
+            blob = await self.client.get(self.prefix + key)
+        except Exception as e:
+            self.l2_errors += 1
+            logger.warning(f"Redis cache get failed: {e}")
+            return False, None
+
+        if blob is None:
+            self.l2_misses += 1
+            return False, None
+
+        try:
+            value = decode_payload(blob)
+        except Exception as e:
+            # Corrupt or foreign entry: a miss, and gone so the next call can replace it
+            self.l2_errors += 1
+            logger.warning(f"Redis cache entry {key} undecodable, dropping it: {e}")
+            await self.delete(key)
+            return False, None
+
+        self.l2_hits += 1
+        self.local.set(key, value, self.l1_ttl_seconds)
+        return True, value
+
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        self.local.set(key, value, min(ttl_seconds, self.l1_ttl_seconds))
+        try:
+            await self.client.set(self.prefix + key, encode_payload(value), ex=max(1, int(ttl_seconds)))
+        except Exception as e:
+            self.l2_errors += 1
+            logger.warning(f"Redis cache set failed: {e}")
+
+    async def delete(self, key: str) -> None:
+        self.local.delete(key)
+        try:
+            await self.client.delete(self.prefix + key)
+        except Exception as e:
+            self.l2_errors += 1
+            logger.warning(f"Redis cache delete failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            **self.local.stats(),
+            "l2_hits": self.l2_hits,
+            "l2_misses": self.l2_misses,
+            "l2_errors": self.l2_errors,
+        }
+
+
+# Global cache instance shared by with_cache (the L1 tier when Redis is enabled)
+response_cache = LRUResponseCache(
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    max_bytes=settings.CACHE_MAX_BYTES,
+    sweep_interval=settings.CACHE_SWEEP_INTERVAL_SECONDS,
+)
+
+
+def _build_cache_backend() -> CacheBackend:
+    if settings.CACHE_BACKEND == "redis":
+        from app.utils.redis_client import get_redis
+        return RedisCacheBackend(get_redis(), response_cache, l1_ttl_seconds=settings.CACHE_L1_TTL_SECONDS)
+    return InMemoryCacheBackend(response_cache)
+
+
+cache_backend = _build_cache_backend()
@@ -0,0 +1,256 @@
+import hashlib
+import inspect
+import json
+import logging
+import math
+import re
+import time
+import zlib
+from functools import wraps
+from typing import Any, Callable, Dict, FrozenSet, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.utils.ai_tracing import current_trace, record_semantic_cache_hit
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[^\W_]+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+# Dropped before embedding: they make any two questions look alike
+_STOPWORDS = frozenset(
+    "a an the to of in on for and or is are am was do does did i im my me we our you your can could "
+    "how what which should would will it its be with at as by from this that there any some".split()
+)
+# Flip a question's meaning while barely moving its vector ("Can I not work off campus?")
+_NEGATION = re.compile(r"\b(?:not|no|never|nor|none|non|without|cannot)\b|n['’]t\b")
+# "unsafe" against "safe": checked word by word on the best match
+_ANTONYM_PREFIXES = ("un", "non", "dis", "in", "im", "il", "ir")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(_WORD.findall(str(text).lower()))
+
+
+def content_words(text: str) -> FrozenSet[str]:
+    return frozenset(word for word in normalize_text(text).split() if word not in _STOPWORDS)
+
+
+def _negations(text: str) -> list:
+    return sorted("not" if token in ("cannot", "n't", "n’t") else token
+                  for token in _NEGATION.findall(str(text).lower()))
+
+
+def _antonymous(words: FrozenSet[str], other: FrozenSet[str]) -> bool:
+    """True if one text has a prefixed opposite ("unsafe") of a word in the other ("safe")."""
+    for first, second in ((words - other, other - words), (other - words, words - other)):
+        for word in first:
+            for prefix in _ANTONYM_PREFIXES:
+                if word.startswith(prefix) and word[len(prefix):] in second:
+                    return True
+    return False
+
+
+class HashedNgramEmbedder:
+    """
+    Text -> unit vector of hashed word unigrams, bigrams and character trigrams
+    (the hashing trick, with a sign bit to cancel collisions). No model to load, and
+    rewordings that share most of their words land close together; cosine similarity
+    is a dot product.
+    """
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> Dict[str, float]:
+        words = [word for word in normalize_text(text).split() if word not in _STOPWORDS]
+        features: Dict[str, float] = {}
+        for word in words:
+            features["w:" + word] = features.get("w:" + word, 0.0) + 1.0
+        for first, second in zip(words, words[1:]):
+            key = f"b:{first} {second}"
+            features[key] = features.get(key, 0.0) + 0.5
+        padded = f" {' '.join(words)} "
+        for i in range(len(padded) - 2):
+            key = "c:" + padded[i:i + 3]
+            features[key] = features.get(key, 0.0) + 1.0
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dim] += sign * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticIndex:
+    """
+    Bounded set of (vector, partition, words, response) entries for one feature. Lookups
+    are one matrix-vector product over the live entries, masked to the query's partition,
+    which at these sizes (a few thousand rows) is faster than any ANN structure would be.
+    The best match is refused if its words are antonyms of the query's.
+    When full, an expired slot is reused, otherwise the least recently used one.
+    """
+    def __init__(self, dim: int, max_entries: int):
+        self.max_entries = max_entries
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._partitions = np.zeros(max_entries, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._values: list = [None] * max_entries
+        self._words: list = [frozenset()] * max_entries
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._expires[:self._size] > time.time()))
+
+    def _best(self, vector: np.ndarray, partition: int, now: float) -> Tuple[int, float]:
+        n = self._size
+        if n == 0:
+            return -1, -1.0
+        similarities = self._vectors[:n] @ vector
+        similarities[(self._partitions[:n] != partition) | (self._expires[:n] <= now)] = -1.0
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def lookup(self, vector: np.ndarray, partition: int, threshold: float,
+               words: FrozenSet[str] = frozenset()) -> Tuple[bool, Any, float]:
+        now = time.time()
+        slot, similarity = self._best(vector, partition, now)
+        if slot < 0 or similarity < threshold or _antonymous(words, self._words[slot]):
+            self.misses += 1
+            return False, None, similarity
+        self.hits += 1
+        self._last_used[slot] = now
+        # Stored serialised, so callers can't mutate each other's responses
+        return True, json.loads(self._values[slot]), similarity
+
+    def store(self, vector: np.ndarray, partition: int, value: Any, ttl_seconds: float,
+              words: FrozenSet[str] = frozenset()):
+        now = time.time()
+        slot, similarity = self._best(vector, partition, now)
+        if similarity < 0.999:
+            # Not already held (a concurrent miss may have stored it): take a fresh slot
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                expired = np.flatnonzero(self._expires <= now)
+                slot = int(expired[0]) if len(expired) else int(np.argmin(self._last_used))
+                if not len(expired):
+                    self.evictions += 1
+        self._vectors[slot] = vector
+        self._partitions[slot] = partition
+        self._expires[slot] = now + ttl_seconds
+        self._last_used[slot] = now
+        self._values[slot] = json.dumps(value, default=str)
+        self._words[slot] = words
+        self.stores += 1
+
+    def clear(self):
+        self._expires[:] = 0.0
+        self._values = [None] * self.max_entries
+        self._words = [frozenset()] * self.max_entries
+        self._size = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+
+class SemanticCache:
+    """One SemanticIndex per opted-in feature, sharing an embedder."""
+    def __init__(self, dim: int = 512, max_entries: int = 2000):
+        self.embedder = HashedNgramEmbedder(dim)
+        self.max_entries = max_entries
+        self.indexes: Dict[str, SemanticIndex] = {}
+
+    def index(self, feature: str) -> SemanticIndex:
+        if feature not in self.indexes:
+            self.indexes[feature] = SemanticIndex(self.embedder.dim, self.max_entries)
+        return self.indexes[feature]
+
+    def clear(self):
+        for index in self.indexes.values():
+            index.clear()
+
+    def stats(self) -> dict:
+        return {feature: index.stats() for feature, index in self.indexes.items()}
+
+
+semantic_cache = SemanticCache(
+    dim=settings.SEMANTIC_CACHE_DIMENSIONS,
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+)
+
+
+def _partition(exact: Sequence[Any], text: str) -> int:
+    # Exact-match fields, every number and every negation in the text must agree for two
+    # requests to share an answer: "$500 deductible" and "$1500 deductible" read alike
+    # otherwise, as do "Can I work off campus?" and "Can I not work off campus?"
+    key = json.dumps([[normalize_text(value) for value in exact], sorted(_NUMBER.findall(text)), _negations(text)])
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def with_semantic_cache(feature: str, text_fields: Sequence[str], exact_fields: Sequence[str] = (),
+                        threshold: Optional[float] = None):
+    """
+    Decorator for GeminiService features whose answers can be shared between
+    near-identical requests. text_fields are embedded and compared by cosine
+    similarity; exact_fields must match exactly. A request at least `threshold`
+    similar to a cached one gets that answer, unless the two differ in a negation
+    or an antonym. Active only for features listed in
+    SEMANTIC_CACHE_FEATURES. Answers from calls that hit a Gemini error or a parse
+    failure are not stored.
+    """
+    def decorator(func: Callable):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if feature not in settings.SEMANTIC_CACHE_FEATURES:
+                return await func(*args, **kwargs)
+            try:
+                arguments = signature.bind(*args, **kwargs)
+                arguments.apply_defaults()
+                text = "\n".join(str(arguments.arguments[name] or "") for name in text_fields)
+                exact = [arguments.arguments[name] for name in exact_fields]
+                vector = semantic_cache.embedder.embed(text)
+                partition = _partition(exact, text)
+                words = content_words(text)
+            except Exception as e:
+                logger.warning(f"Semantic cache key error for {feature}: {e}")
+                return await func(*args, **kwargs)
+
+            index = semantic_cache.index(feature)
+            found, value, similarity = index.lookup(vector, partition, threshold or settings.SEMANTIC_CACHE_THRESHOLD, words)
+            if found:
+                logger.info(f"Semantic cache hit for {feature} (similarity {similarity:.3f})")
+                record_semantic_cache_hit()
+                return value
+
+            trace = current_trace()
+            failures_before = (trace.gemini_errors + trace.parse_failures) if trace is not None else 0
+            result = await func(*args, **kwargs)
+            failed = trace is not None and trace.gemini_errors + trace.parse_failures > failures_before
+            if not failed and np.any(vector):
+                index.store(vector, partition, result, settings.SEMANTIC_CACHE_TTL_SECONDS, words)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RedisBackplane:
+    """
+    Routes websocket messages between workers over Redis pub/sub. Every worker
+    subscribes to one channel and hands what it receives to its own sockets.
+    A per-user presence hash (worker id -> expiry) records which workers hold a
+    socket for that user, so personal messages for offline users aren't published.
+    """
+    def __init__(self, client, channel: str = "ws:deliver", presence_prefix: str = "ws:presence:",
+                 presence_ttl: float = 60.0):
+        self.client = client
+        self.channel = channel
+        self.presence_prefix = presence_prefix
+        self.presence_ttl = presence_ttl
+        self.worker_id = uuid.uuid4().hex
+
+        self._deliver: Optional[Callable[[Optional[int], str], None]] = None
+        self._local_users: Callable[[], Iterable[int]] = lambda: ()
+        self._tasks = []
+
+        self.published = 0
+        self.received = 0
+        self.skipped_offline = 0
+
+    def _presence_key(self, user_id: int) -> str:
+        return f"{self.presence_prefix}{user_id}"
+
+    async def mark_online(self, user_id: int):
+        key = self._presence_key(user_id)
+        await self.client.hset(key, self.worker_id, time.time() + self.presence_ttl)
+        # The whole hash lapses if every worker holding this user dies without cleaning up
+        await self.client.expire(key, int(self.presence_ttl))
+
+    async def mark_offline(self, user_id: int):
+        await self.client.hdel(self._presence_key(user_id), self.worker_id)
+
+    async def is_online_elsewhere(self, user_id: int) -> bool:
+        fields = await self.client.hgetall(self._presence_key(user_id))
+        now = time.time()
+        me = self.worker_id.encode("utf-8")
+        return any(worker != me and float(expires) > now for worker, expires in fields.items())
+
+    async def publish_to_user(self, user_id: int, payload: str) -> bool:
+        if not await self.is_online_elsewhere(user_id):
+            self.skipped_offline += 1
+            return False
+        await self._publish(user_id, payload)
+        return True
+
+    async def publish_broadcast(self, payload: str):
+        await self._publish(None, payload)
+
+    async def _publish(self, user_id: Optional[int], payload: str):
+        envelope = json.dumps({"origin": self.worker_id, "user_id": user_id, "payload": payload})
+        await self.client.publish(self.channel, envelope)
+        self.published += 1
+
+    async def _subscribe(self):
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        return pubsub
+
+    async def _listen(self, pubsub):
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = await self._subscribe()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None or message.get("type") != "message":
+                        continue
+                    envelope = json.loads(message["data"])
+                    if envelope["origin"] == self.worker_id:
+                        continue # Already delivered locally when it was sent
+                    self.received += 1
+                    self._deliver(envelope["user_id"], envelope["payload"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Websocket backplane subscriber failed, resubscribing: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+                    pubsub = None
+
+    async def _refresh_presence(self):
+        while True:
+            await asyncio.sleep(self.presence_ttl / 3)
+            try:
+                await asyncio.gather(*(self.mark_online(user_id) for user_id in list(self._local_users())))
+            except Exception as e:
+                logger.warning(f"Websocket presence refresh failed: {e}")
+
+    async def start(self, deliver: Callable[[Optional[int], str], None], local_users: Callable[[], Iterable[int]]):
+        self._deliver = deliver
+        self._local_users = local_users
+        if not self._tasks:
+            # Subscribe before returning so nothing published after startup is missed
+            try:
+                pubsub = await self._subscribe()
+            except Exception as e:
+                logger.error(f"Websocket backplane subscribe failed, will retry: {e}")
+                pubsub = None
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._listen(pubsub)), loop.create_task(self._refresh_presence())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await asyncio.gather(*(self.mark_offline(user_id) for user_id in list(self._local_users())))
+        except Exception as e:
+            logger.warning(f"Websocket presence cleanup failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "published": self.published,
+            "received": self.received,
+            "skipped_offline": self.skipped_offline,
+        }
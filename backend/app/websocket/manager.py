@@ -1,31 +1,228 @@
-from typing import List
-from fastapi import WebSocket
+import asyncio
+import json
+import logging
+from typing import Any, List, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.config import settings
+from app.websocket.backplane import RedisBackplane
+
+logger = logging.getLogger(__name__)
+
+
+class Connection:
+    """
+    One accepted socket with an outbound queue drained by its own writer task,
+    so a slow client only ever delays itself. Streamed chunks (send) and pushed
+    messages (offer) share the queue, in order, but have separate budgets of
+    max_queue each: a reply stream waiting on backpressure can't use up the room
+    that notifications need, so it never gets its own socket evicted.
+    """
+    def __init__(self, websocket: WebSocket, user_id: int, max_queue: int, send_timeout: float):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.send_timeout = send_timeout
+        self.max_queue = max_queue
+        # (message, streamed) pairs
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._stream_credit = asyncio.Semaphore(max_queue)
+        self._offered = 0
+        self.closed = False
+        self._writer: Optional[asyncio.Task] = None
+        self.on_close = None
+
+    def start(self):
+        self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    def _sent(self, streamed: bool):
+        if streamed:
+            self._stream_credit.release()
+        else:
+            self._offered -= 1
+
+    async def _write_loop(self):
+        try:
+            while True:
+                message, streamed = await self.queue.get()
+                self._sent(streamed)
+                await asyncio.wait_for(self.websocket.send_text(message), timeout=self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Evicting websocket for user {self.user_id}: send took over {self.send_timeout}s")
+            await self._evict()
+        except Exception as e:
+            logger.info(f"Evicting websocket for user {self.user_id}: {e}")
+            await self._evict()
+
+    def offer(self, message: str) -> bool:
+        """Queues without waiting; max_queue pushed messages unsent means the client can't keep up and is evicted."""
+        if self.closed:
+            return False
+        if self._offered >= self.max_queue:
+            logger.warning(f"Evicting websocket for user {self.user_id}: outbound queue full")
+            self.close()
+            asyncio.get_running_loop().create_task(self._close_socket())
+            return False
+        self._offered += 1
+        self.queue.put_nowait((message, False))
+        return True
+
+    async def send(self, message: str):
+        """Queues, waiting while max_queue streamed messages are unsent: backpressure for the code streaming to this socket."""
+        if self.closed:
+            raise WebSocketDisconnect(code=1006)
+        await self._stream_credit.acquire()
+        if self.closed:
+            raise WebSocketDisconnect(code=1006)
+        self.queue.put_nowait((message, True))
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        # Free any producer blocked in send(); it sees closed when it wakes
+        while not self.queue.empty():
+            self._sent(self.queue.get_nowait()[1])
+        if self.on_close is not None:
+            self.on_close(self)
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=1011)
+        except Exception:
+            pass
+
+    async def _evict(self):
+        self.close()
+        await self._close_socket()
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[int, List[WebSocket]] = {}
+    """
+    Sockets held by this worker. With a backplane, personal messages and broadcasts
+    also reach sockets held by other workers.
+    """
+    def __init__(self, max_queue: Optional[int] = None, send_timeout: Optional[float] = None,
+                 backplane: Optional[RedisBackplane] = None):
+        self.active_connections: dict[int, List[Connection]] = {}
+        self.max_queue = max_queue or settings.WS_MAX_QUEUED_MESSAGES
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT_SECONDS
+        self.backplane = backplane
+        self._presence_updates: set = set()
+        # user_id -> [lock, users of the lock]; presence writes for one user run in order
+        self._presence_locks: dict = {}
 
-    async def connect(self, websocket: WebSocket, user_id: int):
+    async def start(self):
+        if self.backplane is not None:
+            await self.backplane.start(self._deliver_local, lambda: list(self.active_connections))
+
+    async def connect(self, websocket: WebSocket, user_id: int) -> Connection:
         await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+        connection = Connection(websocket, user_id, self.max_queue, self.send_timeout)
+        connection.on_close = self._remove
+        connection.start()
+        first = user_id not in self.active_connections
+        self.active_connections.setdefault(user_id, []).append(connection)
+        if first and self.backplane is not None:
+            await self._sync_presence(user_id)
+        return connection
+
+    async def _sync_presence(self, user_id: int):
+        """
+        Writes the user's current presence (online while this worker holds any of
+        their sockets) to the backplane. Updates for one user are serialised and each
+        writes the state at the time it runs, so an offline update that lands after a
+        quick reconnect re-marks the user online instead of hiding them.
+        """
+        entry = self._presence_locks.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                if user_id in self.active_connections:
+                    await self.backplane.mark_online(user_id)
+                else:
+                    await self.backplane.mark_offline(user_id)
+        except Exception as e:
+            logger.warning(f"Websocket presence update failed: {e}")
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._presence_locks[user_id]
+
+    def _remove(self, connection: Connection):
+        connections = self.active_connections.get(connection.user_id)
+        if connections and connection in connections:
+            connections.remove(connection)
+            if not connections:
+                del self.active_connections[connection.user_id]
+                if self.backplane is not None:
+                    task = asyncio.get_running_loop().create_task(self._sync_presence(connection.user_id))
+                    self._presence_updates.add(task)
+                    task.add_done_callback(self._presence_updates.discard)
 
     def disconnect(self, websocket: WebSocket, user_id: int):
-        if user_id in self.active_connections:
-            if websocket in self.active_connections[user_id]:
-                self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
-
-    async def send_personal_message(self, message: str, user_id: int):
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                await connection.send_text(message)
-
-    async def broadcast(self, message: str):
-        for user_cons in self.active_connections.values():
-            for connection in user_cons:
-                await connection.send_text(message)
-
-manager = ConnectionManager()
+        for connection in list(self.active_connections.get(user_id, [])):
+            if connection.websocket is websocket:
+                connection.close()
+
+    @staticmethod
+    def _serialize(message: Any) -> str:
+        # Serialised once per call, however many sockets it goes to
+        return message if isinstance(message, str) else json.dumps(message)
+
+    def _deliver_local(self, user_id: Optional[int], payload: str) -> int:
+        """Offers payload to this worker's sockets for user_id, or to all of them if None."""
+        if user_id is None:
+            connections = [c for cs in list(self.active_connections.values()) for c in list(cs)]
+        else:
+            connections = list(self.active_connections.get(user_id, []))
+        return sum(connection.offer(payload) for connection in connections)
+
+    async def send_personal_message(self, message: Any, user_id: int) -> bool:
+        """Queues message for each of the user's sockets, on any worker; False if the user is offline."""
+        payload = self._serialize(message)
+        delivered = self._deliver_local(user_id, payload) > 0
+        if self.backplane is not None:
+            try:
+                delivered = await self.backplane.publish_to_user(user_id, payload) or delivered
+            except Exception as e:
+                logger.error(f"Websocket backplane publish failed: {e}")
+        return delivered
+
+    async def broadcast(self, message: Any):
+        payload = self._serialize(message)
+        self._deliver_local(None, payload)
+        if self.backplane is not None:
+            try:
+                await self.backplane.publish_broadcast(payload)
+            except Exception as e:
+                logger.error(f"Websocket backplane publish failed: {e}")
+
+    async def close_all(self):
+        connections = [c for cs in list(self.active_connections.values()) for c in list(cs)]
+        await asyncio.gather(*(connection._evict() for connection in connections), return_exceptions=True)
+        if self.backplane is not None:
+            # Let the evictions' presence updates land before the subscriber goes away
+            await asyncio.gather(*self._presence_updates, return_exceptions=True)
+            await self.backplane.stop()
+
+    def stats(self) -> dict:
+        connections = [c for cs in self.active_connections.values() for c in cs]
+        return {
+            "users": len(self.active_connections),
+            "connections": len(connections),
+            "queued_messages": sum(c.queue.qsize() for c in connections),
+            "backplane": self.backplane.stats() if self.backplane is not None else None,
+        }
+
+
+def _build_backplane() -> Optional[RedisBackplane]:
+    if settings.WS_BACKPLANE != "redis":
+        return None
+    from app.utils.redis_client import get_redis
+    return RedisBackplane(get_redis(), presence_ttl=settings.WS_PRESENCE_TTL_SECONDS)
+
+manager = ConnectionManager(backplane=_build_backplane())
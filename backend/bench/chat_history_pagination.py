@@ -0,0 +1,153 @@
+"""
+Chat history paging over a seeded chat_history table (default 1M rows: --users users,
+one of whom has --heavy-user-rows messages). Measures load_history_page, i.e. the
+/ai/chat/{user_id}/history endpoint's query, for the first page and for pages deep
+into the heavy user's history reached by keyset cursor, against the same pages fetched
+with LIMIT/OFFSET; then repeats the first-page query without the
+(user_id, timestamp, id) index to show the scan it replaces.
+
+    cd backend && python bench/chat_history_pagination.py --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:////tmp/homehub_chat_bench.db")
+os.environ.setdefault("REDIS_URL", "memory://")
+
+from sqlalchemy import desc, select
+
+import main  # noqa: F401  Registers every model
+from app.database import AsyncSessionLocal, Base, engine
+from app.models.chat import ChatHistory
+from app.services.chat_store import load_history_page
+
+HEAVY_USER = 1
+INDEX = "ix_chat_history_user_timestamp"
+
+
+def seed(path: str, rows: int, users: int, heavy_rows: int):
+    Base.metadata.create_all(bind=engine, tables=[ChatHistory.__table__])
+    connection = sqlite3.connect(path)
+    existing = connection.execute("SELECT count(*) FROM chat_history").fetchone()[0]
+    if existing >= rows:
+        print(f"reusing {existing} seeded rows")
+        return
+    connection.execute("DELETE FROM chat_history")
+    print(f"seeding {rows} rows...", end=" ", flush=True)
+    started = time.perf_counter()
+    rng = random.Random(42)
+    base = datetime(2024, 1, 1)
+    light_rows = rows - heavy_rows
+
+    def generate():
+        for i in range(rows):
+            user_id = HEAVY_USER if i < heavy_rows else 2 + (i - heavy_rows) % (users - 1)
+            # Spread over a year; timestamps interleave across users like real traffic
+            offset = timedelta(seconds=i * 31_536_000 // rows + rng.randrange(30))
+            yield (user_id, "user" if i % 2 == 0 else "model", f"message {i}", (base + offset).isoformat(" "))
+
+    connection.executemany("INSERT INTO chat_history (user_id, role, message, timestamp) VALUES (?, ?, ?, ?)", generate())
+    connection.commit()
+    connection.execute("ANALYZE")
+    connection.close()
+    print(f"{time.perf_counter() - started:.1f}s ({heavy_rows} for user {HEAVY_USER}, {light_rows} across {users - 1} others)")
+
+
+def timed(samples: list):
+    class Timer:
+        def __enter__(self):
+            self.started = time.perf_counter()
+
+        def __exit__(self, *exc):
+            samples.append((time.perf_counter() - self.started) * 1000)
+    return Timer()
+
+
+def report(label: str, samples: list):
+    print(f"  {label:<44} median {statistics.median(samples):8.2f} ms   max {max(samples):8.2f} ms")
+
+
+async def offset_page(db, user_id: int, limit: int, offset: int):
+    query = (select(ChatHistory).filter(ChatHistory.user_id == user_id)
+             .order_by(desc(ChatHistory.timestamp), desc(ChatHistory.id)).offset(offset).limit(limit))
+    return list((await db.execute(query)).scalars().all())
+
+
+async def run(limit: int, depth_pages: int, repeats: int):
+    async with AsyncSessionLocal() as db:
+        first = []
+        for _ in range(repeats):
+            with timed(first):
+                await load_history_page(db, HEAVY_USER, limit)
+        report(f"first page ({limit} rows), keyset", first)
+
+        # Walk down to depth_pages by cursor, timing the last few pages
+        cursor, keyset_deep = None, []
+        for page in range(depth_pages):
+            samples = keyset_deep if page >= depth_pages - repeats else []
+            with timed(samples):
+                _, cursor = await load_history_page(db, HEAVY_USER, limit, cursor)
+        report(f"page ~{depth_pages}, keyset cursor", keyset_deep)
+
+        offset_deep = []
+        for page in range(depth_pages - repeats, depth_pages):
+            with timed(offset_deep):
+                await offset_page(db, HEAVY_USER, limit, page * limit)
+        report(f"page ~{depth_pages}, OFFSET {depth_pages * limit}", offset_deep)
+
+        light = []
+        for user_id in range(2, 2 + repeats):
+            with timed(light):
+                await load_history_page(db, user_id, limit)
+        report("first page, light users", light)
+
+
+def query_plan(path: str, with_index: bool) -> str:
+    connection = sqlite3.connect(path)
+    index = f"INDEXED BY {INDEX}" if with_index else "NOT INDEXED"
+    plan = connection.execute(
+        f"EXPLAIN QUERY PLAN SELECT * FROM chat_history {index} WHERE user_id = ? "
+        f"ORDER BY timestamp DESC, id DESC LIMIT 51", (HEAVY_USER,)
+    ).fetchall()
+    connection.close()
+    return "; ".join(row[-1] for row in plan)
+
+
+def unindexed_first_page(path: str, limit: int, repeats: int) -> list:
+    # Same query forced past the index: the table scan + sort every load used to do
+    connection = sqlite3.connect(path)
+    samples = []
+    for user_id in [HEAVY_USER] + list(range(2, 1 + repeats)):
+        with timed(samples):
+            connection.execute(
+                "SELECT * FROM chat_history NOT INDEXED WHERE user_id = ? "
+                "ORDER BY timestamp DESC, id DESC LIMIT ?", (user_id, limit + 1)
+            ).fetchall()
+    connection.close()
+    return samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--heavy-user-rows", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--depth-pages", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    path = engine.url.database
+    seed(path, args.rows, args.users, args.heavy_user_rows)
+    print(f"plan with index:    {query_plan(path, True)}")
+    print(f"plan without index: {query_plan(path, False)}")
+    asyncio.run(run(args.limit, args.depth_pages, args.repeats))
+    report("first page, no index (table scan)", unindexed_first_page(path, args.limit, args.repeats))
@@ -0,0 +1,135 @@
+"""
+Listing search over a seeded housing table (default 100k listings). Times
+search_listings, i.e. GET /housing/search, for common filter combinations, for the
+first page and for a page reached after --depth-pages cursor hops. Each query is also
+run with the (price, bedrooms) and is_verified indexes bypassed, for comparison.
+
+    cd backend && python bench/housing_search.py --listings 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:////tmp/homehub_housing_bench.db")
+os.environ.setdefault("REDIS_URL", "memory://")
+
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+
+import main  # noqa: F401  Registers every model
+from app.database import AsyncSessionLocal, Base, engine
+from app.models.housing import Housing
+from app.services.housing_search import HousingFilters, search_listings
+
+CASES = {
+    "no filters": HousingFilters(),
+    "price 500-900": HousingFilters(min_price=500, max_price=900),
+    "price <= 700, 2+ bedrooms": HousingFilters(max_price=700, min_bedrooms=2),
+    "verified only": HousingFilters(is_verified=True),
+    "verified, 1-2 bed, <= 1200 EUR": HousingFilters(max_price=1200, min_bedrooms=1, max_bedrooms=2,
+                                                    is_verified=True, currency="EUR"),
+    "3+ bed, 2+ bath (rare)": HousingFilters(min_bedrooms=3, min_bathrooms=2, max_price=600),
+}
+WORDS = "bright quiet spacious furnished studio flat room near campus metro park garden balcony modern cozy".split()
+
+
+def seed(path: str, listings: int):
+    Base.metadata.create_all(bind=engine)
+    connection = sqlite3.connect(path)
+    existing = connection.execute("SELECT count(*) FROM housing").fetchone()[0]
+    if existing >= listings:
+        print(f"reusing {existing} seeded listings")
+        return
+    connection.execute("DELETE FROM housing")
+    print(f"seeding {listings} listings...", end=" ", flush=True)
+    started = time.perf_counter()
+    rng = random.Random(7)
+
+    def generate():
+        for i in range(listings):
+            bedrooms = rng.choices([0, 1, 2, 3, 4], weights=[15, 40, 30, 10, 5])[0]
+            yield (
+                f"{' '.join(rng.sample(WORDS, 3))} {bedrooms}-bed #{i}",
+                " ".join(rng.choices(WORDS, k=30)),
+                f"{rng.randrange(1, 400)} Example Street",
+                round(rng.lognormvariate(6.7, 0.35), 2), # median ~800/month
+                rng.choices(["USD", "EUR", "GBP"], weights=[70, 20, 10])[0],
+                bedrooms,
+                rng.choice([1.0, 1.0, 1.5, 2.0, 2.5]),
+                rng.random() < 0.3,
+                40.0 + rng.random(),
+                -74.0 + rng.random(),
+            )
+
+    connection.executemany(
+        "INSERT INTO housing (title, description, address, price, currency, bedrooms, bathrooms, is_verified, latitude, longitude) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", generate()
+    )
+    connection.commit()
+    connection.execute("ANALYZE")
+    connection.close()
+    print(f"{time.perf_counter() - started:.1f}s")
+
+
+def median_ms(samples):
+    return statistics.median(samples) * 1000
+
+
+async def time_keyset(filters: HousingFilters, limit: int, depth_pages: int, repeats: int):
+    first, deep = [], []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            listings, cursor = await search_listings(db, filters, limit)
+            first.append(time.perf_counter() - started)
+        for page in range(depth_pages):
+            if cursor is None:
+                break
+            started = time.perf_counter()
+            listings, cursor = await search_listings(db, filters, limit, cursor)
+            if page >= depth_pages - repeats:
+                deep.append(time.perf_counter() - started)
+    return first, deep or [float("nan")]
+
+
+def time_unindexed(path: str, filters: HousingFilters, limit: int, repeats: int):
+    # The same first-page statement, compiled by SQLAlchemy, with the indexes bypassed
+    statement = filters.apply(
+        Housing.__table__.select().where(Housing.price.isnot(None))
+    ).order_by(Housing.price, Housing.id).limit(limit + 1)
+    compiled = statement.compile(dialect=sqlite_dialect.dialect(), compile_kwargs={"literal_binds": True})
+    sql = str(compiled).replace("FROM housing", "FROM housing NOT INDEXED", 1)
+    connection = sqlite3.connect(path)
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        connection.execute(sql).fetchall()
+        samples.append(time.perf_counter() - started)
+    connection.close()
+    return samples
+
+
+async def run(path: str, limit: int, depth_pages: int, repeats: int):
+    print(f"{'case':<34} {'page 1':>9} {f'page ~{depth_pages}':>10} {'no index':>10}   (median ms, {limit} per page)")
+    for label, filters in CASES.items():
+        first, deep = await time_keyset(filters, limit, depth_pages, repeats)
+        unindexed = time_unindexed(path, filters, limit, repeats)
+        print(f"{label:<34} {median_ms(first):9.2f} {median_ms(deep):10.2f} {median_ms(unindexed):10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--depth-pages", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    path = engine.url.database
+    seed(path, args.listings)
+    asyncio.run(run(path, args.limit, args.depth_pages, args.repeats))
@@ -0,0 +1,80 @@
+"""
+Load test for the async Gemini path: N concurrent /ai/lease-analysis requests
+against the app in-process, with the Gemini client replaced by one that takes
+--latency seconds per call. On the async path N calls (up to GEMINI_MAX_CONCURRENCY)
+finish in about one call's time; a blocking client would take N times that. Beyond
+the cap, calls run in ceil(N / cap) waves.
+
+    cd backend && python bench/load_ai_concurrency.py --requests 16 --latency 0.5
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:////tmp/homehub_bench.db")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+# Keep the rate limiter and request log out of the measurement
+os.environ.setdefault("GEMINI_RPM", "100000")
+os.environ.setdefault("GEMINI_BURST", "100000")
+os.environ.setdefault("REQUEST_LOGGING_ENABLED", "false")
+
+import httpx
+
+from main import app
+from app.config import settings
+from app.services.gemini_service import gemini_service
+
+
+class SlowModels:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate_content(self, model, contents):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        return types.SimpleNamespace(text='{"summary": "ok", "rating": "Safe"}', usage_metadata=None)
+
+
+async def run(requests: int, latency: float):
+    models = SlowModels(latency)
+    gemini_service.client = types.SimpleNamespace(aio=types.SimpleNamespace(models=models))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int):
+            # Distinct texts, so neither the cache nor single-flight merges the calls
+            response = await client.post("/api/v1/ai/lease-analysis", json={"text": f"Lease #{i}: 12 months"})
+            response.raise_for_status()
+
+        await one(-2) # Warm-up: imports, first DB connection
+        started = time.perf_counter()
+        await one(-1)
+        single = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        concurrent = time.perf_counter() - started
+
+    print(f"one call:            {single:.3f}s")
+    print(f"{requests} concurrent calls: {concurrent:.3f}s ({concurrent / single:.2f}x one call)")
+    cap = settings.GEMINI_MAX_CONCURRENCY
+    print(f"peak Gemini calls in flight: {models.peak} (cap {cap}, so {math.ceil(requests / cap)} wave(s) expected)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.latency))
@@ -0,0 +1,131 @@
+"""
+Overhead of RequestLoggingMiddleware, in three parts:
+
+1. What a request pays: the middleware around a no-op ASGI app, called directly,
+   against the bare no-op app. This is the timing plus the in-memory append.
+2. What the background writer pays: bulk-inserting the queued rows into
+   api_call_logs, per row. This runs off the request path but on the same loop.
+3. End to end: GET requests through the whole app in-process with and without the
+   middleware (interleaved rounds, alternating which goes first) while the writer
+   inserts in the background.
+
+    cd backend && python bench/request_logging_overhead.py --requests 4000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:////tmp/homehub_bench.db")
+os.environ.setdefault("REDIS_URL", "memory://")
+# The app is measured bare; the middleware is wrapped around it explicitly below
+os.environ["REQUEST_LOGGING_ENABLED"] = "false"
+
+import httpx
+
+from main import app
+from app.database import Base, engine
+from app.models.api_log import APICallLog
+from app.utils.batch_writer import BatchWriter
+from app.utils.request_logging import RequestLoggingMiddleware
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class _Route:
+    path = "/bench"
+
+
+async def _noop_app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def _send(message):
+    pass
+
+
+async def middleware_cost(calls: int) -> tuple:
+    writer = BatchWriter(APICallLog, max_pending=calls * 2)
+    wrapped = RequestLoggingMiddleware(_noop_app, writer=writer)
+    scope = {"type": "http", "method": "GET", "path": "/bench", "root_path": ""}
+    timings = {}
+    for label, target in (("bare", _noop_app), ("logged", wrapped), ("bare", _noop_app), ("logged", wrapped)):
+        started = time.perf_counter()
+        for _ in range(calls):
+            await target(dict(scope), _receive, _send)
+        # Second pass of each counts; the first is warm-up
+        timings[label] = (time.perf_counter() - started) / calls * 1e6
+    return timings["bare"], timings["logged"], writer
+
+
+async def insert_cost(writer: BatchWriter) -> float:
+    rows = len(writer._pending)
+    started = time.perf_counter()
+    await writer.flush()
+    return (time.perf_counter() - started) / max(rows, 1) * 1e6
+
+
+async def timed_requests(client: httpx.AsyncClient, path: str, count: int) -> list:
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = await client.get(path)
+        samples.append((time.perf_counter() - started) * 1e6)
+        response.raise_for_status()
+    return samples
+
+
+async def end_to_end(requests: int, rounds: int, path: str):
+    writer = BatchWriter(APICallLog, max_batch=500, flush_interval=0.5, max_pending=requests * 2)
+    writer.start()
+    bare = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    logged = httpx.AsyncClient(transport=httpx.ASGITransport(app=RequestLoggingMiddleware(app, writer=writer)),
+                               base_url="http://bench")
+    samples = {bare: [], logged: []}
+    async with bare, logged:
+        await timed_requests(bare, path, 50) # Warm-up
+        await timed_requests(logged, path, 50)
+        per_round = max(1, requests // rounds)
+        for i in range(rounds):
+            for client in ((bare, logged) if i % 2 == 0 else (logged, bare)):
+                samples[client] += await timed_requests(client, path, per_round)
+    await writer.stop()
+    return samples[bare], samples[logged], writer
+
+
+async def run(requests: int, rounds: int, path: str):
+    Base.metadata.create_all(bind=engine)
+
+    bare_us, logged_us, writer = await middleware_cost(requests * 50)
+    print(f"1. middleware on the request path: {logged_us - bare_us:.2f} us/request "
+          f"(no-op app {bare_us:.2f} us, wrapped {logged_us:.2f} us)")
+    print(f"2. background bulk insert: {await insert_cost(writer):.2f} us/row "
+          f"({writer.written} rows in batches of {writer.max_batch})")
+
+    without, with_logging, writer = await end_to_end(requests, rounds, path)
+    print(f"3. GET {path} through the app, {len(without)} requests each, microseconds:")
+    print(f"{'':>18} {'mean':>8} {'p50':>8} {'p99':>8}")
+    for label, samples in (("without logging", without), ("with logging", with_logging)):
+        print(f"{label:>18} {statistics.mean(samples):8.1f} {percentile(samples, 0.5):8.1f} {percentile(samples, 0.99):8.1f}")
+    print(f"   writer: {writer.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--path", default="/")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.rounds, args.path))
@@ -1,10 +1,53 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
+from app.database import async_engine
+from app.models.api_log import ensure_api_call_log
+from app.models.housing import ensure_coordinates, ensure_text_search
+from app.models.matching import ensure_roommate_match_store
+from app.utils.response_cache import response_cache
+from app.utils.redis_client import close_redis
+from app.utils.analytics import api_call_log_writer
+from app.utils.request_logging import RequestLoggingMiddleware
+from app.services.ai_result_store import start_writers, stop_writers
+from app.services.chat_store import chat_history_writer
+from app.services.geo_search import listing_geo_index
+from app.websocket.manager import manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Columns, tables and indexes added since older SQLite databases were created
+    async with async_engine.begin() as connection:
+        await connection.run_sync(ensure_api_call_log)
+        await connection.run_sync(ensure_roommate_match_store)
+        await connection.run_sync(ensure_coordinates)
+        await connection.run_sync(ensure_text_search)
+    # Background tasks: cache sweeper and the batched writers (api_call_logs, AI results, chat)
+    response_cache.start_sweeper()
+    api_call_log_writer.start()
+    start_writers()
+    chat_history_writer.start()
+    # Listing coordinates for distance search, reloaded periodically
+    listing_geo_index.start()
+    # Websocket backplane subscriber (when WS_BACKPLANE=redis)
+    await manager.start()
+    yield
+    await manager.close_all()
+    await listing_geo_index.stop()
+    # Stopping a writer flushes whatever it still has queued
+    await chat_history_writer.stop()
+    await stop_writers()
+    await api_call_log_writer.stop()
+    await response_cache.stop_sweeper()
+    await close_redis()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Set all CORS enabled origins
@@ -17,6 +60,9 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+if settings.REQUEST_LOGGING_ENABLED:
+    app.add_middleware(RequestLoggingMiddleware, writer=api_call_log_writer)
+
 from app.routes import api_router
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
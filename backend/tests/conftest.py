@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time, so these must be in place before app is imported
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'homehub_test.db')}")
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("REQUEST_LOGGING_ENABLED", "false")
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Creates every table in the test database once."""
+    import main  # noqa: F401  Registers all models
+    from app.database import Base, engine
+    Base.metadata.create_all(bind=engine)
+    return engine
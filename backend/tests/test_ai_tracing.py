@@ -0,0 +1,141 @@
+import asyncio
+import types
+
+import pytest
+
+from app.utils import ai_tracing, analytics, gemini_rate_limiter
+from app.utils.ai_tracing import current_trace, record_usage, render_prometheus, traced_feature
+from app.utils.redis_client import LocalRedis
+from app.utils.response_cache import LRUResponseCache, RedisCacheBackend
+from app.utils.single_flight import SingleFlight
+
+
+@pytest.fixture
+def log_rows(monkeypatch):
+    """Rows handed to the api_call_logs writer."""
+    rows = []
+    monkeypatch.setattr(analytics.settings, "ANALYTICS_FLUSH_TO_DB", True)
+    monkeypatch.setattr(analytics.api_call_log_writer, "add", rows.append)
+    return rows
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(gemini_rate_limiter, "single_flight", SingleFlight())
+    monkeypatch.setattr(gemini_rate_limiter, "cache_backend",
+                        RedisCacheBackend(LocalRedis(), LRUResponseCache(max_entries=100, max_bytes=1 << 20)))
+
+
+def _usage(prompt, response):
+    return types.SimpleNamespace(prompt_token_count=prompt, candidates_token_count=response)
+
+
+def test_nested_call_joins_the_outer_trace(log_rows):
+    @traced_feature("trace_inner")
+    async def inner():
+        record_usage(_usage(3, 4))
+        return current_trace()
+
+    @traced_feature("trace_outer")
+    async def outer():
+        return current_trace(), await inner()
+
+    outer_trace, inner_trace = asyncio.run(outer())
+    assert inner_trace is outer_trace
+    assert "trace_inner" not in ai_tracing._counters
+    assert ai_tracing._counters["trace_outer"].calls == {"success": 1}
+    assert [row["endpoint"] for row in log_rows] == ["ai:trace_outer"]
+
+
+def test_tokens_come_from_usage_metadata(log_rows):
+    @traced_feature("trace_tokens")
+    async def call():
+        record_usage(_usage(12, 30))
+        record_usage(_usage(8, None)) # A second request in the same feature call
+        record_usage(None)
+
+    asyncio.run(call())
+    counters = ai_tracing._counters["trace_tokens"]
+    assert (counters.prompt_tokens, counters.response_tokens) == (20, 30)
+    assert log_rows[0]["tokens_used"] == 50
+    assert log_rows[0]["status_code"] == 200
+
+
+def test_cache_hit_and_coalesced_status(cache, log_rows):
+    @gemini_rate_limiter.with_cache(ttl_seconds=60)
+    async def generate(owner, prompt):
+        await asyncio.sleep(0.02)
+        return prompt
+
+    @traced_feature("trace_cache")
+    async def feature(prompt):
+        return await generate(None, prompt)
+
+    async def run():
+        await asyncio.gather(feature("a"), feature("a")) # One miss, one coalesced onto it
+        await feature("a") # Now cached
+
+    asyncio.run(run())
+    assert ai_tracing._counters["trace_cache"].cache == {"miss": 1, "coalesced": 1, "hit": 1}
+
+
+def test_async_generator_is_traced_without_leaking_the_trace(log_rows):
+    @traced_feature("trace_stream")
+    async def stream():
+        # Streaming chunks report running totals
+        for response_tokens in (5, 12, 20):
+            record_usage(_usage(7, response_tokens), cumulative=True)
+            yield response_tokens
+
+    async def run():
+        seen = []
+        async for chunk in stream():
+            seen.append((chunk, current_trace()))
+        return seen
+
+    assert asyncio.run(run()) == [(5, None), (12, None), (20, None)]
+    counters = ai_tracing._counters["trace_stream"]
+    assert (counters.prompt_tokens, counters.response_tokens) == (7, 20)
+    assert counters.calls == {"success": 1}
+
+
+def test_failed_call_is_counted_as_an_error(log_rows):
+    @traced_feature("trace_error")
+    async def call():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(call())
+    assert ai_tracing._counters["trace_error"].calls == {"error": 1}
+    assert (log_rows[0]["status_code"], log_rows[0]["error_message"]) == (500, "RuntimeError: boom")
+
+
+def test_render_prometheus(log_rows):
+    @traced_feature('trace "prom"')
+    async def call():
+        record_usage(_usage(2, 3))
+
+    asyncio.run(call())
+    lines = render_prometheus().splitlines()
+    label = 'feature="trace \\"prom\\""'
+    assert "# TYPE studzo_ai_calls_total counter" in lines
+    assert f'studzo_ai_calls_total{{{label},status="success"}} 1' in lines
+    assert f'studzo_ai_tokens_total{{{label},kind="prompt"}} 2' in lines
+    assert f'studzo_ai_tokens_total{{{label},kind="response"}} 3' in lines
+    assert f'studzo_ai_cache_total{{{label},status="none"}} 1' in lines
+    assert f'studzo_ai_latency_seconds_bucket{{{label},le="+Inf"}} 1' in lines
+    assert f"studzo_ai_latency_seconds_count{{{label}}} 1" in lines
+    buckets = [int(line.rsplit(" ", 1)[1]) for line in lines if line.startswith(f"studzo_ai_latency_seconds_bucket{{{label}")]
+    assert buckets == sorted(buckets) # Cumulative
+
+
+def test_api_call_log_table_is_created_on_an_old_database(tmp_path):
+    from sqlalchemy import create_engine, inspect
+    from app.models.api_log import ensure_api_call_log
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    for _ in range(2):
+        with engine.begin() as connection:
+            ensure_api_call_log(connection)
+    assert "tokens_used" in {column["name"] for column in inspect(engine).get_columns("api_call_logs")}
+    engine.dispose()
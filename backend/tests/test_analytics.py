@@ -0,0 +1,62 @@
+import math
+import random
+
+from app.utils.analytics import LATENCY_BOUNDS, LatencyHistogram, MetricsStore
+
+T0 = 1_800_000_000.0 # On an hour boundary
+
+
+def test_percentiles_are_within_one_bucket_of_the_true_values():
+    rng = random.Random(3)
+    samples = [rng.lognormvariate(-2.5, 1.0) for _ in range(20_000)]
+    histogram = LatencyHistogram()
+    for latency in samples:
+        histogram.add(latency)
+
+    samples.sort()
+    for q in (0.5, 0.95, 0.99):
+        true = samples[math.ceil(q * len(samples)) - 1]
+        # Reported as the upper bound of the sample's bucket: at most 25% above it
+        assert true <= histogram.percentile(q) <= true * 1.25
+
+
+def test_minute_and_hour_buckets_roll_over_and_age_out():
+    store = MetricsStore()
+    store.record("chat", True, 0.1, tokens=10, now=T0)
+    store.record("chat", False, 0.3, tokens=5, now=T0 + 61) # Next minute
+
+    summary = store.summary(now=T0 + 90)
+    assert summary["last_hour"]["calls"] == 2
+    assert summary["last_hour"]["tokens_used"] == 15
+    assert summary["last_hour"]["success_rate"] == 50.0
+
+    store.record("chat", True, 0.2, now=T0 + 3600 + 120) # Next hour
+
+    # An hour later the first two calls have left last_hour but not last_24_hours
+    summary = store.summary(now=T0 + 3600 + 150)
+    assert summary["last_hour"]["calls"] == 1
+    assert summary["last_24_hours"]["calls"] == 3
+
+    # A day later only the lifetime totals remember them
+    summary = store.summary(now=T0 + 24 * 3600 + 60)
+    assert summary["last_hour"]["calls"] == 0
+    assert summary["last_24_hours"]["calls"] == 1
+    assert summary["total_calls"] == 3
+    assert summary["feature_breakdown"] == {"chat": 3}
+
+
+def test_memory_is_bounded_by_bucket_count_not_call_count():
+    store = MetricsStore()
+    for i in range(100_000):
+        # A call a second for ~28 hours, over two features
+        store.record("chat" if i % 2 else "lease", i % 7 != 0, 0.05 + (i % 10) / 100, now=T0 + i)
+
+    for metrics in store._features.values():
+        assert len(metrics.minutes) == 60
+        assert len(metrics.hours) == 24
+        for bucket in [metrics.lifetime, *metrics.minutes, *metrics.hours]:
+            assert len(bucket.histogram.counts) == len(LATENCY_BOUNDS) + 1
+    summary = store.summary(now=T0 + 100_000)
+    assert summary["total_calls"] == 100_000
+    # 59 whole minutes plus the 40 seconds so far of the current one
+    assert summary["last_hour"]["calls"] == 59 * 60 + 40
@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+from app.utils.redis_client import LocalRedis
+from app.websocket.backplane import RedisBackplane
+from app.websocket.manager import ConnectionManager
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.received = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        self.received.append(message)
+
+    async def close(self, code=1000):
+        pass
+
+
+async def _workers(count: int, redis: LocalRedis):
+    """`count` managers sharing one in-process Redis, as separate uvicorn workers would share a server."""
+    workers = [ConnectionManager(max_queue=16, send_timeout=1, backplane=RedisBackplane(redis)) for _ in range(count)]
+    for worker in workers:
+        await worker.start()
+    return workers
+
+
+async def _settle():
+    # Subscribers poll with a timeout; give them a few turns of the loop
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+
+
+def test_personal_message_reaches_socket_on_another_worker():
+    async def run():
+        redis = LocalRedis()
+        first, second = await _workers(2, redis)
+        socket = RecordingWebSocket()
+        await second.connect(socket, user_id=42)
+
+        delivered = await first.send_personal_message({"type": "notification", "text": "Lease signed"}, 42)
+        await _settle()
+        stats = first.backplane.stats(), second.backplane.stats()
+        await first.close_all()
+        await second.close_all()
+        return delivered, socket.received, stats
+
+    delivered, received, (first_stats, second_stats) = asyncio.run(run())
+    assert delivered is True
+    assert [json.loads(message) for message in received] == [{"type": "notification", "text": "Lease signed"}]
+    assert first_stats["published"] == 1 and second_stats["received"] == 1
+
+
+def test_offline_user_is_not_published():
+    async def run():
+        redis = LocalRedis()
+        first, second = await _workers(2, redis)
+        socket = RecordingWebSocket()
+        connection = await second.connect(socket, user_id=42)
+        connection.close()
+        await asyncio.gather(*second._presence_updates)
+
+        delivered = await first.send_personal_message("anyone?", 42)
+        await _settle()
+        stats = first.backplane.stats()
+        await first.close_all()
+        await second.close_all()
+        return delivered, socket.received, stats
+
+    delivered, received, stats = asyncio.run(run())
+    assert delivered is False and received == []
+    assert stats["skipped_offline"] == 1 and stats["published"] == 0
+
+
+def test_broadcast_reaches_every_worker_once():
+    async def run():
+        redis = LocalRedis()
+        workers = await _workers(3, redis)
+        sockets = [RecordingWebSocket() for _ in workers]
+        for user_id, (worker, socket) in enumerate(zip(workers, sockets)):
+            await worker.connect(socket, user_id=user_id)
+
+        await workers[0].broadcast({"type": "announcement"})
+        await _settle()
+        for worker in workers:
+            await worker.close_all()
+        return [socket.received for socket in sockets]
+
+    assert asyncio.run(run()) == [['{"type": "announcement"}']] * 3
+
+
+def test_presence_is_cleared_when_a_worker_stops():
+    async def run():
+        redis = LocalRedis()
+        first, second = await _workers(2, redis)
+        await second.connect(RecordingWebSocket(), user_id=9)
+        assert await first.backplane.is_online_elsewhere(9)
+        await second.close_all()
+        online = await first.backplane.is_online_elsewhere(9)
+        await first.close_all()
+        return online
+
+    assert asyncio.run(run()) is False
@@ -0,0 +1,134 @@
+import asyncio
+
+from sqlalchemy import delete, select
+
+from app.database import AsyncSessionLocal
+from app.models.api_log import APICallLog
+from app.utils.batch_writer import BatchWriter
+
+
+def _row(row_id: int) -> dict:
+    return {"id": row_id, "endpoint": "GET /", "duration_ms": 1.0, "status_code": 200,
+            "tokens_used": 0, "error_message": None}
+
+
+async def _clear_and_read(writer: BatchWriter, run_writer):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(APICallLog))
+        await db.commit()
+    await run_writer(writer)
+    async with AsyncSessionLocal() as db:
+        return list((await db.execute(select(APICallLog.id).order_by(APICallLog.id))).scalars().all())
+
+
+def test_bad_rows_are_dropped_alone(database):
+    writer = BatchWriter(APICallLog, max_batch=100, max_retries=0)
+    for row_id in range(1, 21):
+        writer.add(_row(row_id))
+    writer.add(_row(7)) # Duplicate primary key: fails the whole batch
+    writer.add(_row(30))
+
+    ids = asyncio.run(_clear_and_read(writer, lambda w: w.flush()))
+    assert ids == list(range(1, 21)) + [30]
+    assert (writer.written, writer.lost, writer.failed_batches) == (21, 1, 1)
+
+
+def test_flush_waits_for_the_insert_in_flight(database):
+    writer = BatchWriter(APICallLog, max_batch=10, flush_interval=60)
+    insert = writer._insert
+
+    async def slow_insert(rows):
+        await asyncio.sleep(0.2)
+        await insert(rows)
+
+    writer._insert = slow_insert
+
+    async def run_writer(writer):
+        writer.start()
+        for row_id in range(1, 11):
+            writer.add(_row(row_id)) # A full batch: wakes the background task
+        await asyncio.sleep(0.05) # ...which is now mid-insert, with an empty buffer
+        assert not writer._pending
+        await writer.flush()
+        assert writer.written == 10
+        await writer.stop()
+
+    assert asyncio.run(_clear_and_read(writer, run_writer)) == list(range(1, 11))
+
+
+def _named(name: str, row_id=None) -> dict:
+    return {"id": row_id, "endpoint": name, "duration_ms": 1.0, "status_code": 200,
+            "tokens_used": 0, "error_message": None}
+
+
+async def _endpoints():
+    async with AsyncSessionLocal() as db:
+        return sorted((await db.execute(select(APICallLog.endpoint))).scalars().all())
+
+
+def test_cancelled_salvage_requeues_only_unwritten_rows(database):
+    writer = BatchWriter(APICallLog, max_batch=100, max_retries=0)
+    insert = writer._insert
+    calls = []
+
+    async def insert_then_stall(rows):
+        calls.append(len(rows))
+        if len(calls) == 3:
+            # Whole batch failed, first half committed; stopped while on the second half
+            await asyncio.sleep(10)
+        await insert(rows)
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(APICallLog))
+            db.add(APICallLog(**_named("taken", 1000)))
+            await db.commit()
+        for i in range(7):
+            writer.add(_named(f"row {i}"))
+        writer.add(_named("bad", 1000)) # Primary key already taken
+        writer._insert = insert_then_stall
+        task = asyncio.ensure_future(writer.flush())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        requeued = [row["endpoint"] for row in writer._pending]
+        writer._insert = insert
+        await writer.flush() # What stop() does after cancelling the task
+        return requeued, await _endpoints()
+
+    requeued, endpoints = asyncio.run(run())
+    assert calls[:3] == [8, 4, 4]
+    assert requeued == ["row 4", "row 5", "row 6", "bad"]
+    assert endpoints == sorted([f"row {i}" for i in range(7)] + ["taken"])
+
+
+def test_cancellation_after_commit_requeues_nothing(database):
+    writer = BatchWriter(APICallLog, max_batch=100)
+    insert = writer._insert
+
+    async def commit_then_stall(rows):
+        await insert(rows)
+        await asyncio.sleep(10) # e.g. closing the session
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(APICallLog))
+            await db.commit()
+        for i in range(3):
+            writer.add(_named(f"row {i}"))
+        writer._insert = commit_then_stall
+        task = asyncio.ensure_future(writer.flush())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await writer.flush()
+        return await _endpoints()
+
+    assert asyncio.run(run()) == ["row 0", "row 1", "row 2"]
+    assert not writer._pending
@@ -0,0 +1,54 @@
+import asyncio
+
+from app.services import chat_context as chat_context_module
+from app.services.chat_context import ChatContext, pair_turns
+from app.services.gemini_service import CHAT_UNAVAILABLE, gemini_service
+
+
+def _turn(role, text):
+    return {"role": role, "parts": [text]}
+
+
+def test_pair_turns_alternates_by_role():
+    history = [
+        _turn("model", "reply whose question fell outside the window"),
+        _turn("user", "hi"),
+        _turn("user", "anyone there?"), # first message got no reply
+        _turn("model", "hello!"),
+        _turn("user", "where do I get a SIM card?"),
+        _turn("model", "at the airport"),
+        _turn("user", "thanks"), # reply failed
+    ]
+    assert pair_turns(history) == [
+        {"role": "user", "parts": ["hi", "anyone there?"]},
+        {"role": "model", "parts": ["hello!"]},
+        {"role": "user", "parts": ["where do I get a SIM card?"]},
+        {"role": "model", "parts": ["at the airport"]},
+    ]
+
+
+def test_compaction_keeps_history_starting_with_a_user_turn(monkeypatch):
+    async def summarize_chat(previous, turns):
+        return f"{len(turns)} older turns"
+
+    monkeypatch.setattr(chat_context_module.gemini_service, "summarize_chat", summarize_chat)
+    history = [_turn(role, "x" * 40) for _ in range(6) for role in ("user", "model")]
+    context = ChatContext(history, token_budget=50, keep_turns=3)
+
+    asyncio.run(context._compact("next question"))
+    assert context.summary == "10 older turns"
+    assert [turn["role"] for turn in context.turns] == ["user", "model"]
+
+
+def test_no_gemini_client_answers_instead_of_crashing(monkeypatch):
+    def create_chat(history):
+        raise AttributeError("'GeminiService' object has no attribute 'client'")
+
+    monkeypatch.setattr(gemini_service, "create_chat", create_chat)
+    context = ChatContext([])
+
+    async def run():
+        return [chunk async for chunk in context.stream_reply("hello")]
+
+    assert asyncio.run(run()) == [CHAT_UNAVAILABLE]
+    assert context.turns == []
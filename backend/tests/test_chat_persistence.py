@@ -0,0 +1,114 @@
+import asyncio
+
+from fastapi import WebSocketDisconnect
+from sqlalchemy import delete, select
+
+from app.database import AsyncSessionLocal
+from app.models.chat import ChatHistory
+from app.routes.gemini_ai import websocket_endpoint
+from app.services.chat_store import chat_history_writer
+from app.services.gemini_service import gemini_service
+
+REPLY = ["Rent ", "is due ", "on the 1st ", "of each month."]
+
+
+class FakeChat:
+    def __init__(self):
+        self.history = []
+
+    def get_history(self, curated=True):
+        return self.history
+
+
+class DroppingWebSocket:
+    """A client that sends its messages, reads `read` chunks, then vanishes without a close frame."""
+    def __init__(self, messages, read: int):
+        self.messages = list(messages)
+        self.read = read
+        self.sent = []
+        self.gone = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        if self.messages:
+            return self.messages.pop(0)
+        await self.gone.wait()
+        raise WebSocketDisconnect(code=1006)
+
+    async def send_text(self, message):
+        if len(self.sent) >= self.read:
+            self.gone.set()
+            raise ConnectionResetError("client went away")
+        self.sent.append(message)
+
+    async def close(self, code=1000):
+        pass
+
+
+def _fake_gemini(monkeypatch):
+    monkeypatch.setattr(gemini_service, "create_chat", lambda history: FakeChat())
+
+    async def chat_stream(message, history=(), chat=None):
+        for chunk in REPLY:
+            await asyncio.sleep(0.01)
+            yield chunk
+        chat.history += [message, "".join(REPLY)]
+
+    monkeypatch.setattr(gemini_service, "chat_stream", chat_stream)
+
+
+async def _messages(user_id: int):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ChatHistory.role, ChatHistory.message)
+            .filter(ChatHistory.user_id == user_id).order_by(ChatHistory.timestamp, ChatHistory.id)
+        )
+        return [tuple(row) for row in result.all()]
+
+
+async def _clear(user_id: int):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(ChatHistory).where(ChatHistory.user_id == user_id))
+        await db.commit()
+
+
+def test_messages_survive_abrupt_disconnect(database, monkeypatch):
+    _fake_gemini(monkeypatch)
+    user_id = 5150
+
+    async def run():
+        await _clear(user_id)
+        # No background flush timer is running: only the socket's own flush on
+        # disconnect can get these rows into the table
+        socket = DroppingWebSocket(["Hi", "When is rent due?"], read=5)
+        await asyncio.wait_for(websocket_endpoint(socket, user_id), timeout=5)
+        return socket.sent, await _messages(user_id)
+
+    sent, stored = asyncio.run(run())
+    assert len(sent) == 5
+    assert stored[:3] == [("user", "Hi"), ("model", "".join(REPLY)), ("user", "When is rent due?")]
+    # The interrupted reply is kept as far as it was streamed
+    assert len(stored) == 4 and stored[3][0] == "model" and "".join(REPLY).startswith(stored[3][1])
+    assert not chat_history_writer._pending
+
+
+def test_cancelled_socket_leaves_rows_for_the_writer(database, monkeypatch):
+    _fake_gemini(monkeypatch)
+    user_id = 5151
+
+    async def run():
+        await _clear(user_id)
+        socket = DroppingWebSocket(["Hi"], read=100)
+        handler = asyncio.ensure_future(websocket_endpoint(socket, user_id))
+        await asyncio.sleep(0.02) # Mid-reply
+        handler.cancel() # e.g. the server shutting down
+        await asyncio.gather(handler, return_exceptions=True)
+        # Whatever the cancelled handler couldn't flush is still queued for the writer
+        await chat_history_writer.stop()
+        return await _messages(user_id)
+
+    stored = asyncio.run(run())
+    assert stored[0] == ("user", "Hi")
+    assert not chat_history_writer._pending
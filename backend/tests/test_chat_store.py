@@ -0,0 +1,60 @@
+import asyncio
+import base64
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.chat import ChatHistory
+
+USER_ID = 4242
+
+
+@pytest.fixture
+def client(database):
+    from main import app
+    return TestClient(app) # Not entered: no lifespan, so no background writers
+
+
+def _seed(count: int):
+    # Only three distinct timestamps: most rows tie on the first sort key
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(ChatHistory).where(ChatHistory.user_id == USER_ID))
+            records = [ChatHistory(user_id=USER_ID, role="user", message=f"m{i}", timestamp=start + timedelta(seconds=i % 3))
+                       for i in range(count)]
+            db.add_all(records)
+            await db.commit()
+            return sorted(((record.timestamp, record.id) for record in records), reverse=True)
+
+    return [record_id for _, record_id in asyncio.run(run())]
+
+
+def test_history_pages_through_tied_timestamps_without_gaps_or_repeats(client):
+    expected = _seed(23)
+    url = f"{settings.API_V1_STR}/ai/chat/{USER_ID}/history"
+
+    seen, before, pages = [], None, 0
+    while True:
+        response = client.get(url, params={"limit": 5, **({"before": before} if before else {})})
+        assert response.status_code == 200
+        page = response.json()
+        seen += [message["id"] for message in page["messages"]]
+        pages += 1
+        before = page["next_cursor"]
+        if before is None:
+            break
+
+    assert seen == expected # Newest first, each message exactly once
+    assert pages == 5
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", base64.urlsafe_b64encode(b"2026-01-01T00:00:00").decode()])
+def test_bad_history_cursor_is_a_bad_request(client, cursor):
+    response = client.get(f"{settings.API_V1_STR}/ai/chat/{USER_ID}/history", params={"before": cursor})
+    assert response.status_code == 400
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from app.config import Settings
+from app.utils.gemini_rate_limiter import PRIORITY_HIGH, PRIORITY_LOW, GeminiRateLimiter
+
+
+def test_zero_rpm_is_rejected():
+    with pytest.raises(ValidationError):
+        Settings(GEMINI_RPM=0)
+    with pytest.raises(ValueError):
+        GeminiRateLimiter(requests_per_minute=0)
+
+
+def test_burst_beyond_capacity_queues_instead_of_failing():
+    # 20 tokens/s: the three requests beyond the burst wait ~50ms each
+    limiter = GeminiRateLimiter(requests_per_minute=1200, burst=2, max_wait_seconds=5)
+
+    async def run():
+        await asyncio.gather(*(limiter.wait_for_token() for _ in range(5)))
+
+    asyncio.run(run())
+    stats = limiter.stats()
+    assert (stats["granted"], stats["queued"], stats["timeouts"]) == (5, 3, 0)
+
+
+def test_high_priority_waiter_is_granted_before_earlier_low_ones():
+    limiter = GeminiRateLimiter(requests_per_minute=1200, burst=1, max_wait_seconds=5)
+    granted = []
+
+    async def wait(name, priority):
+        await limiter.wait_for_token(priority)
+        granted.append(name)
+
+    async def run():
+        await limiter.wait_for_token() # Empties the bucket
+        low = [asyncio.ensure_future(wait(f"low{i}", PRIORITY_LOW)) for i in range(2)]
+        await asyncio.sleep(0) # Both low waiters are queued first
+        high = asyncio.ensure_future(wait("high", PRIORITY_HIGH))
+        await asyncio.gather(*low, high)
+
+    asyncio.run(run())
+    assert granted == ["high", "low0", "low1"]
+
+
+def test_waiter_past_max_wait_gets_a_429():
+    limiter = GeminiRateLimiter(requests_per_minute=60, burst=1, max_wait_seconds=0.05)
+
+    async def run():
+        await limiter.wait_for_token()
+        with pytest.raises(Exception, match="429"):
+            await limiter.wait_for_token()
+
+    asyncio.run(run())
+    assert limiter.stats()["timeouts"] == 1
+
+
+def test_stats_report_queue_depth_and_waits():
+    limiter = GeminiRateLimiter(requests_per_minute=600, burst=1, max_wait_seconds=5)
+
+    async def run():
+        await limiter.wait_for_token()
+        waiters = [asyncio.ensure_future(limiter.wait_for_token()) for _ in range(2)]
+        await asyncio.sleep(0)
+        depth = limiter.stats()["queue_depth"]
+        await asyncio.gather(*waiters)
+        return depth
+
+    assert asyncio.run(run()) == 2
+    stats = limiter.stats()
+    assert stats["queue_depth"] == 0
+    # 10 tokens/s: the second waiter waits ~0.2s
+    assert 0.15 <= stats["max_wait"] <= 1.0
+    assert 0 < stats["average_wait"] < stats["max_wait"]
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from app.utils.geo_index import GeoGridIndex, haversine_km
+
+# The equirectangular shortcut used for nearby points is within ~0.1% of haversine
+TOLERANCE = 2e-3
+
+
+def _points(rng, count, lat, lon, spread):
+    return {i: (lat + rng.uniform(-spread, spread), lon + rng.uniform(-spread, spread)) for i in range(count)}
+
+
+def _brute(points, lat, lon):
+    return sorted((haversine_km(lat, lon, plat, plon), point_id) for point_id, (plat, plon) in points.items())
+
+
+# A dense city, a sparse region (whole-grid scan path) and a high latitude (narrow cells)
+SCENARIOS = [(2000, 40.75, -73.98, 0.1), (300, 48.0, 10.0, 5.0), (1000, 60.2, 24.9, 0.2)]
+
+
+@pytest.mark.parametrize("count, lat, lon, spread", SCENARIOS)
+def test_within_radius_matches_brute_force(count, lat, lon, spread):
+    rng = random.Random(count)
+    points = _points(rng, count, lat, lon, spread)
+    index = GeoGridIndex()
+    for point_id, (plat, plon) in points.items():
+        index.upsert(point_id, plat, plon)
+
+    for _ in range(30):
+        qlat, qlon = lat + rng.uniform(-spread, spread), lon + rng.uniform(-spread, spread)
+        radius = rng.choice([0.3, 1.0, 5.0, 50.0])
+        hits = index.within_radius(qlat, qlon, radius)
+        distances = [distance for _, distance in hits]
+        assert distances == sorted(distances)
+        found = {point_id for point_id, _ in hits}
+        for distance, point_id in _brute(points, qlat, qlon):
+            if distance < radius * (1 - TOLERANCE):
+                assert point_id in found
+            elif distance > radius * (1 + TOLERANCE):
+                assert point_id not in found
+
+
+@pytest.mark.parametrize("count, lat, lon, spread", SCENARIOS)
+def test_nearest_matches_brute_force(count, lat, lon, spread):
+    rng = random.Random(count + 1)
+    points = _points(rng, count, lat, lon, spread)
+    index = GeoGridIndex()
+    for point_id, (plat, plon) in points.items():
+        index.upsert(point_id, plat, plon)
+
+    for _ in range(30):
+        qlat, qlon = lat + rng.uniform(-spread, spread), lon + rng.uniform(-spread, spread)
+        k = rng.choice([1, 5, 20])
+        hits = index.nearest(qlat, qlon, k)
+        expected = [distance for distance, _ in _brute(points, qlat, qlon)[:k]]
+        assert [distance for _, distance in hits] == pytest.approx(expected, rel=TOLERANCE)
+        for point_id, distance in hits:
+            assert distance == pytest.approx(haversine_km(qlat, qlon, *points[point_id]), rel=TOLERANCE)
+
+
+@pytest.mark.parametrize("count, lat, lon, spread", SCENARIOS)
+def test_iter_nearest_stops_at_max_km(count, lat, lon, spread):
+    rng = random.Random(count + 2)
+    points = _points(rng, count, lat, lon, spread)
+    index = GeoGridIndex()
+    for point_id, (plat, plon) in points.items():
+        index.upsert(point_id, plat, plon)
+
+    for _ in range(30):
+        qlat, qlon = lat + rng.uniform(-spread, spread), lon + rng.uniform(-spread, spread)
+        max_km = rng.choice([0.5, 2.0, 20.0])
+        hits = list(index.iter_nearest(qlat, qlon, max_km=max_km))
+        distances = [distance for _, distance in hits]
+        assert distances == sorted(distances) and all(distance <= max_km for distance in distances)
+        assert len({point_id for point_id, _ in hits}) == len(hits)
+        brute = _brute(points, qlat, qlon)
+        assert (sum(1 for distance, _ in brute if distance < max_km * (1 - TOLERANCE))
+                <= len(hits) <=
+                sum(1 for distance, _ in brute if distance <= max_km * (1 + TOLERANCE)))
+
+
+def test_moved_and_removed_points():
+    index = GeoGridIndex()
+    index.upsert(1, 40.0, -74.0)
+    index.upsert(2, 40.001, -74.0)
+    index.upsert(1, 41.0, -74.0) # Moved away
+    index.remove(2)
+    index.remove(3) # Unknown: ignored
+    assert len(index) == 1
+    assert index.within_radius(40.0, -74.0, 5) == []
+    assert [point_id for point_id, _ in index.nearest(40.0, -74.0, 5)] == [1]
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.housing import Housing
+from app.models.university import University
+from app.services import hostel_discovery
+from app.services.hostel_discovery import discover_hostels, parse_radius
+from app.utils.redis_client import LocalRedis
+from app.utils.response_cache import LRUResponseCache, RedisCacheBackend
+
+
+def test_radius_defaults_and_bounds():
+    assert parse_radius({}) == settings.HOSTEL_DISCOVERY_RADIUS_KM
+    assert parse_radius({"radius_km": "2.5"}) == 2.5
+    for radius in (0, -1, 51, "inf", "nan", "far"):
+        with pytest.raises(ValueError):
+            parse_radius({"radius_km": radius})
+
+
+@pytest.mark.parametrize("filters", [
+    {"radius_km": 0},
+    {"radius_km": 10_000},
+    {"latitude": 91, "longitude": 0},
+    {"latitude": 0, "longitude": -181},
+    {"latitude": "north", "longitude": 0},
+])
+def test_out_of_range_location_is_a_bad_request(database, filters):
+    from main import app
+    response = TestClient(app).post(f"{settings.API_V1_STR}/ai/hostel-discovery",
+                                    json={"query": "quiet room", "filters": filters})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("university_id, status", [(404404, 404), (77, 404), ("abc", 400)])
+def test_unusable_university_is_an_error_not_a_search_without_location(database, university_id, status):
+    async def seed(db):
+        await db.execute(delete(University))
+        db.add(University(id=77, name="No Campus Yet", latitude=None, longitude=None)) # No coordinates
+
+    asyncio.run(_run(seed))
+    from main import app
+    response = TestClient(app).post(f"{settings.API_V1_STR}/ai/hostel-discovery",
+                                    json={"query": "quiet room", "filters": {"university_id": university_id}})
+    assert response.status_code == status
+    asyncio.run(_run(lambda db: db.execute(delete(University))))
+
+
+@pytest.fixture
+def annotations(database, monkeypatch):
+    """Listing ids sent to Gemini, one list per annotate_listings call."""
+    monkeypatch.setattr(hostel_discovery, "cache_backend",
+                        RedisCacheBackend(LocalRedis(), LRUResponseCache(max_entries=100, max_bytes=1 << 20)))
+    calls = []
+
+    async def annotate_listings(listings):
+        calls.append(sorted(listing["id"] for listing in listings))
+        return {listing["id"]: {"pros": [listing["description"]], "cons": [], "best_for": "Students"}
+                for listing in listings}
+
+    monkeypatch.setattr(hostel_discovery.gemini_service, "annotate_listings", annotate_listings)
+    asyncio.run(_run(lambda db: db.execute(delete(Housing))))
+    yield calls
+    asyncio.run(_run(lambda db: db.execute(delete(Housing))))
+
+
+async def _run(step):
+    async with AsyncSessionLocal() as db:
+        result = await step(db)
+        await db.commit()
+        return result
+
+
+def _listing(listing_id: int, description: str) -> Housing:
+    return Housing(id=listing_id, title=f"Quiet room {listing_id}", description=description, address="Elm St",
+                   price=400 + listing_id, bedrooms=1, bathrooms=1.0, landlord_id=1, is_verified=False)
+
+
+def _add(*listings: Housing):
+    async def add(db):
+        db.add_all(listings)
+    asyncio.run(_run(add))
+
+
+def _search():
+    return asyncio.run(_run(lambda db: discover_hostels(db, "quiet room", {})))
+
+
+def test_repeat_search_reuses_annotations(annotations):
+    _add(_listing(1, "sunny"), _listing(2, "near bus"))
+
+    first = _search()
+    second = _search()
+    assert annotations == [[1, 2]] # The second search made no Gemini call
+    assert second["results"] == first["results"]
+    assert [result["pros"] for result in second["results"]] == [["sunny"], ["near bus"]]
+
+
+def test_only_new_and_edited_listings_are_annotated(annotations):
+    _add(_listing(1, "sunny"), _listing(2, "near bus"))
+    _search()
+
+    _add(_listing(3, "garden"))
+    _search()
+
+    async def edit(db):
+        listing = await db.get(Housing, 2)
+        listing.description = "near bus, newly renovated"
+
+    asyncio.run(_run(edit))
+    results = _search()["results"]
+    assert annotations == [[1, 2], [3], [2]]
+    assert {result["id"]: result["pros"] for result in results} == {
+        1: ["sunny"], 2: ["near bus, newly renovated"], 3: ["garden"],
+    }
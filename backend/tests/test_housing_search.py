@@ -0,0 +1,116 @@
+import asyncio
+import sqlite3
+
+from sqlalchemy import create_engine, delete
+
+from app.database import AsyncSessionLocal
+from app.models.housing import Housing, ensure_coordinates, ensure_text_search
+from app.services.housing_search import HousingFilters, search_listings_text
+
+
+def test_text_search_is_added_to_an_existing_housing_table(tmp_path):
+    path = tmp_path / "old.db"
+    connection = sqlite3.connect(path)
+    # Housing table as created before the FTS5 index existed
+    connection.execute("CREATE TABLE housing (id INTEGER PRIMARY KEY, title VARCHAR, description TEXT, address VARCHAR, price FLOAT)")
+    connection.execute("INSERT INTO housing (title, description, address, price) VALUES ('Quiet studio', 'Furnished', 'Elm St', 500)")
+    connection.commit()
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        ensure_text_search(conn)
+    with engine.begin() as conn:
+        ensure_text_search(conn) # Already there: nothing to do
+    engine.dispose()
+
+    connection.execute("INSERT INTO housing (title, description, address, price) VALUES ('Bright room', 'Quiet street', 'Oak St', 400)")
+    connection.commit()
+    rows = connection.execute("SELECT rowid FROM housing_fts WHERE housing_fts MATCH 'quiet' ORDER BY rowid").fetchall()
+    connection.close()
+    assert rows == [(1,), (2,)]
+
+
+def _listing(listing_id: int, title: str, price: float) -> Housing:
+    return Housing(id=listing_id, title=title, description="", address="", price=price,
+                   bedrooms=1, bathrooms=1.0, landlord_id=1, is_verified=False)
+
+
+def test_any_word_matches_fill_the_page_after_every_word_matches(database):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Housing))
+            db.add_all([
+                _listing(1, "Quiet room", 400),
+                _listing(2, "Furnished room", 450),
+                _listing(3, "Quiet furnished studio", 700),
+                _listing(4, "Quiet furnished flat", 800),
+                _listing(5, "Garage", 100),
+            ])
+            await db.commit()
+            hits = await search_listings_text(db, "quiet furnished", HousingFilters(), limit=3)
+            all_words = await search_listings_text(db, "quiet furnished", HousingFilters(), limit=2)
+            await db.execute(delete(Housing))
+            await db.commit()
+            return [listing.id for listing, _ in hits], [listing.id for listing, _ in all_words]
+
+    hits, all_words = asyncio.run(run())
+    assert sorted(hits[:2]) == [3, 4] and hits[2] in (1, 2)
+    assert sorted(all_words) == [3, 4]
+
+
+def test_coordinates_and_universities_are_added_to_an_existing_database(tmp_path):
+    path = tmp_path / "old.db"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE housing (id INTEGER PRIMARY KEY, title VARCHAR, description TEXT, address VARCHAR, price FLOAT)")
+    connection.execute("INSERT INTO housing (title, price) VALUES ('Studio', 500)")
+    connection.commit()
+
+    engine = create_engine(f"sqlite:///{path}")
+    for _ in range(2): # A second run finds everything in place
+        with engine.begin() as conn:
+            ensure_coordinates(conn)
+    engine.dispose()
+
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(housing)")]
+    universities = connection.execute("SELECT count(*) FROM universities").fetchone()
+    rows = connection.execute("SELECT title, latitude, longitude FROM housing").fetchall()
+    connection.close()
+    assert columns[-2:] == ["latitude", "longitude"]
+    assert universities == (0,)
+    assert rows == [("Studio", None, None)]
+
+
+def test_search_pages_through_tied_prices_without_gaps_or_repeats(database):
+    from fastapi.testclient import TestClient
+    from app.config import settings
+    from main import app
+
+    async def seed():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Housing))
+            # Three prices over 25 listings: pages split inside runs of equal price
+            db.add_all([_listing(i, f"Room {i}", 500 + 100 * (i % 3)) for i in range(1, 26)])
+            await db.commit()
+
+    async def clear():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Housing))
+            await db.commit()
+
+    asyncio.run(seed())
+    try:
+        client = TestClient(app)
+        url = f"{settings.API_V1_STR}/housing/search"
+        seen, after = [], None
+        while True:
+            page = client.get(url, params={"limit": 4, **({"after": after} if after else {})}).json()
+            seen += [(listing["price"], listing["id"]) for listing in page["results"]]
+            after = page["next_cursor"]
+            if after is None:
+                break
+        assert seen == sorted((500.0 + 100 * (i % 3), i) for i in range(1, 26))
+
+        for cursor in ("not-a-cursor", "NTAwLjA="): # The second is "500.0": no id
+            assert client.get(url, params={"after": cursor}).status_code == 400
+    finally:
+        asyncio.run(clear())
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app.utils import quota as quota_module
+from app.utils.quota import DistributedQuota
+from app.utils.redis_client import LocalRedis
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(60 * 1000 + 50.0)
+    monkeypatch.setattr(quota_module, "time", clock)
+    return clock
+
+
+async def _take_all(quota: DistributedQuota) -> int:
+    taken = 0
+    while await quota._try_take():
+        taken += 1
+    return taken
+
+
+def test_no_double_burst_across_minute_boundary(clock):
+    async def run():
+        quota = DistributedQuota(LocalRedis(), requests_per_minute=10, requests_per_day=1000, lease_size=2)
+        assert await _take_all(quota) == 10
+        # Just past the boundary the whole previous minute still counts
+        clock.now += 10
+        assert await _take_all(quota) == 0
+        # Halfway through the minute, half of it does
+        clock.now += 30
+        assert await _take_all(quota) == 5
+        # A minute with five requests behind it, weighted by half again
+        clock.now += 60
+        assert await _take_all(quota) <= 8
+    asyncio.run(run())
+
+
+def test_window_keys_get_an_expiry(clock):
+    async def run():
+        redis = LocalRedis()
+        quota = DistributedQuota(redis, requests_per_minute=10, requests_per_day=1000, lease_size=2)
+        assert await quota._try_take()
+        for key, (_, expires_at) in redis._data.items():
+            assert expires_at is not None, key
+    asyncio.run(run())
+
+
+def test_acquire_gives_up_within_max_wait(clock):
+    async def run():
+        quota = DistributedQuota(LocalRedis(), requests_per_minute=2, requests_per_day=1000, lease_size=2)
+        await quota.acquire(0)
+        await quota.acquire(0)
+        with pytest.raises(Exception, match="429"):
+            await quota.acquire(0)
+    asyncio.run(run())
@@ -0,0 +1,81 @@
+import asyncio
+
+from app.config import settings
+from app.utils import redis_client
+from app.utils.redis_client import LocalRedis
+
+
+def test_get_set_delete():
+    async def run():
+        redis = LocalRedis()
+        assert await redis.get("k") is None
+        assert await redis.set("k", "v") is True
+        assert await redis.get("k") == b"v"
+        assert await redis.delete("k", "missing") == 1
+        assert await redis.get("k") is None
+    asyncio.run(run())
+
+
+def test_set_nx_and_expiry():
+    async def run():
+        redis = LocalRedis()
+        assert await redis.set("k", 1, px=50, nx=True) is True
+        assert await redis.set("k", 2, nx=True) is None
+        assert await redis.get("k") == b"1"
+        await asyncio.sleep(0.08)
+        assert await redis.get("k") is None
+        assert await redis.set("k", 3, nx=True) is True
+    asyncio.run(run())
+
+
+def test_incrby_keeps_expiry():
+    async def run():
+        redis = LocalRedis()
+        assert await redis.incrby("n", 5) == 5
+        assert await redis.decrby("n", 2) == 3
+        assert await redis.expire("n", 0.05) is True
+        assert await redis.incrby("n") == 4
+        await asyncio.sleep(0.08)
+        assert await redis.get("n") is None
+        assert await redis.expire("n", 10) is False
+    asyncio.run(run())
+
+
+def test_hash_fields():
+    async def run():
+        redis = LocalRedis()
+        assert await redis.hset("h", "a", 1) == 1
+        assert await redis.hset("h", "a", 2) == 0
+        assert await redis.hset("h", "b", "x") == 1
+        assert await redis.hgetall("h") == {b"a": b"2", b"b": b"x"}
+        assert await redis.hdel("h", "a", "missing") == 1
+        assert await redis.hdel("h", "b") == 1
+        assert await redis.hgetall("h") == {}
+    asyncio.run(run())
+
+
+def test_pubsub():
+    async def run():
+        redis = LocalRedis()
+        subscriber = redis.pubsub()
+        await subscriber.subscribe("room")
+        assert await subscriber.get_message(timeout=0) is None
+        assert await redis.publish("room", "hello") == 1
+        assert await redis.publish("other", "ignored") == 0
+        message = await subscriber.get_message(timeout=0.1)
+        assert message == {"type": "message", "channel": b"room", "data": b"hello"}
+        await subscriber.aclose()
+        assert await redis.publish("room", "after close") == 0
+    asyncio.run(run())
+
+
+def test_real_client_has_socket_timeouts(monkeypatch):
+    # An unreachable host must fail within the timeout, so the cache can fall back to L1
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://10.255.255.1:6379/0")
+    monkeypatch.setattr(settings, "REDIS_SOCKET_TIMEOUT_SECONDS", 0.25)
+    monkeypatch.setattr(redis_client, "_client", None)
+    client = redis_client.get_redis()
+    options = client.connection_pool.connection_kwargs
+    assert options["socket_connect_timeout"] == 0.25
+    assert options["socket_timeout"] == 0.25
+    asyncio.run(redis_client.close_redis())
@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+from sqlalchemy import delete, select
+
+from app.database import AsyncSessionLocal
+from app.models.api_log import APICallLog
+from app.utils.batch_writer import BatchWriter
+from app.utils.request_logging import RequestLoggingMiddleware
+
+
+class CapturingWriter:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, row: dict) -> bool:
+        self.rows.append(row)
+        return True
+
+
+def _get_all(app, paths):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for path in paths:
+                await client.get(path)
+    asyncio.run(run())
+
+
+def test_endpoints_are_logged_by_full_route_template(database):
+    from main import app
+    writer = CapturingWriter()
+    _get_all(RequestLoggingMiddleware(app, writer=writer), [
+        "/", "/api/v1/housing/", "/api/v1/users/", "/api/v1/ai/chat/7/history", "/no/such/path/42",
+    ])
+    assert [row["endpoint"] for row in writer.rows] == [
+        "GET /",
+        "GET /api/v1/housing/",
+        "GET /api/v1/users/",
+        "GET /api/v1/ai/chat/{user_id}/history",
+        "GET <unmatched>",
+    ]
+
+
+def test_request_and_ai_rows_insert_in_one_batch(database):
+    from main import app
+    writer = BatchWriter(APICallLog, max_batch=100)
+    _get_all(RequestLoggingMiddleware(app, writer=writer), ["/"])
+    writer.add({"endpoint": "ai:analyze_lease", "duration_ms": 1200.0, "status_code": 200,
+                "tokens_used": 321, "error_message": None})
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(APICallLog))
+            await db.commit()
+        await writer.flush()
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(APICallLog.endpoint, APICallLog.tokens_used).order_by(APICallLog.id))).all()
+        return [tuple(row) for row in rows]
+
+    assert asyncio.run(run()) == [("GET /", 0), ("ai:analyze_lease", 321)]
+    assert writer.lost == 0
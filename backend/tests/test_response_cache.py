@@ -0,0 +1,139 @@
+import asyncio
+import types
+
+import pytest
+
+from app.utils.redis_client import LocalRedis
+from app.utils.response_cache import (
+    CacheBackend, LRUResponseCache, RedisCacheBackend, decode_payload, encode_payload, response_cache,
+)
+from app.utils import gemini_rate_limiter
+from app.services.gemini_service import SERVICE_UNAVAILABLE, gemini_service
+
+
+def _backend(redis=None):
+    return RedisCacheBackend(redis or LocalRedis(), LRUResponseCache(max_entries=100, max_bytes=1 << 20))
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_payload_round_trip():
+    small = {"a": 1}
+    large = {"text": "lease " * 1000}
+    assert decode_payload(encode_payload(small)) == small
+    assert len(encode_payload(large)) < len("lease " * 1000)
+    assert decode_payload(encode_payload(large)) == large
+
+
+def test_redis_backend_l2_shared_between_workers():
+    async def run():
+        redis = LocalRedis()
+        first, second = _backend(redis), _backend(redis)
+        await first.set("k", {"answer": 42}, 60)
+        assert await second.get("k") == (True, {"answer": 42})
+        assert second.l2_hits == 1
+        # Now in second's L1
+        assert await second.get("k") == (True, {"answer": 42})
+        assert second.l2_hits == 1
+        await first.delete("k")
+        assert await first.get("k") == (False, None)
+    asyncio.run(run())
+
+
+def test_redis_backend_corrupt_entry_is_a_miss_and_deleted():
+    async def run():
+        redis = LocalRedis()
+        backend = _backend(redis)
+        await redis.set("ai-cache:k", b"znot zlib")
+        assert await backend.get("k") == (False, None)
+        assert backend.l2_errors == 1
+        assert await redis.get("ai-cache:k") is None
+    asyncio.run(run())
+
+
+def test_with_cache_does_not_store_failures(monkeypatch):
+    backend = _backend()
+    monkeypatch.setattr(gemini_rate_limiter, "cache_backend", backend)
+    calls = []
+
+    @gemini_rate_limiter.with_cache(ttl_seconds=60)
+    async def flaky(owner, value):
+        calls.append(value)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return value * 2
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await flaky(None, 2)
+        assert await flaky(None, 2) == 4
+        assert await flaky(None, 2) == 4
+        assert calls == [2, 2]
+        await flaky.forget(None, 2)
+        assert await flaky(None, 2) == 4
+        assert calls == [2, 2, 2]
+    asyncio.run(run())
+
+
+def test_failed_gemini_call_is_not_cached(monkeypatch):
+    response_cache.clear()
+    replies = [RuntimeError("503 unavailable"), '{"summary": "ok"}']
+    calls = []
+
+    async def generate_content(contents):
+        calls.append(contents)
+        reply = replies[len(calls) - 1]
+        if isinstance(reply, Exception):
+            raise reply
+        return types.SimpleNamespace(text=reply, usage_metadata=None)
+
+    monkeypatch.setattr(gemini_service, "_generate_content", generate_content)
+
+    async def run():
+        failed = await gemini_service._generate_response("Is this lease fair?")
+        assert failed.startswith(SERVICE_UNAVAILABLE)
+        assert await gemini_service._generate_json("Is this lease fair?") == {"summary": "ok"}
+        assert await gemini_service._generate_json("Is this lease fair?") == {"summary": "ok"}
+        assert len(calls) == 2
+    asyncio.run(run())
+
+
+def test_unparseable_gemini_reply_is_not_cached(monkeypatch):
+    response_cache.clear()
+    replies = ["Sorry, I can't help with that", '{"summary": "ok"}']
+    calls = []
+
+    async def generate_content(contents):
+        calls.append(contents)
+        return types.SimpleNamespace(text=replies[len(calls) - 1], usage_metadata=None)
+
+    monkeypatch.setattr(gemini_service, "_generate_content", generate_content)
+
+    async def run():
+        assert await gemini_service._generate_json("Rate this flat") is None
+        assert await gemini_service._generate_json("Rate this flat") == {"summary": "ok"}
+        assert len(calls) == 2
+    asyncio.run(run())
+
+
+def test_incomplete_annotation_batch_is_not_cached(monkeypatch):
+    response_cache.clear()
+    replies = ['[{"id": 1, "pros": ["Cheap"]}]', '[{"id": 1, "pros": ["Cheap"]}, {"id": 2, "cons": ["Far"]}]']
+    calls = []
+
+    async def generate_content(contents):
+        calls.append(contents)
+        return types.SimpleNamespace(text=replies[len(calls) - 1], usage_metadata=None)
+
+    monkeypatch.setattr(gemini_service, "_generate_content", generate_content)
+    listings = [{"id": 1, "title": "Room"}, {"id": 2, "title": "Studio"}]
+
+    async def run():
+        assert set(await gemini_service.annotate_listings(listings)) == {1}
+        assert set(await gemini_service.annotate_listings(listings)) == {1, 2}
+        assert set(await gemini_service.annotate_listings(listings)) == {1, 2}
+        assert len(calls) == 2
+    asyncio.run(run())
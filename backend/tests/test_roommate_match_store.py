@@ -0,0 +1,76 @@
+import asyncio
+import sqlite3
+
+from sqlalchemy import create_engine, delete, select
+
+from app.database import AsyncSessionLocal
+from app.models.matching import RoommateMatch, ensure_roommate_match_store
+from app.models.user import User
+from app.services.roommate_match_store import save_matches
+
+
+def test_save_matches_upserts_and_skips_unknown_users(database):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(RoommateMatch))
+            await db.execute(delete(User).where(User.id.in_([9001, 9002, 9003])))
+            db.add_all([User(id=9001, email="a@test"), User(id=9002, email="b@test"), User(id=9003, email="c@test")])
+            await db.commit()
+
+            fingerprints = {9002: "v1", 9003: "v1", 9999: "v1"}
+            results = [
+                {"id": 9002, "match_score": 80},
+                {"id": 9003, "match_score": 60},
+                {"id": 9999, "match_score": 90}, # not a registered user
+            ]
+            await save_matches(db, 9001, results, fingerprints)
+            await save_matches(db, 9001, [{"id": 9002, "match_score": 40}], {9002: "v2"})
+
+            rows = (await db.execute(select(RoommateMatch).order_by(RoommateMatch.match_user_id))).scalars().all()
+            return [(row.match_user_id, row.compatibility_score, row.profile_hash) for row in rows]
+
+    assert asyncio.run(run()) == [(9002, 40.0, "v2"), (9003, 60.0, "v1")]
+
+
+def test_save_matches_for_unknown_user_is_a_no_op(database):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(RoommateMatch))
+            await db.commit()
+            await save_matches(db, 424242, [{"id": 9002, "match_score": 80}], {9002: "v1"})
+            return (await db.execute(select(RoommateMatch))).scalars().all()
+
+    assert asyncio.run(run()) == []
+
+
+def test_store_columns_and_unique_index_are_added_to_an_old_table(tmp_path):
+    path = tmp_path / "old.db"
+    connection = sqlite3.connect(path)
+    # roommate_matches as created before the match store
+    connection.execute(
+        "CREATE TABLE roommate_matches (id INTEGER PRIMARY KEY, user_id INTEGER, match_user_id INTEGER, "
+        "compatibility_score FLOAT, analysis JSON, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+    )
+    connection.executemany("INSERT INTO roommate_matches (user_id, match_user_id, compatibility_score) VALUES (?, ?, ?)",
+                           [(1, 2, 50), (1, 2, 70), (1, 3, 60)])
+    connection.commit()
+
+    engine = create_engine(f"sqlite:///{path}")
+    for _ in range(2): # A second run finds everything in place
+        with engine.begin() as conn:
+            ensure_roommate_match_store(conn)
+    engine.dispose()
+
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(roommate_matches)")]
+    assert columns[-2:] == ["profile_hash", "updated_at"]
+    # The upsert save_matches issues now has its conflict target
+    connection.execute(
+        "INSERT INTO roommate_matches (user_id, match_user_id, compatibility_score, profile_hash) VALUES (1, 2, 90, 'v2') "
+        "ON CONFLICT (user_id, match_user_id) DO UPDATE SET compatibility_score = excluded.compatibility_score, "
+        "profile_hash = excluded.profile_hash, updated_at = CURRENT_TIMESTAMP"
+    )
+    rows = connection.execute(
+        "SELECT user_id, match_user_id, compatibility_score, profile_hash FROM roommate_matches ORDER BY match_user_id"
+    ).fetchall()
+    connection.close()
+    assert rows == [(1, 2, 90.0, "v2"), (1, 3, 60.0, None)]
@@ -0,0 +1,33 @@
+import asyncio
+
+from app.config import settings
+from app.services.gemini_service import gemini_service
+
+
+def test_shortlist_is_scored_in_several_batches(monkeypatch):
+    batches = []
+
+    async def score(user_profile, candidates):
+        batches.append(candidates)
+        # Batches finish out of order, so the ranking is merged across them
+        await asyncio.sleep(0.001 * (len(batches) % 3))
+        return [{"id": c["id"], "match_score": (c["id"] * 37) % 100} for c in candidates]
+
+    monkeypatch.setattr(gemini_service, "_score_roommate_batch", score)
+    candidates = [{"id": i, "budget": 800, "bio": "quiet, tidy"} for i in range(50)]
+
+    async def run():
+        updates = [update async for update in gemini_service.match_roommates_stream({"budget": 800}, candidates, top_k=3)]
+        return updates
+
+    updates = asyncio.run(run())
+    assert len(batches) == settings.ROOMMATE_PRERANK_SHORTLIST // settings.ROOMMATE_MATCH_BATCH_SIZE > 1
+    assert [update["batches_done"] for update in updates] == list(range(1, len(batches) + 1))
+    assert updates[-1]["complete"]
+
+    scored = sorted((c["id"] * 37 % 100, c["id"]) for batch in batches for c in batch)
+    best = [{"id": candidate_id, "match_score": points} for points, candidate_id in reversed(scored[-3:])]
+    assert updates[-1]["matches"] == best
+    for update in updates:
+        points = [match["match_score"] for match in update["matches"]]
+        assert points == sorted(points, reverse=True) and len(points) <= 3
@@ -0,0 +1,41 @@
+import math
+
+import pytest
+
+from app.services.roommate_ranking import _TRAIT_INDEX, _number, _trait_row, score_candidates
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("800", 800.0),
+    ("$800-1200", 1000.0),
+    ("approx. 900", 900.0),
+    ("1.5k", 1500.0),
+    ("1-1.5k", 1250.0),
+    ("$1,200/mo", 1200.0),
+    ("between 1,200 and 1,400", 1300.0),
+])
+def test_number_parses_budgets(text, expected):
+    assert _number({"budget": text}, "budget") == expected
+
+
+def test_number_without_digits_is_unknown():
+    assert math.isnan(_number({"budget": "flexible"}, "budget"))
+
+
+@pytest.mark.parametrize("text, trait, expected", [
+    ("guests often", "guests", 1.0),
+    ("guests often", "social", 0.0),
+    ("doesn't smoke", "smoking", -1.0),
+    ("non-smoker", "smoking", -1.0),
+    ("smoker", "smoking", 1.0),
+    ("not a night owl", "sleep", -1.0),
+    ("never drinks", "drinking", -1.0),
+    ("not messy at all", "cleanliness", 1.0),
+])
+def test_trait_phrases(text, trait, expected):
+    assert _trait_row({"bio": text})[_TRAIT_INDEX[trait]] == expected
+
+
+def test_budget_range_matches_its_midpoint():
+    scores = score_candidates({"budget": "$900-1100"}, [{"budget": 1000}, {"budget": "8001200"}])
+    assert scores[0] > scores[1]
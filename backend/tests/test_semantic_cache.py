@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.utils.semantic_cache import semantic_cache, with_semantic_cache
+
+
+@pytest.fixture
+def ask(monkeypatch):
+    """An opted-in feature that answers with the question it was actually asked."""
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_FEATURES", ["test_feature"])
+    semantic_cache.index("test_feature").clear()
+
+    # Well below the default threshold, so only the negation/antonym checks keep these apart
+    @with_semantic_cache("test_feature", text_fields=("question",), threshold=0.8)
+    async def answer(question: str):
+        return question
+
+    return lambda question: asyncio.run(answer(question))
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Can I work off campus?", "Can I not work off campus?"),
+    ("Can I work off campus?", "I can't work off campus?"),
+    ("Is it safe to walk home at night near campus?", "Is it unsafe to walk home at night near campus?"),
+    ("Is the flat furnished?", "Is the flat unfurnished?"),
+])
+def test_negations_and_antonyms_do_not_share_answers(ask, first, second):
+    assert ask(first) == first
+    assert ask(second) == second
+    assert ask(first) == first # Still cached, and not overwritten by its opposite
+
+
+def test_rewordings_still_share_answers(ask):
+    assert ask("How do I make friends in a new country?") == "How do I make friends in a new country?"
+    assert ask("How can I make friends in a new country?") == "How do I make friends in a new country?"
+    assert ask("Can I work off-campus?") == ask("Can I work off campus?")
+
+
+def test_default_threshold_is_above_negated_pairs():
+    embed = semantic_cache.embedder.embed
+    similarity = float(embed("Can I work off campus?") @ embed("Can I not work off campus?"))
+    assert similarity < settings.SEMANTIC_CACHE_THRESHOLD
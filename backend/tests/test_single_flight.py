@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.utils import gemini_rate_limiter
+from app.utils.redis_client import LocalRedis
+from app.utils.response_cache import LRUResponseCache, RedisCacheBackend
+from app.utils.single_flight import SingleFlight
+
+
+@pytest.fixture
+def flight(monkeypatch):
+    flight = SingleFlight()
+    monkeypatch.setattr(gemini_rate_limiter, "single_flight", flight)
+    monkeypatch.setattr(gemini_rate_limiter, "cache_backend",
+                        RedisCacheBackend(LocalRedis(), LRUResponseCache(max_entries=100, max_bytes=1 << 20)))
+    return flight
+
+
+def test_concurrent_identical_calls_run_once(flight):
+    calls = []
+
+    @gemini_rate_limiter.with_cache(ttl_seconds=60)
+    async def slow(owner, prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return prompt.upper()
+
+    async def run():
+        return await asyncio.gather(*(slow(None, "hello") for _ in range(8)))
+
+    assert asyncio.run(run()) == ["HELLO"] * 8
+    assert calls == ["hello"]
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 7}
+
+
+def test_exception_reaches_every_waiter(flight):
+    calls = []
+
+    @gemini_rate_limiter.with_cache(ttl_seconds=60)
+    async def failing(owner, prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("boom")
+
+    async def run():
+        return await asyncio.gather(*(failing(None, "hello") for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert calls == ["hello"]
+    assert all(isinstance(result, RuntimeError) and str(result) == "boom" for result in results)
+
+
+def test_cancelling_one_waiter_leaves_the_shared_call_running(flight):
+    calls = []
+
+    @gemini_rate_limiter.with_cache(ttl_seconds=60)
+    async def slow(owner, prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return prompt.upper()
+
+    async def run():
+        first = asyncio.ensure_future(slow(None, "hello"))
+        second = asyncio.ensure_future(slow(None, "hello"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "HELLO"
+    assert calls == ["hello"]
+    assert flight.coalesced == 1
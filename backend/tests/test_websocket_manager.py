@@ -0,0 +1,84 @@
+import asyncio
+
+from app.utils.redis_client import LocalRedis
+from app.websocket.backplane import RedisBackplane
+from app.websocket.manager import Connection, ConnectionManager
+
+
+class SlowWebSocket:
+    def __init__(self, delay: float = 0.0, reading: bool = True):
+        self.delay = delay
+        self.reading = reading
+        self.received = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        if not self.reading:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(self.delay)
+        self.received.append(message)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_streaming_does_not_evict_the_socket():
+    async def run():
+        websocket = SlowWebSocket(delay=0.001)
+        connection = Connection(websocket, user_id=1, max_queue=4, send_timeout=5)
+        connection.start()
+
+        async def stream():
+            for i in range(20):
+                await connection.send(f"chunk {i}")
+
+        producer = asyncio.ensure_future(stream())
+        await asyncio.sleep(0.003) # The stream has filled its budget and is waiting
+        assert all(connection.offer(f"notification {i}") for i in range(3))
+        await producer
+        while not connection.queue.empty():
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.005)
+        connection.close()
+        return connection, websocket
+
+    connection, websocket = asyncio.run(run())
+    assert websocket.closed_with is None
+    assert [m for m in websocket.received if m.startswith("chunk")] == [f"chunk {i}" for i in range(20)]
+    assert sum(m.startswith("notification") for m in websocket.received) == 3
+
+
+def test_client_not_reading_is_evicted_once_offers_back_up():
+    async def run():
+        websocket = SlowWebSocket(reading=False)
+        connection = Connection(websocket, user_id=1, max_queue=4, send_timeout=60)
+        connection.start()
+        results = [connection.offer(f"n{i}") for i in range(6)]
+        await asyncio.sleep(0)
+        return connection, websocket, results
+
+    connection, websocket, results = asyncio.run(run())
+    # Four unsent messages fill the budget; the next one evicts, and nothing is queued after that
+    assert results == [True] * 4 + [False] * 2
+    assert connection.closed and websocket.closed_with == 1011
+
+
+def test_quick_reconnect_stays_online():
+    async def run():
+        redis = LocalRedis()
+        backplane = RedisBackplane(redis)
+        manager = ConnectionManager(max_queue=8, send_timeout=1, backplane=backplane)
+        first = await manager.connect(SlowWebSocket(), user_id=7)
+        first.close() # Schedules the offline update...
+        await manager.connect(SlowWebSocket(), user_id=7) # ...which the reconnect overtakes
+        await asyncio.gather(*manager._presence_updates)
+        presence = await redis.hgetall(backplane._presence_key(7))
+        await manager.close_all()
+        return backplane.worker_id.encode(), presence, manager._presence_locks
+
+    worker, presence, locks = asyncio.run(run())
+    assert worker in presence
+    assert locks == {}
@@ -1 +1,36 @@
 -- Migration scripts will go here
+
+-- Roommate match store: one row per (user, candidate) pair, reused until either profile changes
+ALTER TABLE roommate_matches ADD COLUMN IF NOT EXISTS profile_hash VARCHAR(64);
+ALTER TABLE roommate_matches ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;
+CREATE UNIQUE INDEX IF NOT EXISTS ix_roommate_matches_user_match ON roommate_matches (user_id, match_user_id);
+
+-- Chat history: per-user, newest-first reads and keyset pagination on (timestamp, id)
+CREATE INDEX IF NOT EXISTS ix_chat_history_user_timestamp ON chat_history (user_id, timestamp, id);
+
+-- Housing listing search: price range / bedrooms filters and verified-only searches
+CREATE INDEX IF NOT EXISTS ix_housing_price_bedrooms ON housing (price, bedrooms);
+CREATE INDEX IF NOT EXISTS ix_housing_is_verified ON housing (is_verified);
+-- Refresh planner statistics so price-range searches pick the composite index
+ANALYZE housing;
+
+-- Housing full-text search: weighted tsvector over title/description/address, maintained by Postgres
+ALTER TABLE housing ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(address, '')), 'C')
+) STORED;
+CREATE INDEX IF NOT EXISTS ix_housing_search_vector ON housing USING GIN (search_vector);
+
+-- Listing and university coordinates (WGS84 degrees) for distance search
+ALTER TABLE housing ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION;
+ALTER TABLE housing ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+CREATE TABLE IF NOT EXISTS universities (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR,
+    city VARCHAR,
+    country VARCHAR,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION
+);
+CREATE INDEX IF NOT EXISTS ix_universities_name ON universities (name);